@@ -0,0 +1,70 @@
+"""基于边缘能量积分图的自动裁剪建议，在缩小后的预览图上计算，每张只需几毫秒"""
+import numpy as np
+
+from image_engine import compute_crop_size
+
+# 分析时把预览图缩小到的最长边（像素）
+ANALYSIS_SIZE = 256
+
+# 居中偏好的权重：能量相同时优先选择靠近中心的位置
+CENTER_BIAS = 0.05
+
+
+def energy_map(image):
+    """计算灰度梯度幅值作为边缘/显著性能量图"""
+    gray = np.asarray(image.convert("L"), dtype=np.float32)
+    energy = np.zeros_like(gray)
+    energy[:, 1:] += np.abs(np.diff(gray, axis=1))
+    energy[1:, :] += np.abs(np.diff(gray, axis=0))
+    return energy
+
+
+def integral_image(values):
+    """带一圈零填充的二维积分图，任意矩形之和只需四次查表"""
+    integral = np.zeros((values.shape[0] + 1, values.shape[1] + 1), dtype=np.float64)
+    np.cumsum(np.cumsum(values, axis=0), axis=1, out=integral[1:, 1:])
+    return integral
+
+
+def window_sums(integral, win_width, win_height):
+    """一次性求出所有 win_width x win_height 窗口内的能量之和，结果按左上角位置索引"""
+    return (integral[win_height:, win_width:] - integral[:-win_height, win_width:]
+            - integral[win_height:, :-win_width] + integral[:-win_height, :-win_width])
+
+
+def suggest_crop(preview, original_size, ratio, analysis_size=ANALYSIS_SIZE):
+    """为指定比例挑选边缘能量最多的最大裁剪框位置，返回原图坐标 (x1, y1, x2, y2)"""
+    img_width, img_height = original_size
+    crop_width, crop_height = compute_crop_size(img_width, img_height, ratio)
+
+    # 先转灰度再用 reduce 按整数倍缩小（盒式滤波，比 LANCZOS 快得多）后评分
+    small = preview.convert("L")
+    factor = max(1, max(small.size) // analysis_size)
+    if factor > 1:
+        small = small.reduce(factor)
+    energy = energy_map(small)
+    small_height, small_width = energy.shape
+    scale_x = small_width / img_width
+    scale_y = small_height / img_height
+    win_width = max(1, min(small_width, round(crop_width * scale_x)))
+    win_height = max(1, min(small_height, round(crop_height * scale_y)))
+
+    scores = window_sums(integral_image(energy), win_width, win_height)
+    total = scores.max()
+    if total <= 0:
+        # 没有任何边缘（纯色图），退回居中
+        offset_x = (img_width - crop_width) // 2
+        offset_y = (img_height - crop_height) // 2
+        return offset_x, offset_y, offset_x + crop_width, offset_y + crop_height
+
+    # 归一化后减去与中心距离成比例的惩罚
+    ys, xs = np.indices(scores.shape)
+    center_y = (scores.shape[0] - 1) / 2
+    center_x = (scores.shape[1] - 1) / 2
+    distance = np.hypot((xs - center_x) / small_width, (ys - center_y) / small_height)
+    best_y, best_x = np.unravel_index(np.argmax(scores / total - CENTER_BIAS * distance), scores.shape)
+
+    # 映射回原图坐标并限制在图片范围内
+    offset_x = min(max(0, int(round(best_x / scale_x))), img_width - crop_width)
+    offset_y = min(max(0, int(round(best_y / scale_y))), img_height - crop_height)
+    return offset_x, offset_y, offset_x + crop_width, offset_y + crop_height
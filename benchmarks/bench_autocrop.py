@@ -0,0 +1,64 @@
+"""自动裁剪基准：在合成图片集上测量每张耗时，并与居中裁剪比较主体命中率"""
+import argparse
+import os
+import random
+import sys
+import time
+
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from autocrop import suggest_crop
+from image_engine import compute_centered_crop
+
+
+def make_sample(rng, max_side):
+    """生成一张平滑背景上带有高纹理主体的合成图片，返回 (图片, 主体中心)"""
+    width = rng.randint(max_side // 2, max_side)
+    height = rng.randint(max_side // 2, max_side)
+    image = Image.new("RGB", (width, height), (rng.randint(60, 200),) * 3)
+    draw = ImageDraw.Draw(image)
+    size = min(width, height) // 4
+    cx = rng.randint(size, width - size)
+    cy = rng.randint(size, height - size)
+    for i in range(-size, size, 6):
+        draw.line((cx + i, cy - size, cx + i, cy + size), fill=(255, 255, 255) if i % 12 else (0, 0, 0), width=3)
+    return image, (cx, cy)
+
+
+def contains(box, point):
+    x1, y1, x2, y2 = box
+    return x1 <= point[0] < x2 and y1 <= point[1] < y2
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="自动裁剪速度与主体命中率")
+    parser.add_argument("-n", "--count", type=int, default=100, help="合成图片数量")
+    parser.add_argument("--max-side", type=int, default=4000, help="合成图片最长边")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    elapsed = 0.0
+    auto_hits = center_hits = 0
+    for _ in range(args.count):
+        image, subject = make_sample(rng, args.max_side)
+        # 与界面一致：在屏幕尺寸的预览代理图上计算
+        preview = image.copy()
+        preview.thumbnail((1920, 1080))
+        for ratio in ("4:3", "3:4"):
+            start = time.perf_counter()
+            box = suggest_crop(preview, image.size, ratio)
+            elapsed += time.perf_counter() - start
+            auto_hits += contains(box, subject)
+            center_hits += contains(compute_centered_crop(image.width, image.height, ratio), subject)
+
+    runs = args.count * 2
+    print(f"自动裁剪: 平均 {elapsed / runs * 1000:.2f} 毫秒/张")
+    print(f"主体命中率: 自动 {auto_hits / runs:.1%}，居中 {center_hits / runs:.1%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
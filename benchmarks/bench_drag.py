@@ -0,0 +1,72 @@
+"""裁剪框拖拽微基准：比较每次移动都重建手柄与常驻图元只移动坐标两种方式"""
+import argparse
+import os
+import sys
+import time
+import tkinter as tk
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crop_overlay import CropOverlay, handle_boxes
+
+
+def drag_path(events):
+    """生成模拟的拖拽轨迹"""
+    for i in range(events):
+        offset = i % 200
+        yield 100 + offset, 80 + offset, 500 + offset, 380 + offset
+
+
+def legacy_drag(canvas, boxes):
+    """旧做法：每个拖拽事件删除并重建8个手柄，重新绑定事件"""
+    rect = canvas.create_rectangle(0, 0, 0, 0, outline="red", width=2, fill="", stipple="gray50")
+    for x1, y1, x2, y2 in boxes:
+        canvas.coords(rect, x1, y1, x2, y2)
+        canvas.delete("handle")
+        for position, hx1, hy1, hx2, hy2 in handle_boxes(x1, y1, x2, y2):
+            handle = canvas.create_rectangle(hx1, hy1, hx2, hy2, fill="blue", tags=("handle", position))
+            canvas.tag_bind(handle, "<ButtonPress-1>", lambda e, p=position: None)
+    canvas.delete("all")
+
+
+def overlay_drag(canvas, boxes):
+    """新做法：常驻图元只用 coords 移动"""
+    overlay = CropOverlay(canvas)
+    overlay.draw(0, 0, 10, 10)
+    for box in boxes:
+        overlay.set_box(*box)
+    canvas.delete("all")
+    overlay.forget()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="裁剪框拖拽每秒可处理的事件数")
+    parser.add_argument("-n", "--events", type=int, default=5000, help="模拟的拖拽事件数")
+    args = parser.parse_args(argv)
+
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        print(f"无法创建窗口（需要图形显示环境）: {e}", file=sys.stderr)
+        return 1
+    canvas = tk.Canvas(root, width=800, height=600)
+    canvas.pack()
+    root.update()
+
+    results = {}
+    for name, func in (("重建手柄", legacy_drag), ("常驻图元", overlay_drag)):
+        boxes = list(drag_path(args.events))
+        start = time.perf_counter()
+        func(canvas, boxes)
+        root.update_idletasks()
+        elapsed = time.perf_counter() - start
+        results[name] = args.events / elapsed
+        print(f"{name}: {results[name]:.0f} 次/秒")
+    root.destroy()
+
+    print(f"加速比: {results['常驻图元'] / results['重建手柄']:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
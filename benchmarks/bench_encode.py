@@ -0,0 +1,93 @@
+"""导出编码基准：用每个导出配置处理同一批图片，输出耗时、吞吐量和文件大小"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+from PIL import Image, ImageDraw, ImageFilter, features
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image_engine import (DEFAULT_BORDER, DEFAULT_PROFILE, EXPORT_PROFILES, collect_image_paths,
+                          compute_centered_crop, export_region)
+
+
+def make_corpus(directory, count, max_side, seed):
+    """生成带渐变、色块和噪点的合成照片，近似真实照片的压缩难度"""
+    rng = random.Random(seed)
+    paths = []
+    for i in range(count):
+        width = rng.randint(max_side // 2, max_side)
+        height = rng.randint(max_side // 2, max_side)
+        image = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+        draw = ImageDraw.Draw(image)
+        for _ in range(40):
+            x, y = rng.randrange(width), rng.randrange(height)
+            size = rng.randint(10, max_side // 6)
+            draw.ellipse((x, y, x + size, y + size), fill=tuple(rng.randrange(256) for _ in range(3)))
+        image = image.filter(ImageFilter.GaussianBlur(2))
+        noise = Image.effect_noise((width, height), 12).convert("RGB")
+        image = Image.blend(image, noise, 0.15)
+        path = os.path.join(directory, f"sample_{i}.png")
+        image.save(path, compress_level=1)
+        paths.append(path)
+    return paths
+
+
+def encode_all(paths, output_dir, profile, ratio, border):
+    """用指定配置导出所有图片，返回 (秒数, 输出像素数, 输出字节数)"""
+    ext = EXPORT_PROFILES[profile]["ext"]
+    elapsed = 0.0
+    pixels = size = 0
+    for i, path in enumerate(paths):
+        with Image.open(path) as image:
+            box = compute_centered_crop(image.width, image.height, ratio)
+        save_path = os.path.join(output_dir, f"{profile}_{i}{ext}")
+        start = time.perf_counter()
+        export_region(path, box, border, save_path, profile)
+        elapsed += time.perf_counter() - start
+        pixels += (box[2] - box[0] + 2 * border) * (box[3] - box[1] + 2 * border)
+        size += os.path.getsize(save_path)
+        os.remove(save_path)
+    return elapsed, pixels, size
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="比较各导出配置的编码速度与文件大小")
+    parser.add_argument("inputs", nargs="*", help="样本图片或文件夹，省略时生成合成图片")
+    parser.add_argument("-n", "--count", type=int, default=8, help="合成图片数量")
+    parser.add_argument("--max-side", type=int, default=3000, help="合成图片最长边")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("-p", "--profiles", nargs="+", choices=list(EXPORT_PROFILES), default=list(EXPORT_PROFILES),
+                        help="要测试的导出配置，默认全部")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        paths = collect_image_paths(args.inputs) if args.inputs else make_corpus(work_dir, args.count,
+                                                                                  args.max_side, args.seed)
+        if not paths:
+            print("没有找到样本图片", file=sys.stderr)
+            return 1
+
+        results = []
+        for profile in args.profiles:
+            if EXPORT_PROFILES[profile]["format"] == "WEBP" and not features.check("webp"):
+                print(f"跳过 {profile}：Pillow 未编译 WebP 支持", file=sys.stderr)
+                continue
+            results.append((profile,) + encode_all(paths, work_dir, profile, "4:3", DEFAULT_BORDER))
+
+    # 文件大小以默认配置为基准（未测试默认配置时以第一个为基准）
+    sizes = {profile: size for profile, _, _, size in results}
+    baseline = sizes.get(DEFAULT_PROFILE, results[0][3] if results else 1)
+    print(f"{len(paths)} 张样本图片")
+    print(f"{'配置':<14}{'耗时(秒)':>10}{'张/秒':>10}{'MP/秒':>10}{'总大小(MB)':>12}{'相对大小':>10}")
+    for profile, elapsed, pixels, size in results:
+        print(f"{profile:<14}{elapsed:>10.2f}{len(paths) / elapsed:>10.2f}{pixels / elapsed / 1e6:>10.1f}"
+              f"{size / 1048576:>12.2f}{size / baseline:>10.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
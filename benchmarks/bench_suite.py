@@ -0,0 +1,206 @@
+"""性能基准套件：生成固定的合成图片集，分阶段计时，把结果保存为 JSON 基线并标出变慢的阶段"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+import PIL
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crop_geometry import (constrain_rect, display_to_original, fit_to_canvas, initial_rect, move_rect,
+                           resize_rect)
+from image_engine import (DEFAULT_BORDER, add_border, build_preview, compute_centered_crop, decode_region,
+                          export_region, save_image)
+
+try:
+    from autocrop import suggest_crop
+except ImportError:
+    suggest_crop = None
+
+# 合成图片集：尺寸档位 × 文件格式
+CORPUS_SIZES = {"small": (800, 600), "medium": (2000, 1500), "large": (4000, 3000)}
+CORPUS_FORMATS = (".png", ".jpg", ".bmp", ".tif")
+
+# 与界面一致的预览尺寸和画布尺寸
+PREVIEW_SIZE = (1920, 1080)
+CANVAS_SIZE = (1200, 800)
+
+# 比基线慢多少（比例）视为回退；耗时极短的阶段噪声大，还要求绝对差值超过下限
+DEFAULT_THRESHOLD = 0.15
+MIN_REGRESSION_SECONDS = 0.01
+
+
+def make_image(width, height, seed):
+    """用固定种子生成带渐变、色块和细纹理的图片，同一种子每次生成完全相同的像素"""
+    rng = random.Random(seed)
+    image = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    draw = ImageDraw.Draw(image)
+    for _ in range(60):
+        x, y = rng.randrange(width), rng.randrange(height)
+        size = rng.randint(width // 40, width // 5)
+        draw.rectangle((x, y, x + size, y + size // 2), fill=tuple(rng.randrange(256) for _ in range(3)))
+    # 用小块伪随机噪点平铺出纹理，避免图片过于容易压缩
+    tile = Image.frombytes("RGB", (64, 64), rng.getrandbits(64 * 64 * 24).to_bytes(64 * 64 * 3, "little"))
+    texture = tile.resize((width // 4, height // 4)).resize((width, height))
+    return Image.blend(image, texture, 0.2)
+
+
+def build_corpus(directory):
+    """在 directory 中生成（或复用已生成的）合成图片集，返回路径列表"""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for seed, (name, (width, height)) in enumerate(CORPUS_SIZES.items()):
+        image = None
+        for ext in CORPUS_FORMATS:
+            path = os.path.join(directory, f"{name}_{width}x{height}{ext}")
+            if not os.path.exists(path):
+                image = image or make_image(width, height, seed)
+                image.save(path)
+            paths.append(path)
+    return paths
+
+
+def geometry_workload(image_size):
+    """模拟一次完整的界面交互：布局、初始裁剪框、拖动和调整大小、换算回原图坐标"""
+    display_size = fit_to_canvas(image_size, CANVAS_SIZE)
+    rect = initial_rect(image_size, display_size, "4:3")
+    for i in range(200):
+        rect = move_rect(rect, (i % 7) - 3, (i % 5) - 2, display_size)
+        rect = resize_rect(rect, (i % 9) - 4, (i % 3) - 1, ("nw", "se", "e", "s")[i % 4], "4:3", display_size)
+        rect = constrain_rect(rect, display_size)
+    return display_to_original(rect, display_size, image_size)
+
+
+def stage_functions(work_dir):
+    """返回 {阶段名: 函数(path)}，每个函数对单张图片执行该阶段一次"""
+    def header(path):
+        with Image.open(path) as image:
+            return image.size
+
+    def crop_box(path):
+        width, height = header(path)
+        return compute_centered_crop(width, height, "4:3")
+
+    def encode(path):
+        cropped_image, _ = decode_region(path, crop_box(path))
+        bordered = add_border(cropped_image, DEFAULT_BORDER)
+        # 编码阶段单独计时：只计 save_image 本身
+        start = time.perf_counter()
+        save_image(bordered, os.path.join(work_dir, "encode.png"))
+        return time.perf_counter() - start
+
+    def border(path):
+        cropped_image, _ = decode_region(path, crop_box(path))
+        start = time.perf_counter()
+        add_border(cropped_image, DEFAULT_BORDER)
+        return time.perf_counter() - start
+
+    stages = {
+        "header": header,
+        "preview": lambda path: build_preview(path, PREVIEW_SIZE),
+        "geometry": lambda path: geometry_workload(header(path)),
+        "decode_region": lambda path: decode_region(path, crop_box(path)),
+        "add_border": border,
+        "encode": encode,
+        "export": lambda path: export_region(path, crop_box(path), DEFAULT_BORDER, os.path.join(work_dir, "out.png")),
+    }
+    if suggest_crop is not None:
+        previews = {}
+
+        def autocrop(path):
+            if path not in previews:
+                previews[path] = (build_preview(path, PREVIEW_SIZE), header(path))
+            preview, size = previews[path]
+            start = time.perf_counter()
+            suggest_crop(preview, size, "4:3")
+            return time.perf_counter() - start
+        stages["autocrop"] = autocrop
+    return stages
+
+
+def run_suite(paths, work_dir, repeat):
+    """对每个阶段和每张图片重复 repeat 次取最短耗时，返回 {阶段名: 全部图片耗时之和（秒）}"""
+    results = {}
+    for name, function in stage_functions(work_dir).items():
+        total = 0.0
+        for path in paths:
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                measured = function(path)
+                elapsed = time.perf_counter() - start
+                # 返回浮点数的阶段自行计时，排除了准备工作的耗时
+                if isinstance(measured, float):
+                    elapsed = measured
+                best = elapsed if best is None else min(best, elapsed)
+            total += best
+        results[name] = total
+    return results
+
+
+def compare(results, baseline, threshold):
+    """与基线比较，返回 [(阶段名, 当前秒数, 基线秒数, 比值, 是否回退)]"""
+    rows = []
+    for name, seconds in results.items():
+        base = baseline.get(name)
+        ratio = seconds / base if base else None
+        regressed = ratio is not None and ratio > 1 + threshold and seconds - base > MIN_REGRESSION_SECONDS
+        rows.append((name, seconds, base, ratio, regressed))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="分阶段性能基准，支持保存和比较 JSON 基线")
+    parser.add_argument("--corpus", help="合成图片集目录，已存在的图片会被复用；默认使用临时目录")
+    parser.add_argument("--repeat", type=int, default=3, help="每个阶段每张图片的重复次数（取最短）")
+    parser.add_argument("--save-baseline", metavar="FILE", help="把本次结果保存为基线")
+    parser.add_argument("--baseline", metavar="FILE", help="与基线比较，有阶段变慢时返回非零退出码")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="比基线慢多少比例视为回退，默认0.15")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        paths = build_corpus(args.corpus or os.path.join(work_dir, "corpus"))
+        results = run_suite(paths, work_dir, args.repeat)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["stages"]
+
+    regressions = 0
+    print(f"{len(paths)} 张图片，每项重复 {args.repeat} 次")
+    print(f"{'阶段':<16}{'耗时(秒)':>10}{'基线(秒)':>10}{'比值':>8}")
+    for name, seconds, base, ratio, regressed in compare(results, baseline, args.threshold):
+        base_text = f"{base:>10.3f}" if base else f"{'-':>10}"
+        ratio_text = f"{ratio:>8.2f}" if ratio else f"{'-':>8}"
+        print(f"{name:<16}{seconds:>10.3f}{base_text}{ratio_text}{'  回退' if regressed else ''}")
+        regressions += regressed
+
+    if args.save_baseline:
+        record = {
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "pillow": PIL.__version__,
+            "machine": platform.machine(),
+            "repeat": args.repeat,
+            "stages": results,
+        }
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False, indent=2)
+        print(f"基线已保存到 {args.save_baseline}")
+
+    if regressions:
+        print(f"{regressions} 个阶段比基线慢 {args.threshold:.0%} 以上", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
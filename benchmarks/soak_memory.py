@@ -0,0 +1,201 @@
+"""内存浸泡测试：按界面的流程（预读 → 切换 → 放大查看 → 后台导出 → 释放）连续处理数千张图片，定期采样常驻内存，检查内存是否持续增长"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tkinter as tk
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_suite import make_image
+from export_writer import ExportWriter
+from image_cache import PreviewCache, Prefetcher
+from image_engine import DEFAULT_BORDER, EXPORT_PROFILES, compute_centered_crop, current_rss_bytes
+from memory_governor import MEMORY_BUDGET, MemoryGovernor
+from tile_view import LevelSource, TiledView, pyramid_level, tile_rect, visible_tiles
+
+# 合成图片集的尺寸档位和格式，循环使用直到处理够指定张数
+SOAK_SIZES = ((1200, 900), (2400, 1800), (3000, 2000), (1600, 2400))
+SOAK_FORMATS = (".jpg", ".png")
+
+# 与界面一致的预读深度、预览缓存容量和导出队列长度
+PREFETCH_DEPTH = 3
+PREVIEW_CACHE_BYTES = 256 * 1024 * 1024
+EXPORT_MAX_PENDING = 4
+PREVIEW_SIZE = (1920, 1080)
+
+# 放大查看：显示尺寸为预览的 ZOOM 倍，只生成视口内的块；每张图片最多等待清晰块生成的时间（秒）
+ZOOM = 2
+VIEWPORT = (1200, 800)
+TILE_WAIT = 10.0
+
+# 预热阶段（按总张数的比例）结束后，常驻内存再增长多少（MB）视为泄漏
+WARMUP_FRACTION = 0.1
+DEFAULT_MAX_GROWTH_MB = 64
+
+
+def build_corpus(directory):
+    """生成（或复用）合成图片集，返回路径列表"""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for seed, (width, height) in enumerate(SOAK_SIZES):
+        image = None
+        for ext in SOAK_FORMATS:
+            path = os.path.join(directory, f"soak_{width}x{height}{ext}")
+            if not os.path.exists(path):
+                image = image or make_image(width, height, seed)
+                image.save(path)
+            paths.append(path)
+    return paths
+
+
+class ZoomViewer:
+    """模拟放大查看每张图片：有图形环境时用界面的 TiledView 生成块并转换为 PhotoImage 放到画布上，
+    没有时直接用 LevelSource 生成视口内的清晰块（不创建 PhotoImage）"""
+
+    def __init__(self, governor):
+        self.governor = governor
+        self.source = None
+        self.view = None
+        try:
+            self.root = tk.Tk()
+        except tk.TclError:
+            self.root = None
+        if self.root is not None:
+            canvas = tk.Canvas(self.root, width=VIEWPORT[0], height=VIEWPORT[1])
+            canvas.pack()
+            self.root.update()
+            self.view = TiledView(canvas, governor=governor)
+        # 与界面一致：内存紧张时丢弃放大用的层
+        governor.add_releaser(self.trim)
+
+    def show(self, path, preview, image_size):
+        """切换到 path 并放大 ZOOM 倍，等视口内的清晰块生成完"""
+        display_size = (preview.width * ZOOM, preview.height * ZOOM)
+        if self.view is not None:
+            self.view.set_image(path, preview, image_size)
+            self.view.set_display_size(display_size)
+            self.view.render()
+            deadline = time.monotonic() + TILE_WAIT
+            while self.view.pending_count() and time.monotonic() < deadline:
+                self.root.update()
+                time.sleep(0.005)
+            self.view.poll()
+            self.root.update_idletasks()
+            return
+        if self.source is not None:
+            self.source.close()
+        self.source = LevelSource(path, self.governor)
+        level = pyramid_level(image_size, display_size)
+        for col, row in visible_tiles((0, 0) + VIEWPORT, display_size):
+            tile = self.source.tile(level, tile_rect(col, row, display_size), display_size)
+            if tile is not None:
+                tile.close()
+
+    def release(self):
+        """切换到下一张之前释放当前图片，与界面的 release_image 一致"""
+        if self.view is not None:
+            self.view.set_image(None, None, None)
+            self.view.canvas.delete("all")
+        elif self.source is not None:
+            self.source.close()
+            self.source = None
+
+    def trim(self):
+        source = self.source
+        if self.view is not None:
+            self.view.trim()
+        elif source is not None:
+            source.trim()
+
+    def close(self):
+        self.release()
+        if self.view is not None:
+            self.view.close()
+            self.root.destroy()
+
+
+def soak(paths, count, out_dir, profile, budget_bytes, sample_every):
+    """处理 count 张图片，返回 ([(已处理张数, 常驻内存字节数)], 是否创建了 PhotoImage)"""
+    governor = MemoryGovernor(budget_bytes)
+    cache = PreviewCache(PREVIEW_CACHE_BYTES)
+    governor.add_releaser(cache.trim)
+    prefetcher = Prefetcher(cache, PREVIEW_SIZE, depth=PREFETCH_DEPTH, governor=governor)
+    viewer = ZoomViewer(governor)
+    writer = ExportWriter(EXPORT_MAX_PENDING, governor=governor)
+    queue = [paths[i % len(paths)] for i in range(count)]
+    ext = EXPORT_PROFILES[profile]["ext"]
+    samples = []
+    try:
+        for index, path in enumerate(queue):
+            # 与界面一致：取预览、只读文件头、放大查看、提交导出、预读后面几张，然后释放当前图片
+            preview = prefetcher.get(path)
+            with Image.open(path) as image:
+                image_size = image.size
+                box = compute_centered_crop(image.width, image.height, "4:3")
+            viewer.show(path, preview, image_size)
+            # 轮换少量输出文件名，避免占满磁盘；写入器同时最多排队 EXPORT_MAX_PENDING 个任务
+            save_path = os.path.join(out_dir, f"NEEKO_{index % (EXPORT_MAX_PENDING * 4)}{ext}")
+            writer.submit(path, box, DEFAULT_BORDER, save_path, profile, {})
+            prefetcher.prefetch(queue[index + 1:index + 1 + PREFETCH_DEPTH])
+            viewer.release()
+            preview.close()
+            if governor.over_budget():
+                governor.relieve()
+            for _, _, error, _ in writer.poll_results():
+                if error:
+                    raise RuntimeError(error)
+            if (index + 1) % sample_every == 0 or index + 1 == count:
+                samples.append((index + 1, current_rss_bytes() or 0))
+    finally:
+        writer.close()
+        prefetcher.shutdown()
+        viewer.close()
+    return samples, viewer.view is not None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="内存浸泡测试：连续处理大量图片，检查常驻内存是否保持平稳")
+    parser.add_argument("--count", type=int, default=5000, help="处理的图片张数，默认5000")
+    parser.add_argument("--corpus", help="合成图片集目录，已存在的图片会被复用；默认使用临时目录")
+    parser.add_argument("--profile", default="jpeg", help="导出配置，默认 jpeg")
+    parser.add_argument("--budget-mb", type=int, default=MEMORY_BUDGET // 1048576, help="常驻内存预算（MB）")
+    parser.add_argument("--sample-every", type=int, default=250, help="每处理多少张采样一次常驻内存")
+    parser.add_argument("--max-growth-mb", type=float, default=DEFAULT_MAX_GROWTH_MB,
+                        help="预热后常驻内存最多允许增长多少 MB，超出时返回非零退出码")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        paths = build_corpus(args.corpus or os.path.join(work_dir, "corpus"))
+        start = time.perf_counter()
+        samples, photos = soak(paths, args.count, work_dir, args.profile, args.budget_mb * 1048576,
+                               args.sample_every)
+        elapsed = time.perf_counter() - start
+
+    print(f"{args.count} 张图片，耗时 {elapsed:.1f} 秒（{args.count / elapsed:.1f} 张/秒），预算 {args.budget_mb}MB")
+    if not photos:
+        print("没有图形显示环境：放大时只生成清晰块，未创建 PhotoImage")
+    if not samples or not any(rss for _, rss in samples):
+        print("无法读取当前常驻内存，跳过增长检查")
+        return 0
+    print(f"{'已处理':>8}{'常驻内存(MB)':>14}")
+    for done, rss in samples:
+        print(f"{done:>8}{rss / 1048576:>14.1f}")
+
+    # 常驻内存随导出队列呈锯齿状波动，比较预热后最初和最后四分之一采样中的峰值
+    warm = [rss for done, rss in samples if done >= args.count * WARMUP_FRACTION]
+    quarter = max(1, len(warm) // 4)
+    growth = (max(warm[-quarter:]) - max(warm[:quarter])) / 1048576 if warm else 0.0
+    peak = max(rss for _, rss in samples) / 1048576 if samples else 0.0
+    print(f"预热后增长 {growth:.1f}MB，峰值 {peak:.1f}MB")
+    if growth > args.max_growth_mb:
+        print(f"常驻内存增长超过 {args.max_growth_mb:.0f}MB，可能存在泄漏")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
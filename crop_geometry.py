@@ -0,0 +1,115 @@
+"""裁剪框几何计算：不依赖 Tkinter 的纯函数，界面和基准测试共用"""
+from image_engine import compute_crop_size
+
+# 画布四周留出的边距（像素）
+CANVAS_MARGIN = 20
+
+# 调整大小时裁剪框的最小边长（显示像素）
+MIN_CROP_SIZE = 50
+
+# 各比例下调整大小时宽高联动的系数
+RATIO_FACTORS = {"4:3": 4/3, "3:4": 3/4}
+
+
+def fit_to_canvas(image_size, canvas_size, margin=CANVAS_MARGIN):
+    """计算图片等比缩放到画布内的显示尺寸"""
+    img_width, img_height = image_size
+    scale = min((canvas_size[0] - margin) / img_width, (canvas_size[1] - margin) / img_height)
+    return int(img_width * scale), int(img_height * scale)
+
+
+def initial_rect(image_size, display_size, ratio, origin=None):
+    """计算初始裁剪框的显示坐标；origin 为原图坐标中建议的左上角，省略时居中"""
+    img_width, img_height = image_size
+    display_width, display_height = display_size
+    max_crop_width, max_crop_height = compute_crop_size(img_width, img_height, ratio)
+
+    scale_x = display_width / img_width
+    scale_y = display_height / img_height
+    display_crop_width = int(max_crop_width * scale_x)
+    display_crop_height = int(max_crop_height * scale_y)
+
+    if origin is not None:
+        x1 = min(int(origin[0] * scale_x), display_width - display_crop_width)
+        y1 = min(int(origin[1] * scale_y), display_height - display_crop_height)
+    else:
+        x1 = (display_width - display_crop_width) // 2
+        y1 = (display_height - display_crop_height) // 2
+    return x1, y1, x1 + display_crop_width, y1 + display_crop_height
+
+
+def constrain_rect(rect, display_size):
+    """平移裁剪框使其不超出图片范围"""
+    x1, y1, x2, y2 = rect
+    max_x, max_y = display_size
+
+    delta_x = 0
+    delta_y = 0
+    if x1 < 0:
+        delta_x = -x1
+    elif x2 > max_x:
+        delta_x = max_x - x2
+    if y1 < 0:
+        delta_y = -y1
+    elif y2 > max_y:
+        delta_y = max_y - y2
+    return x1 + delta_x, y1 + delta_y, x2 + delta_x, y2 + delta_y
+
+
+def move_rect(rect, delta_x, delta_y, display_size):
+    """平移裁剪框并限制在图片范围内"""
+    x1, y1, x2, y2 = rect
+    return constrain_rect((x1 + delta_x, y1 + delta_y, x2 + delta_x, y2 + delta_y), display_size)
+
+
+def resize_rect(rect, delta_x, delta_y, position, ratio, display_size, min_size=MIN_CROP_SIZE):
+    """按拖动的手柄保持比例调整裁剪框大小，结果小于最小尺寸时返回原裁剪框"""
+    factor = RATIO_FACTORS[ratio]
+    display_width, display_height = display_size
+    x1, y1, x2, y2 = rect
+
+    # 根据手柄位置计算联动的另一方向位移
+    if position in ("nw", "w", "sw"):
+        new_x1 = max(0, x1 + delta_x)
+        delta_y = (new_x1 - x1) / factor if ratio == "4:3" else (new_x1 - x1) * factor
+    if position in ("ne", "e", "se"):
+        new_x2 = min(display_width, x2 + delta_x)
+        delta_y = (new_x2 - x2) / factor if ratio == "4:3" else (new_x2 - x2) * factor
+    if position in ("nw", "n", "ne"):
+        new_y1 = max(0, y1 + delta_y)
+        delta_x = (new_y1 - y1) * factor if ratio == "4:3" else (new_y1 - y1) / factor
+    if position in ("sw", "s", "se"):
+        new_y2 = min(display_height, y2 + delta_y)
+        delta_x = (new_y2 - y2) * factor if ratio == "4:3" else (new_y2 - y2) / factor
+
+    # 根据手柄位置应用调整
+    if position in ("nw", "w", "sw"):
+        x1 += delta_x
+    if position in ("ne", "e", "se"):
+        x2 += delta_x
+    if position in ("nw", "n", "ne"):
+        y1 += delta_y
+    if position in ("sw", "s", "se"):
+        y2 += delta_y
+
+    if x2 - x1 < min_size or y2 - y1 < min_size:
+        return rect
+    return max(0, x1), max(0, y1), min(display_width, x2), min(display_height, y2)
+
+
+def display_to_original(rect, display_size, image_size):
+    """将裁剪框的显示坐标转换为原图坐标，并限制在原图范围内"""
+    x1, y1, x2, y2 = rect
+    img_width, img_height = image_size
+    scale_x = img_width / display_size[0]
+    scale_y = img_height / display_size[1]
+    return (max(0, int(x1 * scale_x)), max(0, int(y1 * scale_y)),
+            min(img_width, int(x2 * scale_x)), min(img_height, int(y2 * scale_y)))
+
+
+def original_to_display(box, display_size, image_size):
+    """将原图坐标的裁剪框映射到显示坐标"""
+    x1, y1, x2, y2 = box
+    scale_x = display_size[0] / image_size[0]
+    scale_y = display_size[1] / image_size[1]
+    return x1 * scale_x, y1 * scale_y, x2 * scale_x, y2 * scale_y
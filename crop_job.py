@@ -0,0 +1,177 @@
+"""把同一个裁剪框（归一化坐标）批量应用到队列中的图片：后台线程把任务逐步交给进程池，支持进度、取消和逐个文件的错误报告"""
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from image_engine import (DEFAULT_BORDER, DEFAULT_PROFILE, EXPORT_PROFILES, IN_FLIGHT_PER_WORKER, ignore_pixel_warnings,
+                          process_file)
+from memory_governor import estimate_job_bytes
+
+
+def parse_selection(text, count):
+    """解析 "1-20,25" 形式的队列序号（从1开始），留空表示全部；返回排好序的从0开始的行号"""
+    text = text.strip()
+    if not text:
+        return list(range(count))
+    rows = set()
+    for part in text.replace("，", ",").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        start, _, end = part.partition("-")
+        try:
+            first = int(start)
+            last = int(end) if end else first
+        except ValueError:
+            raise ValueError(f"无法识别的序号：{part}")
+        if first < 1 or last > count or first > last:
+            raise ValueError(f"序号超出范围：{part}")
+        rows.update(range(first - 1, last))
+    return sorted(rows)
+
+
+def _remove_placeholder(path):
+    """删除为失败或取消的任务预留的空文件"""
+    try:
+        if os.path.getsize(path) == 0:
+            os.remove(path)
+    except OSError:
+        pass
+
+
+class CropJob:
+    """一次批量裁剪任务；界面线程轮询 poll 取回结果，cancel 后不再提交新的图片"""
+
+    def __init__(self, paths, allocator_for, norm_box, ratio, border=DEFAULT_BORDER, profile=DEFAULT_PROFILE,
+                 workers=None, governor=None):
+        self.paths = list(paths)
+        self.total = len(self.paths)
+        self.allocator_for = allocator_for
+        self.norm_box = norm_box
+        self.ratio = ratio
+        self.border = border
+        self.profile = profile
+        self.workers = workers or os.cpu_count() or 1
+        self.governor = governor
+        self._cancel = threading.Event()
+        self._results = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="crop-job", daemon=True)
+        self._thread.start()
+
+    def poll(self):
+        """取出结果 (类型, 源路径, 输出路径, 统计或错误信息)，类型为 done、error、cancelled（未处理）或 finished"""
+        results = []
+        while True:
+            try:
+                results.append(self._results.get_nowait())
+            except queue.Empty:
+                return results
+
+    def cancel(self):
+        """停止提交新的图片；尚未开始的任务被撤回，正在处理的任务会完成"""
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def wait(self):
+        """等待后台线程结束（取消后只需等待正在处理的任务）"""
+        self._thread.join()
+
+    def _reserve(self, src_path, idle):
+        """提交前按内存预算预约，返回预约的字节数；余量不足时返回 None。没有任务在运行（idle）时等待放行"""
+        if self.governor is None:
+            return 0
+        nbytes = estimate_job_bytes(src_path)
+        return nbytes if self.governor.reserve(nbytes, block=idle) else None
+
+    def _release(self, nbytes):
+        if self.governor is not None:
+            self.governor.release(nbytes)
+
+    def _submit(self, executor, src_path, dst_path):
+        return executor.submit(process_file, src_path, dst_path, self.ratio, self.border, False, self.profile,
+                               self.norm_box)
+
+    def _run(self):
+        """后台线程：保持有限数量的任务在进程池中，按完成顺序回报结果"""
+        ext = EXPORT_PROFILES[self.profile]["ext"]
+        # 界面进程中已有 Tk 和多个线程，用 spawn 启动工作进程而不是 fork
+        executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                       initializer=ignore_pixel_warnings)
+        in_flight = {}  # future → (源路径, 输出路径, 预约的字节数)
+        pending = iter(self.paths)
+        held = None  # 内存余量不足、等待下一轮提交的图片
+        try:
+            while True:
+                while not self._cancel.is_set() and len(in_flight) < self.workers * IN_FLIGHT_PER_WORKER:
+                    src_path = held if held is not None else next(pending, None)
+                    held = None
+                    if src_path is None:
+                        break
+                    # 工作进程的内存不计入界面进程的常驻内存，以预约代替
+                    nbytes = self._reserve(src_path, not in_flight)
+                    if nbytes is None:
+                        held = src_path
+                        break
+                    try:
+                        # 输出文件名在提交时才预留，取消后不会留下大量空文件
+                        dst_path = self.allocator_for(src_path).reserve(ext)[2]
+                    except OSError as e:
+                        self._release(nbytes)
+                        self._results.put(("error", src_path, None, str(e)))
+                        continue
+                    try:
+                        in_flight[self._submit(executor, src_path, dst_path)] = (src_path, dst_path, nbytes)
+                    except BrokenProcessPool:
+                        executor = self._fallback(executor, in_flight)
+                        in_flight[self._submit(executor, src_path, dst_path)] = (src_path, dst_path, nbytes)
+                if self._cancel.is_set():
+                    # 撤回尚未开始的任务
+                    for future, (src_path, dst_path, nbytes) in list(in_flight.items()):
+                        if future.cancel():
+                            del in_flight[future]
+                            self._release(nbytes)
+                            _remove_placeholder(dst_path)
+                            self._results.put(("cancelled", src_path, None, None))
+                if not in_flight:
+                    break
+                done, _ = wait(in_flight, timeout=0.2, return_when=FIRST_COMPLETED)
+                for future in done:
+                    src_path, dst_path, nbytes = in_flight.pop(future)
+                    try:
+                        _, _, stats = future.result()
+                    except BrokenProcessPool:
+                        # 其余已完成的任务也已随 in_flight 一并重新提交
+                        executor = self._fallback(executor, in_flight)
+                        in_flight[self._submit(executor, src_path, dst_path)] = (src_path, dst_path, nbytes)
+                        break
+                    except Exception as e:
+                        self._release(nbytes)
+                        _remove_placeholder(dst_path)
+                        self._results.put(("error", src_path, dst_path, str(e)))
+                        continue
+                    self._release(nbytes)
+                    self._results.put(("done", src_path, dst_path, stats))
+            if held is not None:
+                self._results.put(("cancelled", held, None, None))
+            for src_path in pending:
+                self._results.put(("cancelled", src_path, None, None))
+        finally:
+            executor.shutdown(wait=False)
+            for _, _, nbytes in in_flight.values():
+                self._release(nbytes)
+            self._results.put(("finished", None, None, None))
+
+    def _fallback(self, executor, in_flight):
+        """工作进程无法启动或意外退出时，改为在本进程的单个线程中处理，并重新提交受影响的任务"""
+        executor.shutdown(wait=False)
+        fallback = ThreadPoolExecutor(max_workers=1, thread_name_prefix="crop-job")
+        for future, (src_path, dst_path, nbytes) in list(in_flight.items()):
+            del in_flight[future]
+            in_flight[self._submit(fallback, src_path, dst_path)] = (src_path, dst_path, nbytes)
+        return fallback
@@ -0,0 +1,73 @@
+"""裁剪框覆盖层：裁剪框和八个调整手柄只创建一次，之后只移动坐标"""
+
+# 手柄大小（像素，较大的点击区域）
+HANDLE_SIZE = 16
+
+# 八个手柄的位置名称，按绘制顺序排列（后绘制的在上层）
+HANDLE_POSITIONS = ("nw", "n", "ne", "w", "e", "sw", "s", "se")
+
+
+def handle_boxes(x1, y1, x2, y2, handle_size=HANDLE_SIZE):
+    """计算八个手柄的矩形，返回 [(位置, hx1, hy1, hx2, hy2), ...]"""
+    half = handle_size // 2
+    mid_x = (x1 + x2) // 2
+    mid_y = (y1 + y2) // 2
+    centers = {
+        "nw": (x1, y1), "n": (mid_x, y1), "ne": (x2, y1),
+        "w": (x1, mid_y), "e": (x2, mid_y),
+        "sw": (x1, y2), "s": (mid_x, y2), "se": (x2, y2),
+    }
+    return [(position, centers[position][0] - half, centers[position][1] - half,
+             centers[position][0] + half, centers[position][1] + half)
+            for position in HANDLE_POSITIONS]
+
+
+class CropOverlay:
+    """画布上常驻的裁剪框图元，并用预先计算的手柄表做命中测试"""
+
+    def __init__(self, canvas, handle_size=HANDLE_SIZE):
+        self.canvas = canvas
+        self.handle_size = handle_size
+        self.rect = None
+        self.handle_items = {}
+        self.handle_table = []
+        self.box = None
+
+    def forget(self):
+        """画布被清空后丢弃已失效的图元编号"""
+        self.rect = None
+        self.handle_items = {}
+        self.handle_table = []
+        self.box = None
+
+    def draw(self, x1, y1, x2, y2):
+        """显示裁剪框，图元不存在时才创建，返回裁剪框图元编号"""
+        if self.rect is None:
+            self.rect = self.canvas.create_rectangle(x1, y1, x2, y2, outline="red", width=2, fill="",
+                                                     stipple="gray50", tags=("crop_overlay",))
+            for position in HANDLE_POSITIONS:
+                self.handle_items[position] = self.canvas.create_rectangle(
+                    0, 0, 0, 0, fill="blue", tags=("crop_overlay", "handle", position))
+        self.set_box(x1, y1, x2, y2)
+        return self.rect
+
+    def set_box(self, x1, y1, x2, y2):
+        """用 coords 重新定位裁剪框和手柄，并刷新命中测试表"""
+        self.box = (x1, y1, x2, y2)
+        self.canvas.coords(self.rect, x1, y1, x2, y2)
+        self.handle_table = handle_boxes(x1, y1, x2, y2, self.handle_size)
+        for position, hx1, hy1, hx2, hy2 in self.handle_table:
+            self.canvas.coords(self.handle_items[position], hx1, hy1, hx2, hy2)
+
+    def hit_test(self, x, y):
+        """返回坐标处的手柄位置，位于裁剪框内部返回 "move"，否则返回 None"""
+        if self.box is None:
+            return None
+        # 与绘制层级一致：后绘制的手柄优先
+        for position, hx1, hy1, hx2, hy2 in reversed(self.handle_table):
+            if hx1 <= x <= hx2 and hy1 <= y <= hy2:
+                return position
+        x1, y1, x2, y2 = self.box
+        if x1 <= x <= x2 and y1 <= y <= y2:
+            return "move"
+        return None
@@ -0,0 +1,224 @@
+"""重复图片检测：在进程池中计算感知哈希并缓存到磁盘，按汉明距离把连拍和重复上传的图片分组"""
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import combinations
+
+from PIL import Image
+
+from file_cache import BatchQueue, FileKeyCache, file_key
+
+# 差值哈希的边长：结果为 HASH_SIZE * HASH_SIZE 位
+HASH_SIZE = 8
+
+# 汉明距离不超过该值的两张图片视为重复
+DUPLICATE_THRESHOLD = 6
+
+# 多重索引把 64 位哈希切成的段数和每段位数
+INDEX_CHUNKS = 4
+CHUNK_BITS = 16
+
+# 每批从缓存查询、交给进程池计算的图片数量
+HASH_BATCH_SIZE = 256
+
+
+def dhash(path, hash_size=HASH_SIZE):
+    """计算差值哈希：缩小到 (hash_size+1) x hash_size 的灰度图，比较每行相邻像素的明暗"""
+    with Image.open(path) as image:
+        # JPEG 直接在解码阶段按 1/8 缩小，其它格式先整数倍 reduce 再缩放
+        image.draft("L", (hash_size * 8, hash_size * 8))
+        small = image.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR, reducing_gap=2.0)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def _hash_file(path):
+    """进程池任务：返回 (路径, 哈希)，无法解码时哈希为 None"""
+    try:
+        return path, dhash(path)
+    except Exception:
+        return path, None
+
+
+def hamming(a, b):
+    """两个哈希之间的汉明距离"""
+    return bin(a ^ b).count("1")
+
+
+class HashCache(FileKeyCache):
+    """以 SQLite 保存的哈希缓存，文件大小或修改时间变化后自动失效；只能在创建它的线程中使用"""
+
+    TABLE = "hashes"
+    COLUMNS = "hash TEXT"
+
+    def _encode(self, value):
+        return (format(value, "x"),)
+
+    def _decode(self, row):
+        return int(row[0], 16)
+
+
+class HammingIndex:
+    """多重索引哈希：把哈希切成若干段分别建表，按鸽巢原理只需在每段中查找相差很少几位的值"""
+
+    def __init__(self, threshold=DUPLICATE_THRESHOLD):
+        self.threshold = threshold
+        self._tables = [{} for _ in range(INDEX_CHUNKS)]
+        self._hashes = []
+        self._items = []
+        # 总距离不超过 threshold 时，至少有一段的距离不超过 threshold // INDEX_CHUNKS
+        radius = threshold // INDEX_CHUNKS
+        self._masks = [sum(1 << bit for bit in bits)
+                       for r in range(radius + 1) for bits in combinations(range(CHUNK_BITS), r)]
+
+    def _chunks(self, value):
+        mask = (1 << CHUNK_BITS) - 1
+        return [(value >> (i * CHUNK_BITS)) & mask for i in range(INDEX_CHUNKS)]
+
+    def search(self, value):
+        """返回与 value 的汉明距离不超过阈值的所有条目"""
+        seen = set()
+        found = []
+        for table, chunk in zip(self._tables, self._chunks(value)):
+            for mask in self._masks:
+                for index in table.get(chunk ^ mask, ()):
+                    if index not in seen:
+                        seen.add(index)
+                        if hamming(self._hashes[index], value) <= self.threshold:
+                            found.append(self._items[index])
+        return found
+
+    def add(self, value, item):
+        """加入一个条目"""
+        index = len(self._hashes)
+        self._hashes.append(value)
+        self._items.append(item)
+        for table, chunk in zip(self._tables, self._chunks(value)):
+            table.setdefault(chunk, []).append(index)
+
+
+class DuplicateFinder:
+    """后台线程查询缓存、把未缓存的图片交给进程池计算哈希，并用并查集维护重复分组"""
+
+    def __init__(self, cache_path, threshold=DUPLICATE_THRESHOLD, workers=None):
+        self.cache_path = cache_path
+        self.workers = workers or os.cpu_count() or 1
+        self._index = HammingIndex(threshold)
+        self._parent = {}
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self._jobs = BatchQueue(HASH_BATCH_SIZE)
+        self._results = queue.Queue()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="duplicate-finder", daemon=True)
+        self._thread.start()
+
+    def add(self, paths):
+        """提交一批图片路径计算哈希"""
+        self._jobs.put(paths)
+
+    def poll(self):
+        """取出已完成的批次，每项为 (本批图片数, 新增的重复图片数)"""
+        results = []
+        while True:
+            try:
+                results.append(self._results.get_nowait())
+            except queue.Empty:
+                return results
+
+    def _find(self, path):
+        root = path
+        while self._parent[root] != root:
+            root = self._parent[root]
+        # 路径压缩
+        while self._parent[path] != root:
+            self._parent[path], path = root, self._parent[path]
+        return root
+
+    def _union(self, a, b):
+        root_a, root_b = self._find(a), self._find(b)
+        if root_a == root_b:
+            return False
+        if self._sizes[root_a] < self._sizes[root_b]:
+            root_a, root_b = root_b, root_a
+        self._parent[root_b] = root_a
+        self._sizes[root_a] += self._sizes[root_b]
+        return True
+
+    def group_of(self, path):
+        """返回图片所属重复组的代表路径；尚未计算或无法解码时返回 None"""
+        with self._lock:
+            return self._find(path) if path in self._parent else None
+
+    def group_size(self, path):
+        """图片所属重复组的大小，未分组时为 0"""
+        with self._lock:
+            return self._sizes[self._find(path)] if path in self._parent else 0
+
+    def _insert(self, path, value):
+        """把一张图片加入索引并与相近的图片合并分组，返回是否与已有图片重复"""
+        with self._lock:
+            if path in self._parent:
+                return False
+            self._parent[path] = path
+            self._sizes[path] = 1
+            matches = self._index.search(value)
+            for other in matches:
+                self._union(path, other)
+            self._index.add(value, path)
+        return bool(matches)
+
+    def _run(self):
+        """后台线程：缓存命中的直接入索引，其余交给进程池"""
+        cache = HashCache(self.cache_path)
+        # 界面进程中已有 Tk 和多个线程，用 spawn 启动工作进程而不是 fork
+        executor = ProcessPoolExecutor(max_workers=self.workers,
+                                       mp_context=multiprocessing.get_context("spawn"))
+        try:
+            while not self._closed.is_set():
+                paths = self._jobs.next_batch()
+                if paths is None:
+                    break
+                keys = {}
+                for path in paths:
+                    try:
+                        keys[path] = file_key(path)
+                    except OSError:
+                        continue
+                cached = cache.lookup(keys.values())
+                hashes = {path: cached[key[0]] for path, key in keys.items() if key[0] in cached}
+                missing = [path for path in keys if path not in hashes]
+                computed = []
+                try:
+                    results = list(executor.map(_hash_file, missing, chunksize=16)) if executor else None
+                except BrokenProcessPool:
+                    # 工作进程无法启动或意外退出时，改为在本线程中计算
+                    executor = None
+                    results = None
+                if results is None:
+                    results = [_hash_file(path) for path in missing]
+                for path, value in results:
+                    if value is not None:
+                        hashes[path] = value
+                        computed.append((keys[path], value))
+                if computed:
+                    cache.store(computed)
+                duplicates = sum(self._insert(path, hashes[path]) for path in paths if path in hashes)
+                self._results.put((len(paths), duplicates))
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False)
+            cache.close()
+
+    def close(self):
+        """停止后台线程，尚未处理的批次被丢弃"""
+        self._closed.set()
+        self._jobs.close()
@@ -0,0 +1,84 @@
+"""后台导出写入器：在独立线程中完成裁剪、加边框和编码保存，界面无需等待"""
+import itertools
+import queue
+import threading
+
+from image_engine import DEFAULT_PROFILE, export_region
+from memory_governor import estimate_decode_bytes
+
+
+class ExportWriter:
+    """有界的导出任务队列，队列已满时 submit 阻塞以形成背压，或在 block=False 时抛出 queue.Full"""
+
+    def __init__(self, max_pending=4, workers=1, stage_stats=None, governor=None):
+        self.stage_stats = stage_stats
+        self.governor = governor
+        self._jobs = queue.Queue(maxsize=max_pending)
+        self._results = queue.Queue()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.pending_jobs = set()
+        self._threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=self._run, name=f"export-writer-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, source_path, box, border, save_path, profile=DEFAULT_PROFILE, timings=None, block=True):
+        """提交导出任务并返回任务编号，只解码源文件中覆盖裁剪框的部分，导出各阶段的耗时继续累加到 timings 中"""
+        job_id = next(self._ids)
+        with self._lock:
+            self.pending_jobs.add(job_id)
+        try:
+            self._jobs.put((job_id, source_path, box, border, save_path, profile, timings), block=block)
+        except queue.Full:
+            with self._lock:
+                self.pending_jobs.discard(job_id)
+            raise
+        return job_id
+
+    def pending_count(self):
+        """尚未完成的导出任务数量"""
+        with self._lock:
+            return len(self.pending_jobs)
+
+    def poll_results(self):
+        """取出所有已完成的结果，每项为 (任务编号, 保存路径, 错误信息或 None, 解码统计或 None)"""
+        results = []
+        while True:
+            try:
+                results.append(self._results.get_nowait())
+            except queue.Empty:
+                return results
+
+    def _run(self):
+        """后台线程：依次处理导出任务"""
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            job_id, source_path, box, border, save_path, profile, timings = job
+            error = stats = None
+            try:
+                if self.governor is None:
+                    stats = export_region(source_path, box, border, save_path, profile, timings)
+                else:
+                    # 裁剪区域和加白边后的图片各占一份；内存余量不足时等待其它任务释放
+                    nbytes = 2 * estimate_decode_bytes(source_path, box)
+                    with self.governor.reserved(nbytes):
+                        stats = export_region(source_path, box, border, save_path, profile, timings)
+            except Exception as e:
+                error = str(e)
+            finally:
+                with self._lock:
+                    self.pending_jobs.discard(job_id)
+            if self.stage_stats is not None:
+                self.stage_stats.record(source_path, timings, output=save_path, error=error)
+            self._results.put((job_id, save_path, error, stats))
+
+    def close(self):
+        """等待所有已提交的导出完成后停止后台线程"""
+        for _ in self._threads:
+            self._jobs.put(None)
+        for thread in self._threads:
+            thread.join()
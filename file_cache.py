@@ -0,0 +1,100 @@
+"""后台索引器共用的部件：按批取出路径的任务队列，以及按文件大小和修改时间失效的 SQLite 缓存表"""
+import os
+import queue
+import sqlite3
+
+# SQLite 单条语句的参数个数有限，批量查询时分段
+LOOKUP_CHUNK = 500
+
+
+def file_key(path):
+    """缓存键 (绝对路径, 文件大小, 修改时间)"""
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+
+class BatchQueue:
+    """路径任务队列：任意线程用 put 提交一批路径，后台线程用 next_batch 每次取出最多 batch_size 张。
+    超出的部分留在队首，下一次优先取出，先提交的图片总是先处理"""
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self._jobs = queue.Queue()
+        self._carry = []  # 上一批取出时超出的部分，只在后台线程中读写
+        self._ended = False
+
+    def put(self, paths):
+        """提交一批路径"""
+        self._jobs.put(list(paths))
+
+    def close(self):
+        """让 next_batch 返回 None；尚未取出的路径被丢弃"""
+        self._jobs.put(None)
+
+    def next_batch(self):
+        """合并上次剩下的和所有已提交的路径，返回最多 batch_size 张；没有任务时等待，关闭后返回 None"""
+        if self._ended:
+            return None
+        paths = self._carry
+        if not paths:
+            paths = self._jobs.get()
+            if paths is None:
+                self._ended = True
+                return None
+        while len(paths) < self.batch_size:
+            try:
+                more = self._jobs.get_nowait()
+            except queue.Empty:
+                break
+            if more is None:
+                self._ended = True
+                break
+            paths.extend(more)
+        self._carry = paths[self.batch_size:]
+        return paths[:self.batch_size]
+
+
+class FileKeyCache:
+    """以 SQLite 保存的按文件缓存的结果，文件大小或修改时间变化后自动失效；只能在创建它的线程中使用。
+    子类给出表名 TABLE、结果列定义 COLUMNS，需要时覆盖 _encode 和 _decode 转换结果与数据库中的行"""
+
+    TABLE = None
+    COLUMNS = None
+
+    def __init__(self, db_path):
+        self._db = sqlite3.connect(db_path)
+        self._db.execute(f"CREATE TABLE IF NOT EXISTS {self.TABLE} "
+                         f"(path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, {self.COLUMNS})")
+        self._width = len(self.COLUMNS.split(","))
+
+    def _encode(self, value):
+        """结果 → 结果列的值"""
+        return tuple(value)
+
+    def _decode(self, row):
+        """结果列的值 → 结果"""
+        return tuple(row)
+
+    def lookup(self, keys):
+        """批量查询，返回 {绝对路径: 结果}，只包含大小和修改时间都一致的条目"""
+        found = {}
+        keys = list(keys)
+        for start in range(0, len(keys), LOOKUP_CHUNK):
+            chunk = keys[start:start + LOOKUP_CHUNK]
+            wanted = {key[0]: key for key in chunk}
+            rows = self._db.execute(f"SELECT * FROM {self.TABLE} WHERE path IN ({','.join('?' * len(wanted))})",
+                                    list(wanted))
+            for path, size, mtime, *row in rows:
+                if (size, mtime) == tuple(wanted[path][1:]):
+                    found[path] = self._decode(row)
+        return found
+
+    def store(self, entries):
+        """批量写入 [(缓存键, 结果)]"""
+        placeholders = ", ".join("?" * (3 + self._width))
+        self._db.executemany(f"INSERT OR REPLACE INTO {self.TABLE} VALUES ({placeholders})",
+                             [(key[0], key[1], key[2], *self._encode(value)) for key, value in entries])
+        self._db.commit()
+
+    def close(self):
+        self._db.close()
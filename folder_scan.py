@@ -0,0 +1,121 @@
+"""后台递归扫描拖入的文件和文件夹，按文件头识别图片并分批交给队列"""
+import os
+import queue
+import threading
+
+# 各图片格式的文件头特征
+IMAGE_SIGNATURES = (
+    b"\x89PNG\r\n\x1a\n",   # PNG
+    b"\xff\xd8\xff",        # JPEG
+    b"GIF87a", b"GIF89a",   # GIF
+    b"BM",                  # BMP
+    b"II*\x00", b"MM\x00*", # TIFF
+)
+
+# 每批交给队列的图片数量
+SCAN_BATCH_SIZE = 200
+
+
+def sniff_image(path):
+    """读取文件头判断是否为支持的图片格式，而不是看扩展名"""
+    try:
+        with open(path, "rb") as f:
+            header = f.read(16)
+    except OSError:
+        return False
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return True
+    return header.startswith(IMAGE_SIGNATURES)
+
+
+def iter_image_files(paths, cancel_event=None):
+    """用 os.scandir 以流式方式深度优先遍历，逐个产出识别为图片的文件路径"""
+    for path in paths:
+        if os.path.isfile(path):
+            if sniff_image(path):
+                yield path
+            continue
+        stack = [path]
+        while stack:
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as it:
+                    entries = sorted(it, key=lambda e: e.name)
+            except OSError:
+                continue
+            subdirs = []
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif entry.is_file() and sniff_image(entry.path):
+                        yield entry.path
+                except OSError:
+                    continue
+            # 逆序入栈，使子文件夹按名称顺序被遍历
+            stack.extend(reversed(subdirs))
+
+
+class FolderScanner:
+    """在后台线程中依次执行扫描任务，结果通过 poll() 分批取回"""
+
+    def __init__(self, batch_size=SCAN_BATCH_SIZE):
+        self.batch_size = batch_size
+        self._jobs = queue.Queue()
+        self._results = queue.Queue()
+        self._cancel = threading.Event()
+        self._active = 0
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="folder-scanner", daemon=True)
+        self._thread.start()
+
+    @property
+    def busy(self):
+        """是否还有未完成的扫描任务"""
+        with self._lock:
+            return self._active > 0
+
+    def scan(self, paths):
+        """提交一组文件或文件夹路径进行扫描"""
+        with self._lock:
+            self._active += 1
+        self._jobs.put(list(paths))
+
+    def poll(self):
+        """取出已产生的结果，每项为 ("batch", 路径列表) 或 ("done", 找到的图片数)"""
+        results = []
+        while True:
+            try:
+                results.append(self._results.get_nowait())
+            except queue.Empty:
+                return results
+
+    def _run(self):
+        """后台线程：逐个执行扫描任务，攒够一批就交出去"""
+        while True:
+            paths = self._jobs.get()
+            if paths is None:
+                break
+            found = 0
+            batch = []
+            for path in iter_image_files(paths, self._cancel):
+                batch.append(path)
+                # 第一张图片立即交出，让界面尽快开始显示
+                if len(batch) >= self.batch_size or found == 0:
+                    found += len(batch)
+                    self._results.put(("batch", batch))
+                    batch = []
+            if batch:
+                found += len(batch)
+                self._results.put(("batch", batch))
+            # 先交出完成结果再减少计数，保证界面看到空闲时结果已全部入队
+            self._results.put(("done", found))
+            with self._lock:
+                self._active -= 1
+
+    def close(self):
+        """取消正在进行的扫描并停止后台线程"""
+        self._cancel.set()
+        self._jobs.put(None)
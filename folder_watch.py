@@ -0,0 +1,466 @@
+"""热文件夹监视：用 inotify（Linux）或按目录修改时间增量扫描发现新图片，等文件写完后分批交出；已处理的文件记录在磁盘上，重启后不再处理"""
+import ctypes
+import ctypes.util
+import multiprocessing
+import os
+import queue
+import select
+import signal
+import sqlite3
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from folder_scan import sniff_image
+from image_engine import (DEFAULT_BORDER, DEFAULT_PROFILE, EXPORT_PROFILES, IN_FLIGHT_PER_WORKER,
+                          NEEKO_NAME_PATTERN, NeekoAllocator, format_decode_stats, ignore_pixel_warnings, process_file)
+from memory_governor import MemoryGovernor, estimate_job_bytes
+from session_journal import content_key
+
+# 已处理文件记录的位置（由环境变量指定），重启后据此跳过处理过的文件
+WATCH_LEDGER = os.environ.get("NEEKO_WATCH_LEDGER") or os.path.join(os.path.expanduser("~"), ".neeko_watched.sqlite")
+
+# 文件大小和修改时间保持不变多久（秒）后视为写完；只看到创建、还没看到写入方关闭文件时要等更久
+SETTLE_SECONDS = float(os.environ.get("NEEKO_WATCH_SETTLE") or 2.0)
+OPEN_SETTLE_SECONDS = 30.0
+
+# 后台线程检查待定文件的间隔，以及没有 inotify 时检查目录修改时间的间隔（秒）
+WATCH_TICK_SECONDS = 0.5
+WATCH_POLL_SECONDS = 2.0
+
+# 每批交出的图片数量，以及尚未取走的批次上限：达到上限时后台线程暂停，等处理跟上（背压）
+WATCH_BATCH_SIZE = 200
+WATCH_MAX_BATCHES = 4
+
+# 复制工具和浏览器写入中的临时文件，改名为正式文件名后再处理
+TEMP_SUFFIXES = (".tmp", ".part", ".partial", ".crdownload", ".download", "~")
+
+# 各格式的文件尾：文件头已写出但文件尾还没有时认为仍在写入（个别相机会在文件尾之后追加数据，等待 OPEN_SETTLE_SECONDS 后照常处理）
+IMAGE_TRAILERS = (
+    (b"\x89PNG", b"IEND\xaeB`\x82"),
+    (b"\xff\xd8", b"\xff\xd9"),
+    (b"GIF8", b";"),
+)
+
+# inotify 事件掩码（linux/inotify.h）
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def is_candidate_name(name):
+    """跳过隐藏文件、写入中的临时文件和本程序导出的 NEEKO_n 文件"""
+    return not (name.startswith(".") or name.lower().endswith(TEMP_SUFFIXES) or NEEKO_NAME_PATTERN.match(name))
+
+
+def trailer_written(path):
+    """对有固定文件尾的格式（PNG、JPEG、GIF）检查文件尾是否已写出，其它格式总是返回 True"""
+    try:
+        with open(path, "rb") as f:
+            header = f.read(8)
+            f.seek(-16, os.SEEK_END)
+            tail = f.read()
+    except OSError:
+        return False
+    for signature, trailer in IMAGE_TRAILERS:
+        if header.startswith(signature):
+            return trailer in tail
+    return True
+
+
+class Inotify:
+    """通过 ctypes 调用 Linux inotify；不支持的平台在创建时抛出 OSError"""
+
+    def __init__(self):
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify 只在 Linux 上可用")
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            self._add_watch = libc.inotify_add_watch
+            init = libc.inotify_init1
+        except (OSError, AttributeError) as e:
+            raise OSError(f"无法加载 inotify：{e}")
+        self.fd = init(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self.directories = {}  # 监视描述符 → 目录
+
+    def add(self, directory):
+        """监视一个目录（不含子目录），达到系统的监视数量上限时抛出 OSError"""
+        wd = self._add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), directory)
+        self.directories[wd] = directory
+
+    def read(self, timeout):
+        """等待最多 timeout 秒，返回 [(目录, 文件名, 掩码)]；事件队列溢出时目录为 None"""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self.fd, 256 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                events.append((None, "", mask))
+                continue
+            directory = self.directories.get(wd)
+            if mask & IN_IGNORED:
+                # 目录已被删除或移走，内核自动撤销了监视
+                self.directories.pop(wd, None)
+            elif directory is not None:
+                events.append((directory, name, mask))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FolderWatcher:
+    """在后台线程中监视一组文件夹（包括子文件夹），写完的新图片通过 poll() 分批取回；每个文件的同一版本只交出一次"""
+
+    def __init__(self, directories, exclude=(), settle=SETTLE_SECONDS, use_inotify=True):
+        self.directories = [os.path.abspath(directory) for directory in directories]
+        self.exclude = {os.path.normcase(os.path.realpath(directory)) for directory in exclude}
+        self.settle = settle
+        self._inotify = None
+        if use_inotify:
+            try:
+                self._inotify = Inotify()
+            except OSError:
+                pass
+        self._dirs = {}  # 已发现的目录 → 上次扫描时的修改时间
+        self._seen = {}  # 已交出（或判定不是图片）的文件 → (大小, 修改时间)
+        self._pending = {}  # 待定文件 → [大小, 修改时间, 开始保持不变的时刻, 写入方是否已关闭]
+        self._results = queue.Queue(maxsize=WATCH_MAX_BATCHES)
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="folder-watcher", daemon=True)
+        self._thread.start()
+
+    @property
+    def backend(self):
+        """当前使用的方式："inotify" 或 "polling"（监视数量超出系统上限时会自动改为后者）"""
+        return "inotify" if self._inotify is not None else "polling"
+
+    def poll(self, max_batches=None):
+        """取出已写完的图片，每项为一批路径列表；max_batches 限制本次取出的批数，处理跟不上时少取即可形成背压"""
+        results = []
+        while max_batches is None or len(results) < max_batches:
+            try:
+                results.append(self._results.get_nowait())
+            except queue.Empty:
+                break
+        return results
+
+    def _excluded(self, path):
+        return os.path.normcase(os.path.realpath(path)) in self.exclude
+
+    def _track_file(self, path, size, mtime_ns, closed):
+        """把新出现或有变化的文件加入待定表；早已写完的文件（修改时间足够久）不必再等待"""
+        if self._seen.get(path) == (size, mtime_ns):
+            return
+        entry = self._pending.get(path)
+        if entry is not None:
+            entry[3] = entry[3] or closed
+            return
+        since = time.monotonic()
+        if closed and time.time() - mtime_ns / 1e9 >= self.settle:
+            since -= self.settle
+        self._pending[path] = [size, mtime_ns, since, closed]
+
+    def _scan_dir(self, directory):
+        """扫描一个目录：登记（并监视）新的子目录，把新文件加入待定表"""
+        stack = [directory]
+        while stack:
+            directory = stack.pop()
+            try:
+                mtime_ns = os.stat(directory).st_mtime_ns
+                if directory not in self._dirs and self._inotify is not None:
+                    # 先监视再列目录，列目录期间新建的文件不会漏掉
+                    self._watch(directory)
+                self._dirs[directory] = mtime_ns
+                with os.scandir(directory) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+            for entry in entries:
+                if not is_candidate_name(entry.name):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.path not in self._dirs and not self._excluded(entry.path):
+                            stack.append(entry.path)
+                    elif entry.is_file():
+                        stat = entry.stat()
+                        self._track_file(entry.path, stat.st_size, stat.st_mtime_ns, True)
+                except OSError:
+                    continue
+
+    def _watch(self, directory):
+        """用 inotify 监视目录；超出系统上限时改为轮询"""
+        try:
+            self._inotify.add(directory)
+        except OSError:
+            self._inotify.close()
+            self._inotify = None
+
+    def _rescan_changed(self):
+        """轮询方式：目录的修改时间变化（增删或改名了文件）时才重新列出该目录"""
+        now = time.time()
+        for directory, mtime_ns in list(self._dirs.items()):
+            try:
+                current = os.stat(directory).st_mtime_ns
+            except OSError:
+                del self._dirs[directory]
+                continue
+            # 修改时间精度较粗的文件系统上，同一时间单位内的后续改动不会改变修改时间，最近改过的目录多扫几次
+            if current != mtime_ns or now - current / 1e9 < self.settle:
+                self._scan_dir(directory)
+
+    def _handle_events(self, events):
+        """inotify 方式：新文件加入待定表，新目录登记后扫描；事件队列溢出时全部重新扫描"""
+        for directory, name, mask in events:
+            if directory is None:
+                for root in self.directories:
+                    self._scan_dir(root)
+                continue
+            if not name or not is_candidate_name(name):
+                continue
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and not self._excluded(path):
+                    self._scan_dir(path)
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            # 刚创建的文件要等写入方关闭；移入的文件已经写完
+            self._track_file(path, stat.st_size, stat.st_mtime_ns, not mask & IN_CREATE)
+
+    def _settled(self):
+        """检查待定文件，返回大小和修改时间已保持足够久且文件尾完整的图片"""
+        ready = []
+        now = time.monotonic()
+        for path, entry in list(self._pending.items()):
+            size, mtime_ns, since, closed = entry
+            try:
+                stat = os.stat(path)
+            except OSError:
+                del self._pending[path]
+                continue
+            if (stat.st_size, stat.st_mtime_ns) != (size, mtime_ns):
+                entry[:3] = [stat.st_size, stat.st_mtime_ns, now]
+                continue
+            waited = now - since
+            if size == 0 or waited < (self.settle if closed else OPEN_SETTLE_SECONDS):
+                continue
+            is_image = sniff_image(path)
+            if is_image and not trailer_written(path) and waited < OPEN_SETTLE_SECONDS:
+                continue
+            # 不是图片的文件也记下，内容不变时不再检查
+            del self._pending[path]
+            self._seen[path] = (size, mtime_ns)
+            if is_image:
+                ready.append(path)
+        return ready
+
+    def _emit(self, paths):
+        """分批交出；未取走的批次已满时等待，关闭时放弃"""
+        for start in range(0, len(paths), WATCH_BATCH_SIZE):
+            batch = paths[start:start + WATCH_BATCH_SIZE]
+            while not self._closed.is_set():
+                try:
+                    self._results.put(batch, timeout=WATCH_TICK_SECONDS)
+                    break
+                except queue.Full:
+                    continue
+
+    def _run(self):
+        """后台线程：先扫描已有文件，之后等待 inotify 事件或定时检查目录，待定文件写完后交出"""
+        try:
+            for directory in self.directories:
+                self._scan_dir(directory)
+            last_poll = time.monotonic()
+            while not self._closed.is_set():
+                if self._inotify is not None:
+                    self._handle_events(self._inotify.read(WATCH_TICK_SECONDS))
+                else:
+                    self._closed.wait(WATCH_TICK_SECONDS)
+                    if time.monotonic() - last_poll >= WATCH_POLL_SECONDS:
+                        self._rescan_changed()
+                        last_poll = time.monotonic()
+                ready = self._settled()
+                if ready:
+                    self._emit(sorted(ready))
+        finally:
+            if self._inotify is not None:
+                self._inotify.close()
+
+    def stop(self):
+        """通知后台线程停止但不等待它退出，界面线程之后用 stopped 检查；尚未取走的结果被丢弃"""
+        self._closed.set()
+
+    @property
+    def stopped(self):
+        """后台线程是否已退出"""
+        return not self._thread.is_alive()
+
+    def close(self):
+        """停止后台线程并等待其退出，尚未取走的结果被丢弃"""
+        self.stop()
+        self._thread.join()
+
+
+class ProcessedLedger:
+    """以 SQLite 记录已处理（或已交给界面队列）的文件，按内容标识判断，文件被替换后会重新处理；只能在创建它的线程中使用"""
+
+    def __init__(self, db_path):
+        self._db = sqlite3.connect(db_path)
+        self._db.execute("CREATE TABLE IF NOT EXISTS processed (path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, "
+                         "output TEXT, processed_at REAL)")
+
+    def unprocessed(self, paths):
+        """返回 [(路径, 内容标识)]，只包含未记录或记录后内容已变化的文件；已不存在的文件被忽略"""
+        keys = []
+        for path in paths:
+            try:
+                keys.append((path, content_key(path)))
+            except OSError:
+                continue
+        remaining = []
+        # SQLite 单条语句的参数个数有限，分段查询
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = self._db.execute(f"SELECT path, size, mtime FROM processed WHERE path IN ({','.join('?' * len(chunk))})",
+                                    [key[0] for _, key in chunk])
+            done = {path: (size, mtime) for path, size, mtime in rows}
+            remaining.extend((path, key) for path, key in chunk if done.get(key[0]) != tuple(key[1:]))
+        return remaining
+
+    def record(self, entries):
+        """批量写入 [(内容标识, 输出路径或 None)]"""
+        now = time.time()
+        self._db.executemany("INSERT OR REPLACE INTO processed VALUES (?, ?, ?, ?, ?)",
+                             [(key[0], key[1], key[2], output, now) for key, output in entries])
+        self._db.commit()
+
+    def close(self):
+        self._db.close()
+
+
+def _remove_placeholder(path):
+    """删除为失败或撤回的任务预留的空文件；文件已不存在时忽略"""
+    try:
+        if os.path.getsize(path) == 0:
+            os.remove(path)
+    except OSError:
+        pass
+
+
+def _ignore_interrupt():
+    """工作进程忽略 Ctrl+C，由主进程撤回未开始的任务并等待正在处理的图片完成；未超过像素上限的大图不发出警告"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    ignore_pixel_warnings()
+
+
+def run_watch(directories, output_dir, ratio="4:3", border=DEFAULT_BORDER, workers=None, auto_crop=False,
+              profile=DEFAULT_PROFILE, ledger_path=WATCH_LEDGER, stage_stats=None, verbose=False, stop_event=None):
+    """监视文件夹并在进程池中逐张 裁剪 → 加边框 → 保存，直到 stop_event 被设置或按下 Ctrl+C；返回 (成功张数, 失败张数)"""
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    limit = workers * IN_FLIGHT_PER_WORKER
+    ext = EXPORT_PROFILES[profile]["ext"]
+    allocator = NeekoAllocator(output_dir, ext)
+    ledger = ProcessedLedger(ledger_path)
+    governor = MemoryGovernor()
+    # 监视线程运行期间才会启动工作进程，用 spawn 而不是 fork
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=_ignore_interrupt)
+    # 输出目录在监视的文件夹内时不监视它，否则会处理自己的输出
+    watcher = FolderWatcher(directories, exclude=[output_dir])
+    print(f"正在监视 {', '.join(watcher.directories)}（{watcher.backend}），输出到 {output_dir}，按 Ctrl+C 停止")
+
+    waiting = []  # 已从监视器取出、等待提交的 (路径, 内容标识)
+    in_flight = {}
+    succeeded = failed = 0
+
+    def collect(done):
+        nonlocal succeeded, failed
+        finished = []
+        for future in done:
+            src_path, dst_path, key, nbytes = in_flight.pop(future)
+            governor.release(nbytes)
+            try:
+                _, _, stats = future.result()
+            except Exception as e:
+                failed += 1
+                # 删除为失败任务预留的空文件；不记入已处理，下次启动时重试
+                _remove_placeholder(dst_path)
+                print(f"处理失败: {src_path}: {e}", file=sys.stderr)
+                if stage_stats is not None:
+                    stage_stats.record(src_path, None, error=str(e))
+                continue
+            succeeded += 1
+            finished.append((key, dst_path))
+            if stage_stats is not None:
+                stage_stats.record(src_path, stats["timings"], output=dst_path, method=stats["method"])
+            print(f"{src_path} -> {dst_path}" + (f": {format_decode_stats(stats)}" if verbose else ""))
+        if finished:
+            ledger.record(finished)
+
+    try:
+        while stop_event is None or not stop_event.is_set():
+            # 进程池和等待列表都满时不再从监视器取新批次，监视器的批次积满后会暂停
+            if len(waiting) < limit:
+                for batch in watcher.poll(max_batches=1):
+                    waiting.extend(ledger.unprocessed(batch))
+            while waiting and len(in_flight) < limit:
+                src_path, key = waiting[0]
+                nbytes = estimate_job_bytes(src_path)
+                # 工作进程的内存以预约计入预算：余量不足时等已提交的图片完成，没有任务在运行时等待放行
+                if not governor.reserve(nbytes, block=not in_flight):
+                    break
+                waiting.pop(0)
+                dst_path = allocator.reserve()[2]
+                future = executor.submit(process_file, src_path, dst_path, ratio, border, auto_crop, profile)
+                in_flight[future] = (src_path, dst_path, key, nbytes)
+            if in_flight:
+                done, _ = wait(in_flight, timeout=WATCH_TICK_SECONDS, return_when=FIRST_COMPLETED)
+                collect(done)
+            elif stop_event is not None:
+                stop_event.wait(WATCH_TICK_SECONDS)
+            else:
+                time.sleep(WATCH_TICK_SECONDS)
+    except KeyboardInterrupt:
+        print("正在停止：撤回未开始的任务，等待正在处理的图片完成…")
+    finally:
+        watcher.close()
+        for future, (_, dst_path, _, nbytes) in list(in_flight.items()):
+            if future.cancel():
+                del in_flight[future]
+                governor.release(nbytes)
+                _remove_placeholder(dst_path)
+        collect(list(in_flight))
+        executor.shutdown()
+        ledger.close()
+    return succeeded, failed
@@ -0,0 +1,189 @@
+"""多帧图片（GIF、APNG、多页 TIFF）逐帧导出：每帧定位、裁剪、加白边后立即交给编码器，内存中只保留一两帧"""
+import io
+import struct
+import time
+import zlib
+
+from PIL import GifImagePlugin, Image, TiffImagePlugin
+
+from image_engine import add_border
+from stage_timing import span
+
+# 可以逐帧导出的源格式，以及能保存多帧的输出格式
+FRAME_SOURCE_FORMATS = ("GIF", "PNG", "TIFF")
+FRAME_OUTPUT_FORMATS = ("GIF", "PNG", "TIFF")
+
+# 源文件未记录帧时长时使用的默认值（毫秒）
+DEFAULT_FRAME_DURATION = 100
+
+# GIF 处置方式 → APNG dispose_op（0 保留、1 清为透明、2 恢复上一帧）
+APNG_DISPOSE_OPS = {2: 1, 3: 2}
+
+
+def _png_chunk(fp, tag, data):
+    """写出一个 PNG 数据块"""
+    fp.write(struct.pack(">I", len(data)) + tag + data)
+    fp.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(tag)) & 0xFFFFFFFF))
+
+
+def _png_chunks(data):
+    """拆分 PNG 文件数据，返回 [(类型, 内容)]"""
+    chunks = []
+    pos = 8
+    while pos < len(data):
+        length, tag = struct.unpack(">I4s", data[pos:pos + 8])
+        chunks.append((tag, data[pos + 8:pos + 8 + length]))
+        pos += 12 + length
+    return chunks
+
+
+def is_multiframe(image):
+    """判断已打开的图片是否为需要逐帧导出的多帧图片"""
+    return image.format in FRAME_SOURCE_FORMATS and getattr(image, "is_animated", False)
+
+
+def iter_frames(image, box, border, mode, timings=None):
+    """逐帧定位、裁剪并加白边，产出 (帧, 时长毫秒, 处置方式)；裁剪框超出某一页时按该页尺寸截断"""
+    x1, y1, x2, y2 = box
+    for index in range(image.n_frames):
+        with span(timings, "decode"):
+            image.seek(index)
+            image.load()
+        with span(timings, "crop"):
+            width, height = image.size
+            frame = image.crop((min(x1, width - 1), min(y1, height - 1), min(x2, width), min(y2, height)))
+            if frame.mode != mode:
+                frame = frame.convert(mode)
+        with span(timings, "border"):
+            frame = add_border(frame, border)
+        duration = image.info.get("duration") or DEFAULT_FRAME_DURATION
+        yield frame, duration, getattr(image, "disposal_method", 0)
+
+
+def _gif_frame(frame):
+    """把一帧量化为带 256 色局部调色板的 P 模式，半透明以下的像素映射到索引 255，返回 (图片, 透明索引或 None)"""
+    if frame.mode != "RGBA":
+        return frame.convert("P", palette=Image.ADAPTIVE, colors=256), None
+    indexed = frame.convert("RGB").convert("P", palette=Image.ADAPTIVE, colors=255)
+    indexed.paste(255, mask=frame.getchannel("A").point(lambda a: 255 if a < 128 else 0))
+    palette = indexed.getpalette()[:765]
+    indexed.putpalette(palette + [0] * (768 - len(palette)))
+    return indexed, 255
+
+
+def write_gif(frames, fp, loop=None, timings=None):
+    """逐帧写出 GIF：每帧带自己的调色板和时长；有透明像素的帧改为恢复背景，避免透出上一帧"""
+    count = 0
+    for frame, duration, disposal in frames:
+        with span(timings, "encode"):
+            indexed, transparency = _gif_frame(frame)
+            parts = []
+            if count == 0:
+                info = {"duration": duration}
+                if loop is not None:
+                    info["loop"] = loop
+                header, _ = GifImagePlugin.getheader(indexed.copy(), info=info)
+                parts.extend(header)
+            params = {"duration": duration, "disposal": 2 if transparency is not None else disposal,
+                      "include_color_table": True}
+            if transparency is not None:
+                params["transparency"] = transparency
+            parts.extend(GifImagePlugin.getdata(indexed, **params))
+        with span(timings, "write"):
+            fp.write(b"".join(parts))
+        count += 1
+    fp.write(b";")
+    return count
+
+
+def write_apng(frames, fp, frame_count, loop=None, options=None, timings=None):
+    """逐帧写出 APNG：每帧先用 Pillow 编码为 PNG，再把图像数据改写为 IDAT（第一帧）或 fdAT 块"""
+    sequence = 0
+    count = 0
+    for frame, duration, disposal in frames:
+        with span(timings, "encode"):
+            buffer = io.BytesIO()
+            frame.save(buffer, "PNG", **(options or {}))
+            chunks = _png_chunks(buffer.getvalue())
+        with span(timings, "write"):
+            if count == 0:
+                fp.write(buffer.getvalue()[:8])
+                for tag, data in chunks:
+                    if tag == b"IHDR":
+                        _png_chunk(fp, tag, data)
+                        # 未记录循环次数的 GIF 只播放一次
+                        _png_chunk(fp, b"acTL", struct.pack(">II", frame_count, 1 if loop is None else loop))
+                        break
+            fcTL = struct.pack(">IIIIIHHBB", sequence, frame.width, frame.height, 0, 0,
+                               min(int(duration), 65535), 1000, APNG_DISPOSE_OPS.get(disposal, 0), 0)
+            _png_chunk(fp, b"fcTL", fcTL)
+            sequence += 1
+            for tag, data in chunks:
+                if tag == b"IDAT":
+                    if count == 0:
+                        _png_chunk(fp, b"IDAT", data)
+                    else:
+                        _png_chunk(fp, b"fdAT", struct.pack(">I", sequence) + data)
+                        sequence += 1
+                elif count == 0 and tag not in (b"IHDR", b"IEND"):
+                    # 调色板、gAMA 等辅助块只在第一帧之前写出一次
+                    _png_chunk(fp, tag, data)
+        count += 1
+    _png_chunk(fp, b"IEND", b"")
+    return count
+
+
+def write_tiff(frames, save_path, options=None, timings=None):
+    """逐页追加写出多页 TIFF"""
+    count = 0
+    with TiffImagePlugin.AppendingTiffWriter(save_path, new=True) as writer:
+        for frame, _, _ in frames:
+            with span(timings, "encode"):
+                frame.save(writer, "TIFF", **(options or {}))
+                writer.newFrame()
+            count += 1
+    return count
+
+
+def export_frames(file_path, box, border, save_path, file_format, options=None, timings=None):
+    """逐帧导出多帧图片，返回解码统计（含帧数和每帧耗时）；源图片只有一帧或输出格式不支持多帧时返回 None"""
+    if file_format not in FRAME_OUTPUT_FORMATS:
+        return None
+    with Image.open(file_path) as image:
+        if not is_multiframe(image):
+            return None
+        frame_count = image.n_frames
+        loop = image.info.get("loop")
+        has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+        # GIF 的后续帧可能带透明，统一按 RGBA 处理；其它格式各帧的模式与第一帧相同
+        mode = "RGBA" if has_alpha or image.format == "GIF" else "RGB"
+        frame_bytes = image.width * image.height * len(mode)
+
+        frame_times = []
+
+        def timed(frames):
+            # 记录每帧从定位到写出的耗时（生成器在编码器取下一帧时才继续）
+            start = time.perf_counter()
+            for item in frames:
+                yield item
+                now = time.perf_counter()
+                frame_times.append(now - start)
+                start = now
+
+        frames = timed(iter_frames(image, box, border, mode, timings))
+        if file_format == "TIFF":
+            write_tiff(frames, save_path, options, timings)
+        else:
+            with open(save_path, "wb") as fp:
+                if file_format == "GIF":
+                    write_gif(frames, fp, loop, timings)
+                else:
+                    write_apng(frames, fp, frame_count, loop, options, timings)
+    return {
+        "method": "frames",
+        "decoded_bytes": frame_bytes,
+        "full_bytes": frame_bytes * frame_count,
+        "frames": len(frame_times),
+        "frame_seconds": sum(frame_times) / len(frame_times) if frame_times else 0.0,
+        "max_frame_seconds": max(frame_times, default=0.0),
+    }
@@ -0,0 +1,147 @@
+"""队列图片的后台预读与按字节数限制容量的 LRU 预览缓存；设置了内存预算时，余量不足就不再预读"""
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from image_engine import build_preview
+from memory_governor import estimate_decode_bytes
+
+
+def image_nbytes(image):
+    """估算图片像素数据占用的字节数"""
+    return image.width * image.height * len(image.getbands())
+
+
+class PreviewCache:
+    """以文件路径为键、按总字节数淘汰最久未使用条目的预览缓存"""
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, path):
+        with self._lock:
+            return path in self._entries
+
+    def put(self, path, preview):
+        """放入预览图，超出容量时淘汰最久未使用的条目"""
+        size = image_nbytes(preview)
+        with self._lock:
+            if path in self._entries:
+                self.current_bytes -= self._entries.pop(path)[1]
+            self._entries[path] = (preview, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+
+    def take(self, path, record=True):
+        """取出并移除预览图，同时记录命中/未命中次数；未命中返回 None"""
+        with self._lock:
+            entry = self._entries.pop(path, None)
+            if entry is None:
+                if record:
+                    self.misses += 1
+                return None
+            if record:
+                self.hits += 1
+            self.current_bytes -= entry[1]
+            return entry[0]
+
+    def trim(self, max_bytes=0):
+        """淘汰最久未使用的条目，直到已用字节数不超过 max_bytes"""
+        with self._lock:
+            while self.current_bytes > max_bytes and self._entries:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+
+    def retain(self, paths):
+        """只保留 paths 中的条目，其余全部失效"""
+        keep = set(paths)
+        with self._lock:
+            for path in [p for p in self._entries if p not in keep]:
+                self.current_bytes -= self._entries.pop(path)[1]
+
+    def stats(self):
+        """返回 (命中次数, 未命中次数, 条目数, 已用字节数)"""
+        with self._lock:
+            return self.hits, self.misses, len(self._entries), self.current_bytes
+
+
+class Prefetcher:
+    """在线程池中提前解码队列里接下来几张图片并生成预览"""
+
+    def __init__(self, cache, preview_size, depth=3, workers=2, governor=None):
+        self.cache = cache
+        self.preview_size = preview_size
+        self.depth = depth
+        self.governor = governor
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+
+    def _load(self, path):
+        """后台线程：生成预览并放入缓存；内存余量不足时放弃，切换到该图片时再同步解码"""
+        try:
+            if self.governor is None:
+                self.cache.put(path, build_preview(path, self.preview_size))
+                return
+            nbytes = estimate_decode_bytes(path)
+            if not self.governor.reserve(nbytes, block=False):
+                return
+            try:
+                self.cache.put(path, build_preview(path, self.preview_size))
+            finally:
+                self.governor.release(nbytes)
+        finally:
+            with self._lock:
+                self._pending.pop(path, None)
+
+    def prefetch(self, queue):
+        """为队列前 depth 张尚未缓存的图片安排后台解码"""
+        with self._lock:
+            for path in islice(queue, self.depth):
+                if path not in self._pending and path not in self.cache:
+                    self._pending[path] = self._executor.submit(self._load, path)
+
+    def invalidate(self, queue):
+        """队列顺序变化后，丢弃不再位于预读窗口内的缓存和尚未开始的任务"""
+        window = list(islice(queue, self.depth))
+        with self._lock:
+            for path, future in list(self._pending.items()):
+                if path not in window and future.cancel():
+                    del self._pending[path]
+        self.cache.retain(window)
+        self.prefetch(window)
+
+    def get(self, path):
+        """获取预览图：优先取缓存，其次等待进行中的预读，最后同步解码"""
+        preview = self.cache.take(path)
+        if preview is not None:
+            return preview
+        with self._lock:
+            future = self._pending.get(path)
+            # 尚未开始的预读撤回后不会再运行，不能留在 _pending 中，否则之后不会再为它安排预读
+            cancelled = future is not None and future.cancel()
+            if cancelled:
+                del self._pending[path]
+        if future is not None and not cancelled:
+            # 该图片正在后台解码，等待其完成比重新解码更快
+            future.result()
+            preview = self.cache.take(path, record=False)
+            if preview is not None:
+                return preview
+        return build_preview(path, self.preview_size)
+
+    def shutdown(self):
+        """取消尚未开始的预读任务并关闭线程池"""
+        with self._lock:
+            for future in self._pending.values():
+                future.cancel()
+            self._pending.clear()
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,647 @@
+"""无界面的图片裁剪与加边框引擎，可独立于 Tkinter 在命令行中批量运行"""
+import argparse
+import importlib
+import os
+import re
+import sys
+import threading
+import time
+import warnings
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from PIL import Image, ImageOps
+
+from stage_timing import StageStats, span
+
+try:
+    import resource
+except ImportError:
+    # Windows 上没有 resource 模块，无法读取进程峰值内存
+    resource = None
+
+# 支持的图片扩展名
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".gif", ".tif", ".tiff")
+
+# 默认白色边框宽度（像素）
+DEFAULT_BORDER = 60
+
+# 未压缩数据中每像素字节数已知的原始格式，可以按行跳读
+RAW_BYTES_PER_PIXEL = {
+    "1": None, "L": 1, "P": 1, "LA": 2, "RGB": 3, "BGR": 3,
+    "RGBA": 4, "RGBX": 4, "BGRA": 4, "BGRX": 4, "CMYK": 4,
+}
+
+# 导出配置：输出格式、扩展名和传给 Pillow 的编码参数
+EXPORT_PROFILES = {
+    # Pillow 默认参数（zlib 级别 6），与以往的输出完全一致
+    "png": {"format": "PNG", "ext": ".png", "options": {}},
+    "png-fast": {"format": "PNG", "ext": ".png", "options": {"compress_level": 1}},
+    "png-small": {"format": "PNG", "ext": ".png", "options": {"compress_level": 9, "optimize": True}},
+    "jpeg": {"format": "JPEG", "ext": ".jpg", "options": {"quality": 90, "subsampling": "4:2:0"}},
+    "jpeg-high": {"format": "JPEG", "ext": ".jpg",
+                  "options": {"quality": 95, "subsampling": "4:4:4", "optimize": True}},
+    "jpeg-small": {"format": "JPEG", "ext": ".jpg",
+                   "options": {"quality": 80, "subsampling": "4:2:0", "optimize": True, "progressive": True}},
+    "webp": {"format": "WEBP", "ext": ".webp", "options": {"quality": 90, "method": 4}},
+    "webp-lossless": {"format": "WEBP", "ext": ".webp", "options": {"lossless": True, "quality": 80, "method": 4}},
+}
+
+DEFAULT_PROFILE = "png"
+
+# 允许打开的最大像素数（由环境变量指定，0 表示不限制），超出时拒绝打开，防止解压炸弹耗尽内存
+MAX_IMAGE_PIXELS = int(os.environ.get("NEEKO_MAX_IMAGE_PIXELS") or 250_000_000)
+
+# 匹配已导出的 NEEKO_n 文件名
+NEEKO_NAME_PATTERN = re.compile(r"^NEEKO_(\d+)\.", re.IGNORECASE)
+
+
+def set_pixel_limit(max_pixels):
+    """设置打开图片的像素上限：超出时 Image.open 抛出 DecompressionBombError"""
+    # Pillow 在超过 MAX_IMAGE_PIXELS 时只发出警告，超过其两倍才拒绝打开
+    Image.MAX_IMAGE_PIXELS = max_pixels // 2 if max_pixels else None
+
+
+def ignore_pixel_warnings():
+    """不再对未超过像素上限的大图发出 DecompressionBombWarning；会改变整个进程的警告过滤器，只由程序入口和工作进程初始化时调用"""
+    warnings.filterwarnings("ignore", category=Image.DecompressionBombWarning)
+
+
+# 导入时即生效，命令行批处理和 spawn 启动的工作进程也使用同一上限
+set_pixel_limit(MAX_IMAGE_PIXELS)
+
+# 每个工作进程最多同时排队的任务数：取消时只需等这些任务完成，内存预约也只覆盖这些任务
+IN_FLIGHT_PER_WORKER = 2
+
+
+def compute_crop_size(img_width, img_height, ratio):
+    """计算指定比例下不超过图片尺寸的最大裁剪框，4:3始终横长，3:4始终竖长"""
+    if ratio == "4:3":
+        if (img_width / img_height) >= 4/3:
+            # 图片比4:3更宽，以图片高度为基准
+            crop_height = img_height
+            crop_width = int(crop_height * 4/3)
+            crop_width = min(crop_width, img_width)
+            crop_height = int(crop_width * 3/4)
+        else:
+            # 图片比4:3更窄，以图片宽度为基准
+            crop_width = img_width
+            crop_height = int(crop_width * 3/4)
+            crop_height = min(crop_height, img_height)
+            crop_width = int(crop_height * 4/3)
+    else:
+        if (img_width / img_height) <= 3/4:
+            # 图片比3:4更窄，以图片宽度为基准
+            crop_width = img_width
+            crop_height = int(crop_width * 4/3)
+            crop_height = min(crop_height, img_height)
+            crop_width = int(crop_height * 3/4)
+        else:
+            # 图片比3:4更宽，以图片高度为基准
+            crop_height = img_height
+            crop_width = int(crop_height * 3/4)
+            crop_width = min(crop_width, img_width)
+            crop_height = int(crop_width * 4/3)
+    return crop_width, crop_height
+
+
+def compute_centered_crop(img_width, img_height, ratio):
+    """计算居中的最大裁剪区域，返回原图坐标 (x1, y1, x2, y2)"""
+    crop_width, crop_height = compute_crop_size(img_width, img_height, ratio)
+    x1 = (img_width - crop_width) // 2
+    y1 = (img_height - crop_height) // 2
+    return x1, y1, x1 + crop_width, y1 + crop_height
+
+
+def normalize_box(box, img_width, img_height):
+    """把原图坐标的裁剪框换算为相对图片宽高的 0~1 坐标"""
+    x1, y1, x2, y2 = box
+    return x1 / img_width, y1 / img_height, x2 / img_width, y2 / img_height
+
+
+def denormalize_box(norm_box, img_width, img_height, ratio):
+    """把归一化裁剪框换算到指定尺寸的图片上：保持中心位置和相对宽度，修正为精确比例并限制在图片内"""
+    fx1, fy1, fx2, fy2 = norm_box
+    max_width, max_height = compute_crop_size(img_width, img_height, ratio)
+    aspect = 4/3 if ratio == "4:3" else 3/4
+    crop_width = min(max_width, max(1, round((fx2 - fx1) * img_width)))
+    crop_height = min(max_height, max(1, int(crop_width / aspect)))
+    crop_width = min(crop_width, max(1, int(crop_height * aspect)))
+    x1 = round((fx1 + fx2) / 2 * img_width - crop_width / 2)
+    y1 = round((fy1 + fy2) / 2 * img_height - crop_height / 2)
+    x1 = max(0, min(x1, img_width - crop_width))
+    y1 = max(0, min(y1, img_height - crop_height))
+    return x1, y1, x1 + crop_width, y1 + crop_height
+
+
+def add_border(image, border=DEFAULT_BORDER):
+    """在图片四周添加白色边框"""
+    return ImageOps.expand(image, border=(border, border, border, border), fill="white")
+
+
+def crop_and_border(image, box, border=DEFAULT_BORDER):
+    """裁剪图片并在四周添加白色边框"""
+    return add_border(image.crop(box), border)
+
+
+def peak_rss_bytes():
+    """当前进程的峰值常驻内存（字节），不支持的平台返回 None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _proc_rss():
+    """Linux：从 /proc 读取当前常驻内存"""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def _darwin_rss_reader():
+    """macOS：返回用 task_info(MACH_TASK_BASIC_INFO) 读取当前常驻内存的函数"""
+    import ctypes
+    import ctypes.util
+
+    class MachTaskBasicInfo(ctypes.Structure):
+        _pack_ = 4
+        _fields_ = [("virtual_size", ctypes.c_uint64), ("resident_size", ctypes.c_uint64),
+                    ("resident_size_max", ctypes.c_uint64), ("user_time", ctypes.c_int32 * 2),
+                    ("system_time", ctypes.c_int32 * 2), ("policy", ctypes.c_int32), ("suspend_count", ctypes.c_int32)]
+
+    libc = ctypes.CDLL(ctypes.util.find_library("c"))
+    task = ctypes.c_uint32.in_dll(libc, "mach_task_self_").value
+    libc.task_info.argtypes = [ctypes.c_uint32, ctypes.c_int, ctypes.c_void_p, ctypes.POINTER(ctypes.c_uint32)]
+
+    def read():
+        info = MachTaskBasicInfo()
+        count = ctypes.c_uint32(ctypes.sizeof(info) // 4)
+        # MACH_TASK_BASIC_INFO = 20
+        if libc.task_info(task, 20, ctypes.byref(info), ctypes.byref(count)) != 0:
+            raise OSError("task_info 调用失败")
+        return info.resident_size
+
+    return read
+
+
+def _windows_rss_reader():
+    """Windows：返回用 GetProcessMemoryInfo 读取当前工作集大小的函数"""
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                    ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                    ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                    ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+    kernel32 = ctypes.WinDLL("kernel32")
+    psapi = ctypes.WinDLL("psapi")
+    kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+    psapi.GetProcessMemoryInfo.argtypes = [wintypes.HANDLE, ctypes.c_void_p, wintypes.DWORD]
+    psapi.GetProcessMemoryInfo.restype = wintypes.BOOL
+
+    def read():
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        if not psapi.GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+            raise OSError("GetProcessMemoryInfo 调用失败")
+        return counters.WorkingSetSize
+
+    return read
+
+
+def _find_rss_reader():
+    """按平台选择读取当前常驻内存的函数，都不可用时返回 None"""
+    try:
+        if os.path.exists("/proc/self/statm"):
+            return _proc_rss
+        if sys.platform == "darwin":
+            return _darwin_rss_reader()
+        if sys.platform == "win32":
+            return _windows_rss_reader()
+    except (OSError, AttributeError, ValueError):
+        pass
+    return None
+
+
+_rss_reader = False
+
+
+def current_rss_bytes():
+    """当前进程的常驻内存（字节）；读不到当前值的平台返回 None，不退回只增不减的峰值"""
+    global _rss_reader
+    if _rss_reader is False:
+        _rss_reader = _find_rss_reader()
+    if _rss_reader is None:
+        return None
+    try:
+        return _rss_reader()
+    except (OSError, ValueError):
+        return None
+
+
+def _replace_tile(tile, extents, offset=None, args=None):
+    """复制一个 tile 并替换其范围、偏移和参数（兼容新旧版本 Pillow 的 tile 类型）"""
+    name, _, old_offset, old_args = tile
+    offset = old_offset if offset is None else offset
+    args = old_args if args is None else args
+    if hasattr(tile, "_replace"):
+        return tile._replace(extents=extents, offset=offset, args=args)
+    return (name, extents, offset, args)
+
+
+def _restrict_tiles(image, box):
+    """在解码前改写图片的 tile 列表，使其只覆盖裁剪框，返回 (解码方式, 解码区域左上角)"""
+    x1, y1, x2, y2 = box
+    width, height = image.size
+    tiles = image.tile
+
+    if len(tiles) > 1:
+        # 分块或分条带的 TIFF：只保留与裁剪框相交的块
+        selected = [t for t in tiles if t[1][0] < x2 and t[1][2] > x1 and t[1][1] < y2 and t[1][3] > y1]
+        left = min(t[1][0] for t in selected)
+        top = min(t[1][1] for t in selected)
+        right = max(t[1][2] for t in selected)
+        bottom = max(t[1][3] for t in selected)
+        image.tile = [_replace_tile(t, (t[1][0] - left, t[1][1] - top, t[1][2] - left, t[1][3] - top))
+                      for t in selected]
+        image._size = (right - left, bottom - top)
+        return "tiles", (left, top)
+
+    if len(tiles) != 1 or tuple(tiles[0][1]) != (0, 0, width, height):
+        return "full", (0, 0)
+    tile = tiles[0]
+    name, _, offset, args = tile
+
+    if name == "raw":
+        # 未压缩数据：直接按行号算出文件偏移，只读取裁剪框覆盖的行
+        if isinstance(args, str):
+            args = (args, 0, 1)
+        rawmode, stride, orientation = (tuple(args) + (0, 1))[:3]
+        bytes_per_pixel = RAW_BYTES_PER_PIXEL.get(rawmode)
+        if bytes_per_pixel and orientation in (1, -1):
+            stride = stride or width * bytes_per_pixel
+            # 自下而上存储（如 BMP）时，文件中的第一行是图片的最后一行
+            skip = y1 if orientation == 1 else height - y2
+            image.tile = [_replace_tile(tile, (0, 0, width, y2 - y1), offset + skip * stride,
+                                        (rawmode, stride, orientation))]
+            image._size = (width, y2 - y1)
+            return "rows", (0, y1)
+
+    if name == "zip" and image.format == "PNG" and not image.info.get("interlace") and y2 < height:
+        # 非隔行的 PNG 按行顺序解码，解到裁剪框底边即可停止
+        image.tile = [_replace_tile(tile, (0, 0, width, y2))]
+        image._size = (width, y2)
+        return "rows", (0, 0)
+
+    # JPEG、压缩 TIFF 等格式的解码器无法中途停止，只能完整解码
+    return "full", (0, 0)
+
+
+def decode_region(file_path, box, timings=None):
+    """只解码覆盖裁剪框的分块、条带或行，返回 (裁剪后的图片, 解码统计)"""
+    with Image.open(file_path) as image:
+        full_bytes = image.width * image.height * len(image.getbands())
+        with span(timings, "decode"):
+            method, (left, top) = _restrict_tiles(image, box)
+            image.load()
+        decoded_bytes = image.width * image.height * len(image.getbands())
+        x1, y1, x2, y2 = box
+        with span(timings, "crop"):
+            cropped_image = image.crop((x1 - left, y1 - top, x2 - left, y2 - top))
+    stats = {
+        "method": method,
+        "decoded_bytes": decoded_bytes,
+        "full_bytes": full_bytes,
+    }
+    return cropped_image, stats
+
+
+def encoder_settings(save_path, profile=DEFAULT_PROFILE):
+    """按导出配置确定 (格式, 编码参数)；文件扩展名与配置的格式不符时按扩展名使用 Pillow 默认参数"""
+    settings = EXPORT_PROFILES[profile]
+    file_format = Image.registered_extensions().get(os.path.splitext(save_path)[1].lower())
+    if file_format != settings["format"]:
+        return file_format, {}
+    return file_format, dict(settings["options"])
+
+
+class TimedFile:
+    """包装已打开的文件，累计 write 的耗时；不提供 fileno，Pillow 会分块调用 write 而不是直接写文件描述符"""
+
+    def __init__(self, f):
+        self._file = f
+        self.seconds = 0.0
+
+    def write(self, data):
+        start = time.perf_counter()
+        try:
+            return self._file.write(data)
+        finally:
+            self.seconds += time.perf_counter() - start
+
+    def __getattr__(self, name):
+        if name == "fileno":
+            raise AttributeError(name)
+        return getattr(self._file, name)
+
+
+def save_image(image, save_path, profile=DEFAULT_PROFILE, timings=None):
+    """按导出配置编码并直接写入文件（不在内存中缓冲整个编码结果）；计时时写入耗时单独记为 write，其余记为 encode"""
+    file_format, options = encoder_settings(save_path, profile)
+    if file_format is None:
+        raise ValueError(f"无法识别的文件扩展名: {os.path.splitext(save_path)[1]}")
+    with open(save_path, "wb") as f:
+        target = f if timings is None else TimedFile(f)
+        with span(timings, "encode"):
+            if file_format == "JPEG" and image.mode not in ("1", "L", "RGB", "CMYK"):
+                # JPEG 不支持透明通道和调色板
+                image = image.convert("RGB")
+            image.save(target, format=file_format, **options)
+    if timings is not None:
+        timings["encode"] -= target.seconds
+        timings["write"] = timings.get("write", 0.0) + target.seconds
+
+
+def export_region(file_path, box, border, save_path, profile=DEFAULT_PROFILE, timings=None):
+    """裁剪、加白边并按导出配置保存，返回解码统计，附带导出后进程的当前内存和运行以来的峰值内存"""
+    stats = _export_region(file_path, box, border, save_path, profile, timings)
+    # ru_maxrss 是整个进程运行以来的峰值，不是这一张图片的用量，只作为进程级指标记录
+    stats["rss"] = current_rss_bytes()
+    stats["process_peak_rss"] = peak_rss_bytes()
+    return stats
+
+
+def _export_region(file_path, box, border, save_path, profile, timings):
+    """多帧图片逐帧写出，PNG 输出优先逐条带写出，不生成加边框后的整张图片"""
+    file_format, options = encoder_settings(save_path, profile)
+    if file_format in ("GIF", "PNG", "TIFF"):
+        from frame_stream import export_frames
+        stats = export_frames(file_path, box, border, save_path, file_format, options, timings)
+        if stats is not None:
+            return stats
+    if file_format == "PNG":
+        try:
+            # 逐条带写出依赖 NumPy，只在需要时导入
+            from strip_writer import save_region_with_border
+        except ImportError:
+            save_region_with_border = None
+        if save_region_with_border is not None:
+            stats = save_region_with_border(file_path, box, border, save_path, options, timings=timings)
+            if stats is not None:
+                return stats
+    cropped_image, stats = decode_region(file_path, box, timings)
+    with span(timings, "border"):
+        bordered_image = add_border(cropped_image, border)
+    # 立即释放像素缓冲，不等垃圾回收
+    cropped_image.close()
+    try:
+        save_image(bordered_image, save_path, profile, timings)
+    finally:
+        bordered_image.close()
+    return stats
+
+
+def format_decode_stats(stats):
+    """把解码统计格式化为一行文字"""
+    text = f"解码 {stats['decoded_bytes'] / 1048576:.1f}MB / 原图 {stats['full_bytes'] / 1048576:.1f}MB（{stats['method']}）"
+    if stats.get("streamed"):
+        text += "，逐条带写出"
+    if stats.get("frames"):
+        text += (f"，{stats['frames']} 帧，平均每帧 {stats['frame_seconds'] * 1000:.0f} ms"
+                 f"（最慢 {stats['max_frame_seconds'] * 1000:.0f} ms）")
+    if stats.get("rss") is not None:
+        text += f"，导出后进程内存 {stats['rss'] / 1048576:.0f}MB"
+    if stats.get("process_peak_rss") is not None:
+        text += f"，进程运行以来峰值 {stats['process_peak_rss'] / 1048576:.0f}MB"
+    return text
+
+
+def build_preview(file_path, max_size):
+    """低成本解码出不超过 max_size 的预览代理图，供界面反复重采样显示"""
+    with Image.open(file_path) as image:
+        # thumbnail 对 JPEG 先用 draft 在解码阶段按 1/2、1/4、1/8 缩小，
+        # 其它格式先用 reduce 做整数倍快速缩小，最后才做一次 LANCZOS 重采样
+        image.thumbnail(max_size, Image.LANCZOS)
+        if image.mode not in ("1", "L", "LA", "RGB", "RGBA"):
+            image = image.convert("RGBA" if image.mode in ("P", "PA") else "RGB")
+        else:
+            image = image.copy()
+    return image
+
+
+class NeekoAllocator:
+    """只扫描一次输出目录，之后以常数时间分配下一个 NEEKO_n 文件名"""
+
+    def __init__(self, directory, ext=".png"):
+        self.directory = directory
+        self.ext = ext
+        self._lock = threading.Lock()
+        self._next = self._scan_highest() + 1
+
+    def _scan_highest(self):
+        """用 os.scandir 找出目录中已有的最大 NEEKO 序号"""
+        highest = 0
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    match = NEEKO_NAME_PATTERN.match(entry.name)
+                    if match:
+                        highest = max(highest, int(match.group(1)))
+        except FileNotFoundError:
+            pass
+        return highest
+
+    def peek(self, ext=None):
+        """返回下一个候选文件名但不预留，返回 (序号, 文件名, 完整路径)"""
+        with self._lock:
+            file_name = f"NEEKO_{self._next}{ext or self.ext}"
+            return self._next, file_name, os.path.join(self.directory, file_name)
+
+    def reserve(self, ext=None):
+        """以 O_EXCL 创建空文件原子地预留下一个文件名，被其它进程占用时顺延"""
+        with self._lock:
+            while True:
+                counter = self._next
+                self._next += 1
+                file_name = f"NEEKO_{counter}{ext or self.ext}"
+                file_path = os.path.join(self.directory, file_name)
+                try:
+                    fd = os.open(file_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666)
+                except FileExistsError:
+                    continue
+                os.close(fd)
+                return counter, file_name, file_path
+
+
+def collect_image_paths(paths):
+    """展开命令行传入的文件和文件夹，返回按顺序排列的图片路径列表"""
+    image_paths = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                full_path = os.path.join(path, name)
+                if os.path.isfile(full_path) and name.lower().endswith(IMAGE_EXTENSIONS):
+                    image_paths.append(full_path)
+        elif os.path.isfile(path):
+            image_paths.append(path)
+        else:
+            print(f"跳过不存在的路径: {path}", file=sys.stderr)
+    return image_paths
+
+
+def process_file(src_path, dst_path, ratio="4:3", border=DEFAULT_BORDER, auto_crop=False, profile=DEFAULT_PROFILE,
+                 norm_box=None):
+    """对单个文件执行 裁剪（居中、自动或按归一化裁剪框）→ 加边框 → 保存，返回 (源路径, 输出路径, 解码统计)，统计中含各阶段耗时"""
+    timings = {}
+    # 只读取文件头获得尺寸
+    with span(timings, "open"):
+        with Image.open(src_path) as image:
+            image_size = image.size
+    if norm_box is not None:
+        box = denormalize_box(norm_box, image_size[0], image_size[1], ratio)
+    elif auto_crop:
+        # 自动裁剪依赖 NumPy，只在需要时导入
+        from autocrop import ANALYSIS_SIZE, suggest_crop
+        with span(timings, "autocrop"):
+            preview = build_preview(src_path, (ANALYSIS_SIZE, ANALYSIS_SIZE))
+            box = suggest_crop(preview, image_size, ratio)
+    else:
+        box = compute_centered_crop(image_size[0], image_size[1], ratio)
+    stats = export_region(src_path, box, border, dst_path, profile, timings)
+    stats["timings"] = timings
+    stats["box"] = box
+    return src_path, dst_path, stats
+
+
+def run_batch(image_paths, output_dir, ratio="4:3", border=DEFAULT_BORDER, workers=None, auto_crop=False,
+              profile=DEFAULT_PROFILE):
+    """在进程池中并行处理图片，返回 (成功列表, 失败列表, 耗时秒数)；提交前按内存预算预约，余量不足时等已提交的图片完成"""
+    # memory_governor 依赖本模块，在函数内导入
+    from memory_governor import MemoryGovernor, estimate_job_bytes
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    governor = MemoryGovernor()
+
+    # 在主进程中预先预留输出文件名，避免多个进程或程序实例争抢同一个 NEEKO_n
+    allocator = NeekoAllocator(output_dir, EXPORT_PROFILES[profile]["ext"])
+    jobs = deque((src_path, allocator.reserve()[2]) for src_path in image_paths)
+
+    succeeded = []
+    failed = []
+    start_time = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=ignore_pixel_warnings) as executor:
+        in_flight = {}
+        while jobs or in_flight:
+            while jobs and len(in_flight) < workers * IN_FLIGHT_PER_WORKER:
+                src_path, dst_path = jobs[0]
+                nbytes = estimate_job_bytes(src_path)
+                # 工作进程的内存不计入本进程的常驻内存，以预约代替；没有任务在运行时等待放行，单张超大图片也会处理
+                if not governor.reserve(nbytes, block=not in_flight):
+                    break
+                jobs.popleft()
+                future = executor.submit(process_file, src_path, dst_path, ratio, border, auto_crop, profile)
+                in_flight[future] = (src_path, dst_path, nbytes)
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                src_path, dst_path, nbytes = in_flight.pop(future)
+                governor.release(nbytes)
+                try:
+                    succeeded.append(future.result())
+                except Exception as e:
+                    failed.append((src_path, str(e)))
+                    # 删除为失败任务预留的空文件
+                    if os.path.exists(dst_path) and os.path.getsize(dst_path) == 0:
+                        os.remove(dst_path)
+    elapsed = time.perf_counter() - start_time
+    return succeeded, failed, elapsed
+
+
+def build_arg_parser():
+    """构建命令行参数解析器"""
+    parser = argparse.ArgumentParser(description="批量裁剪图片并添加白色边框（无需图形界面）")
+    parser.add_argument("inputs", nargs="+", help="图片文件或文件夹（--watch 时为要监视的文件夹）")
+    parser.add_argument("-o", "--output", required=True, help="输出目录")
+    parser.add_argument("-r", "--ratio", choices=["4:3", "3:4"], default="4:3", help="裁剪比例")
+    parser.add_argument("-b", "--border", type=int, default=DEFAULT_BORDER, help="白边宽度（像素）")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="并行进程数，默认等于CPU核心数")
+    parser.add_argument("--auto-crop", action="store_true", help="按画面内容自动选择裁剪位置（需要 NumPy）")
+    parser.add_argument("-p", "--profile", choices=list(EXPORT_PROFILES), default=DEFAULT_PROFILE,
+                        help="导出配置（输出格式与编码参数）")
+    parser.add_argument("--timing-log", metavar="FILE", help="把每张图片的各阶段耗时追加写入 JSON Lines 文件")
+    parser.add_argument("-v", "--verbose", action="store_true", help="逐张输出解码方式和进程内存（导出后的当前值与运行以来的峰值）")
+    parser.add_argument("--watch", action="store_true",
+                        help="持续监视文件夹，新图片写完后立即处理（按 Ctrl+C 停止）；处理过的文件记录在磁盘上，重启后不再处理")
+    parser.add_argument("--ledger", metavar="FILE", help="--watch 时记录已处理文件的 SQLite 数据库，默认 ~/.neeko_watched.sqlite")
+    return parser
+
+
+def watch_main(args):
+    """监视模式的命令行入口：一直运行到按下 Ctrl+C"""
+    from folder_watch import WATCH_LEDGER, run_watch
+    missing = [path for path in args.inputs if not os.path.isdir(path)]
+    if missing:
+        print(f"监视模式只接受文件夹: {', '.join(missing)}", file=sys.stderr)
+        return 1
+    stage_stats = StageStats(args.timing_log)
+    try:
+        succeeded, failed = run_watch(args.inputs, args.output, args.ratio, args.border, args.workers, args.auto_crop,
+                                      args.profile, args.ledger or WATCH_LEDGER, stage_stats, args.verbose)
+    finally:
+        stage_stats.close()
+    print(f"已停止监视：完成 {succeeded} 张，失败 {failed} 张")
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    """命令行入口"""
+    args = build_arg_parser().parse_args(argv)
+    ignore_pixel_warnings()
+
+    if args.auto_crop:
+        # 自动裁剪在工作进程中才导入，这里只检查能否导入
+        try:
+            importlib.import_module("autocrop")
+        except ImportError:
+            print("自动裁剪需要安装 NumPy：pip install numpy", file=sys.stderr)
+            return 1
+
+    if args.watch:
+        return watch_main(args)
+
+    image_paths = collect_image_paths(args.inputs)
+    if not image_paths:
+        print("没有找到可处理的图片", file=sys.stderr)
+        return 1
+
+    succeeded, failed, elapsed = run_batch(image_paths, args.output, args.ratio, args.border, args.workers,
+                                           args.auto_crop, args.profile)
+
+    # 各阶段耗时由工作进程测得，在主进程中汇总并写入日志
+    stage_stats = StageStats(args.timing_log)
+    for src_path, dst_path, stats in succeeded:
+        stage_stats.record(src_path, stats["timings"], output=dst_path, method=stats["method"])
+    for src_path, error in failed:
+        stage_stats.record(src_path, None, error=error)
+    stage_stats.close()
+
+    if args.verbose:
+        for src_path, dst_path, stats in succeeded:
+            print(f"{src_path} -> {dst_path}: {format_decode_stats(stats)}")
+        for line in stage_stats.summary_lines()[:-1]:
+            print(line)
+    for src_path, error in failed:
+        print(f"处理失败: {src_path}: {error}", file=sys.stderr)
+    if succeeded:
+        largest = max(stats["decoded_bytes"] for _, _, stats in succeeded)
+        print(f"单张最大解码 {largest / 1048576:.1f}MB")
+    rate = len(succeeded) / elapsed if elapsed > 0 else 0.0
+    print(f"完成 {len(succeeded)} 张，失败 {len(failed)} 张，耗时 {elapsed:.2f} 秒，{rate:.2f} 张/秒")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,250 @@
+"""队列图片的元数据索引：在线程池中只读取文件头并缓存到磁盘，存入按列的数组表，一次性为整个队列计算 4:3 和 3:4 的默认裁剪框"""
+import queue
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from file_cache import BatchQueue, FileKeyCache, file_key
+from image_engine import compute_centered_crop, compute_crop_size
+
+# 读取文件头的线程数（主要是等待磁盘，不受 GIL 限制）
+HEADER_WORKERS = 4
+
+# 每批从缓存查询、交给线程池读取的图片数量
+INDEX_BATCH_SIZE = 256
+
+# EXIF 方向标签；5~8 表示拍摄时相机旋转了 90°，摆正后宽高互换
+ORIENTATION_TAG = 0x0112
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+RATIOS = ("4:3", "3:4")
+
+
+def read_header(path):
+    """只读取文件头，返回 (格式, 宽, 高, 模式, EXIF 方向)"""
+    with Image.open(path) as image:
+        if image.format == "PNG" and "exif" not in image.info:
+            # PNG 的 eXIf 块可能位于图像数据之后，读取它需要解码像素
+            orientation = 1
+        else:
+            orientation = image.getexif().get(ORIENTATION_TAG, 1)
+        return image.format or "", image.width, image.height, image.mode, orientation
+
+
+def _read_file(path):
+    """线程池任务：返回 (路径, 文件头)，无法识别时文件头为 None"""
+    try:
+        return path, read_header(path)
+    except Exception:
+        return path, None
+
+
+class MetadataCache(FileKeyCache):
+    """以 SQLite 保存的文件头缓存，文件大小或修改时间变化后自动失效；只能在创建它的线程中使用"""
+
+    TABLE = "headers"
+    COLUMNS = "format TEXT, width INTEGER, height INTEGER, mode TEXT, orientation INTEGER"
+
+
+def centered_crops(widths, heights, ratio):
+    """为一组图片尺寸计算居中的最大裁剪框，返回 [(x1, y1, x2, y2)]；有 NumPy 时一次向量化计算，结果与 compute_centered_crop 逐一相同"""
+    try:
+        import numpy as np
+    except ImportError:
+        return [compute_centered_crop(w, h, ratio) for w, h in zip(widths, heights)]
+    if not widths:
+        return []
+    # 直接读取 array 的缓冲区，不逐个转换为 Python 整数
+    w = np.frombuffer(widths, dtype=np.uintc).astype(np.int64)
+    h = np.frombuffer(heights, dtype=np.uintc).astype(np.int64)
+    aspect = w / np.maximum(h, 1)
+    # 与 compute_crop_size 相同的浮点运算和截断顺序
+    if ratio == "4:3":
+        # 比4:3更宽时以高度为基准，否则以宽度为基准
+        wide = aspect >= 4 / 3
+        cw = np.minimum(np.trunc(h * 4 / 3).astype(np.int64), w)
+        ch = np.trunc(cw * 3 / 4).astype(np.int64)
+        nh = np.minimum(np.trunc(w * 3 / 4).astype(np.int64), h)
+        nw = np.trunc(nh * 4 / 3).astype(np.int64)
+    else:
+        # 比3:4更窄时以宽度为基准，否则以高度为基准
+        wide = aspect > 3 / 4
+        cw = np.minimum(np.trunc(h * 3 / 4).astype(np.int64), w)
+        ch = np.trunc(cw * 4 / 3).astype(np.int64)
+        nh = np.minimum(np.trunc(w * 4 / 3).astype(np.int64), h)
+        nw = np.trunc(nh * 3 / 4).astype(np.int64)
+    crop_w = np.where(wide, cw, nw)
+    crop_h = np.where(wide, ch, nh)
+    x1 = (w - crop_w) // 2
+    y1 = (h - crop_h) // 2
+    return list(zip(x1.tolist(), y1.tolist(), (x1 + crop_w).tolist(), (y1 + crop_h).tolist()))
+
+
+def best_ratio(width, height):
+    """返回保留面积更大的比例：横图为 4:3，竖图为 3:4"""
+    areas = [w * h for w, h in (compute_crop_size(width, height, ratio) for ratio in RATIOS)]
+    return RATIOS[0] if areas[0] >= areas[1] else RATIOS[1]
+
+
+class MetadataTable:
+    """按列存放文件头的紧凑表：尺寸和方向存在 array 中，格式和模式存为字符串表的下标；可在多个线程中使用。
+    默认裁剪框和比例按存储的像素计算（预览、裁剪和导出都不按 EXIF 旋转），排序和筛选使用摆正后的尺寸"""
+
+    def __init__(self):
+        self._rows = {}  # 路径 → 行号
+        self._widths = array("I")
+        self._heights = array("I")
+        self._orientations = array("B")
+        self._formats = array("B")
+        self._modes = array("B")
+        self._names = []  # 格式和模式名称，按首次出现的顺序编号
+        self._codes = {}
+        self._crops = {ratio: [] for ratio in RATIOS}  # 比例 → 每行的默认裁剪框，查询时只为新增的行补算
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, path):
+        return path in self._rows
+
+    def _code(self, name):
+        if name not in self._codes:
+            self._codes[name] = len(self._names)
+            self._names.append(name)
+        return self._codes[name]
+
+    def add(self, path, header):
+        """加入一张图片的文件头；已存在时忽略"""
+        self.add_many([(path, header)])
+
+    def add_many(self, entries):
+        """加入一批 (路径, 文件头)，已存在的忽略"""
+        with self._lock:
+            for path, (file_format, width, height, mode, orientation) in entries:
+                if path in self._rows:
+                    continue
+                self._rows[path] = len(self._widths)
+                self._widths.append(width)
+                self._heights.append(height)
+                self._orientations.append(orientation if 0 <= orientation < 256 else 1)
+                self._formats.append(self._code(file_format))
+                self._modes.append(self._code(mode))
+
+    def get(self, path):
+        """返回 (格式, 宽, 高, 模式, EXIF 方向)，尚未索引时返回 None"""
+        with self._lock:
+            row = self._rows.get(path)
+            if row is None:
+                return None
+            return (self._names[self._formats[row]], self._widths[row], self._heights[row],
+                    self._names[self._modes[row]], self._orientations[row])
+
+    def size(self, path):
+        """返回存储的像素尺寸 (宽, 高)，尚未索引时返回 None"""
+        with self._lock:
+            row = self._rows.get(path)
+            return None if row is None else (self._widths[row], self._heights[row])
+
+    def upright_size(self, path):
+        """返回按 EXIF 方向摆正后的 (宽, 高)（方向为 5~8 时宽高互换），尚未索引时返回 None"""
+        with self._lock:
+            row = self._rows.get(path)
+            if row is None:
+                return None
+            if self._orientations[row] in TRANSPOSED_ORIENTATIONS:
+                return self._heights[row], self._widths[row]
+            return self._widths[row], self._heights[row]
+
+    def _ensure_crops(self):
+        """为上次计算之后新增的行一次性补算默认裁剪框"""
+        done = len(self._crops[RATIOS[0]])
+        if done < len(self._widths):
+            for ratio in RATIOS:
+                self._crops[ratio].extend(centered_crops(self._widths[done:], self._heights[done:], ratio))
+
+    def crop_box(self, path, ratio):
+        """返回该图片按 ratio 居中的默认裁剪框，尚未索引时返回 None"""
+        with self._lock:
+            row = self._rows.get(path)
+            if row is None:
+                return None
+            self._ensure_crops()
+            return self._crops[ratio][row]
+
+    def best_ratio(self, path):
+        """返回保留面积更大的比例（横图为 4:3，竖图为 3:4），尚未索引时返回 None"""
+        with self._lock:
+            row = self._rows.get(path)
+            if row is None:
+                return None
+            self._ensure_crops()
+            areas = [(x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in (self._crops[ratio][row] for ratio in RATIOS)]
+            return RATIOS[0] if areas[0] >= areas[1] else RATIOS[1]
+
+
+class MetadataIndexer:
+    """后台线程查询缓存、把未缓存的图片交给线程池读取文件头，结果加入 MetadataTable"""
+
+    def __init__(self, cache_path, workers=HEADER_WORKERS):
+        self.cache_path = cache_path
+        self.workers = workers
+        self.table = MetadataTable()
+        self._jobs = BatchQueue(INDEX_BATCH_SIZE)
+        self._results = queue.Queue()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metadata-indexer", daemon=True)
+        self._thread.start()
+
+    def add(self, paths):
+        """提交一批图片路径读取文件头"""
+        self._jobs.put(paths)
+
+    def poll(self):
+        """取出自上次轮询以来完成索引的图片数量"""
+        count = 0
+        while True:
+            try:
+                count += self._results.get_nowait()
+            except queue.Empty:
+                return count
+
+    def _run(self):
+        """后台线程：缓存命中的直接入表，其余在线程池中读取文件头"""
+        cache = MetadataCache(self.cache_path)
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="metadata")
+        try:
+            while not self._closed.is_set():
+                paths = self._jobs.next_batch()
+                if paths is None:
+                    break
+                keys = {}
+                for path in paths:
+                    if path in self.table:
+                        continue
+                    try:
+                        keys[path] = file_key(path)
+                    except OSError:
+                        continue
+                cached = cache.lookup(keys.values())
+                headers = {path: cached[key[0]] for path, key in keys.items() if key[0] in cached}
+                missing = [path for path in keys if path not in headers]
+                computed = []
+                for path, header in executor.map(_read_file, missing):
+                    if header is not None:
+                        headers[path] = header
+                        computed.append((keys[path], header))
+                if computed:
+                    cache.store(computed)
+                self.table.add_many(headers.items())
+                self._results.put(len(headers))
+        finally:
+            executor.shutdown(wait=False)
+            cache.close()
+
+    def close(self):
+        """停止后台线程，尚未处理的批次被丢弃"""
+        self._closed.set()
+        self._jobs.close()
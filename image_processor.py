@@ -1,8 +1,85 @@
+import sys
+
+if __name__ == "__main__":
+    # 程序入口是 launcher.py；直接运行本文件时在导入 Tk、PIL 等模块之前交给它，本模块只由 launcher 在窗口显示后导入一次
+    from launcher import main
+    sys.exit(main())
+
 import tkinter as tk
-from tkinter import filedialog, messagebox
-from PIL import Image, ImageTk, ImageOps
+from tkinter import filedialog, messagebox, simpledialog
+from PIL import Image
 import os
-from tkinterdnd2 import DND_FILES, TkinterDnD
+import queue
+from tkinterdnd2 import DND_FILES
+from image_engine import (DEFAULT_BORDER, DEFAULT_PROFILE, EXPORT_PROFILES, NeekoAllocator, current_rss_bytes,
+                          format_decode_stats, normalize_box)
+from crop_geometry import (constrain_rect, display_to_original, fit_to_canvas, initial_rect, move_rect,
+                           original_to_display, resize_rect)
+from image_cache import PreviewCache, Prefetcher
+from export_writer import ExportWriter
+from memory_governor import MemoryGovernor
+from crop_job import CropJob, parse_selection
+from crop_overlay import CropOverlay
+from tile_view import TiledView
+from image_queue import ImageQueue
+from queue_view import ThumbnailStrip, VirtualListView
+from thumbnail_cache import THUMB_SIZE, ThumbnailLoader
+from folder_scan import FolderScanner
+from stage_timing import StageStats, span
+from session_journal import SessionJournal, content_key
+from duplicates import DuplicateFinder
+from image_index import MetadataIndexer, best_ratio
+from folder_watch import WATCH_LEDGER, FolderWatcher, ProcessedLedger
+
+# 窗口尺寸停止变化多久后才重绘（毫秒）
+RESIZE_DEBOUNCE_MS = 150
+
+# 提前预读的队列图片数量，以及预览缓存的容量上限（字节）
+PREFETCH_DEPTH = 3
+PREVIEW_CACHE_BYTES = 256 * 1024 * 1024
+
+# 最多允许排队等待写入的导出任务数，以及轮询导出结果的间隔（毫秒）
+EXPORT_MAX_PENDING = 4
+EXPORT_POLL_MS = 100
+
+# 拖拽裁剪框时每帧最多更新一次（毫秒）
+MOTION_FRAME_MS = 16
+
+# 滚轮每格的缩放倍数，最大放大到原图一个像素占多少个屏幕像素，以及轮询后台生成的图片块的间隔（毫秒）
+ZOOM_STEP = 1.25
+MAX_PIXEL_ZOOM = 8
+TILE_POLL_MS = 30
+
+# 后台扫描文件夹时轮询结果的间隔（毫秒）
+SCAN_POLL_MS = 50
+
+# 统计面板的刷新间隔（毫秒），以及记录各阶段耗时的 JSON Lines 日志（由环境变量指定，未设置时不写日志）
+STATS_REFRESH_MS = 1000
+TIMING_LOG = os.environ.get("NEEKO_TIMING_LOG")
+
+# 批处理会话日志的位置，程序意外退出后据此恢复队列
+SESSION_JOURNAL = os.environ.get("NEEKO_SESSION_JOURNAL") or os.path.join(os.path.expanduser("~"), ".neeko_session.jsonl")
+
+# 感知哈希缓存的位置，以及轮询重复检测结果的间隔（毫秒）
+HASH_CACHE = os.environ.get("NEEKO_HASH_CACHE") or os.path.join(os.path.expanduser("~"), ".neeko_hashes.sqlite")
+DEDUPE_POLL_MS = 500
+
+# 缩略图磁盘缓存的位置，以及轮询缩略图加载结果的间隔（毫秒）
+THUMB_CACHE = os.environ.get("NEEKO_THUMB_CACHE") or os.path.join(os.path.expanduser("~"), ".neeko_thumbnails.sqlite")
+THUMB_POLL_MS = 100
+
+# 轮询批量裁剪任务进度的间隔（毫秒）
+CROP_JOB_POLL_MS = 200
+
+# 文件头索引缓存的位置，以及轮询索引结果的间隔（毫秒）
+METADATA_CACHE = os.environ.get("NEEKO_METADATA_CACHE") or os.path.join(os.path.expanduser("~"), ".neeko_metadata.sqlite")
+METADATA_POLL_MS = 200
+
+# 轮询监视文件夹中新图片的间隔（毫秒）
+WATCH_POLL_MS = 500
+
+# 每次轮询最多取回的批数，一次涌入大量新文件时分多次加入队列，不长时间占用界面线程
+WATCH_BATCHES_PER_POLL = 1
 
 class ImageProcessor:
     def __init__(self, root):
@@ -15,17 +92,77 @@ class ImageProcessor:
         self.font = ("SimHei", 10)
         
         # 初始化变量
-        self.original_image = None
-        self.processed_image = None
+        self.image_size = None  # 原图尺寸（只读取文件头，不保留打开的文件）
+        self.preview_image = None  # 按屏幕尺寸缓存的预览代理图，重绘时从它重采样
         self.image_path = None
-        self.canvas_image = None
+        self.zoom = 1.0  # 相对适应窗口大小的缩放倍数
+        self.tile_job = None
         self.start_x = self.start_y = 0
         self.rect = None
+        self.crop_box = None  # 以原图坐标保存的裁剪框，重绘时据此恢复
         self.drag_data = {}
+        self.pending_motion = None
+        self.motion_job = None
+        self.canvas_size = None
+        self.resize_job = None
         self.current_ratio = "4:3"
         
         # 批量处理相关变量
-        self.image_queue = []  # 存储待处理的图片路径队列
+        self.image_queue = ImageQueue()  # 存储待处理的图片路径队列
+        self.image_queue.subscribe(self.on_queue_changed)
+        
+        # 后台递归扫描拖入的文件夹，分批加入队列
+        self.scanner = FolderScanner()
+        self.scan_job = None
+        
+        # 会话日志：记录入队、切换、跳过和导出完成，崩溃后重启可以从中断处继续
+        self.journal = SessionJournal(SESSION_JOURNAL)
+        self.resume_prompt_open = False  # 询问是否恢复上次会话时不结束会话，避免删掉尚未回答的日志
+        self.pending_exports = {}  # 导出任务编号 → (源路径, 原图坐标的裁剪框, 是否为预留的 NEEKO 文件名)
+        
+        # 后台计算队列图片的感知哈希，把连拍和重复上传的图片分组
+        self.duplicates = DuplicateFinder(HASH_CACHE)
+        self.duplicate_count = 0
+        self.exported_sources = set()
+        
+        # 后台只读取队列图片的文件头，队列据此显示尺寸、排序筛选和选择比例，无需解码像素
+        self.metadata = MetadataIndexer(METADATA_CACHE)
+        
+        # 队列缩略图：只为缩略图条中可见的图片在后台生成，界面线程不解码
+        self.thumbnails = ThumbnailLoader(THUMB_CACHE)
+        
+        # 常驻内存预算：预读和导出在解码前预约内存，紧张时先丢弃预读的预览
+        self.governor = MemoryGovernor()
+        
+        # 后台预读队列中接下来的图片，切换图片时直接从缓存取预览
+        self.preview_cache = PreviewCache(PREVIEW_CACHE_BYTES)
+        self.prefetcher = Prefetcher(self.preview_cache, (root.winfo_screenwidth(), root.winfo_screenheight()),
+                                     depth=PREFETCH_DEPTH, governor=self.governor)
+        self.governor.add_releaser(self.preview_cache.trim)
+        
+        # 各阶段耗时统计：每张图片一条记录，界面阶段在主线程累加，导出阶段由写入器累加
+        self.stage_stats = StageStats(TIMING_LOG)
+        self.image_timings = None
+        self.stats_job = None
+        
+        # 后台导出写入器，导出时界面无需等待编码完成
+        self.export_writer = ExportWriter(EXPORT_MAX_PENDING, stage_stats=self.stage_stats, governor=self.governor)
+        self.export_message = ""
+        self.neeko_allocators = {}  # 每个输出目录一个 NEEKO 文件名分配器
+        self.export_failed = 0
+        
+        # 把当前裁剪框应用到队列的后台批量任务
+        self.crop_job = None
+        self.crop_job_done = 0
+        self.crop_job_errors = []
+        
+        # 监视文件夹：写完的新图片自动加入队列，交给队列的文件记录在磁盘上，重启后不再加入
+        self.watcher = None
+        self.watch_ledger = None
+        self.watch_job = None
+        # 已通知停止、后台线程尚未退出的监视器，由 poll_stopping_watchers 在之后的轮询中收尾
+        self.stopping_watchers = []
+        self.stopping_job = None
         
         # 创建主框架
         self.main_frame = tk.Frame(root)
@@ -38,6 +175,10 @@ class ImageProcessor:
         # 添加按钮
         self.load_btn = tk.Button(self.toolbar, text="加载图片", command=self.load_image, font=self.font)
         self.load_btn.pack(side=tk.LEFT, padx=5, pady=5)
+        self.load_folder_btn = tk.Button(self.toolbar, text="加载文件夹", command=self.load_folder, font=self.font)
+        self.load_folder_btn.pack(side=tk.LEFT, padx=5, pady=5)
+        self.watch_btn = tk.Button(self.toolbar, text="监视文件夹", command=self.toggle_watch, font=self.font)
+        self.watch_btn.pack(side=tk.LEFT, padx=5, pady=5)
         
         # 添加比例切换按钮
         self.ratio_var = tk.StringVar(value="4:3")
@@ -51,6 +192,28 @@ class ImageProcessor:
         self.ratio_34 = tk.Radiobutton(self.ratio_frame, text="3:4", variable=self.ratio_var, value="3:4", 
                                      command=self.change_ratio, font=self.font)
         self.ratio_34.pack(side=tk.LEFT)
+        
+        # 按图片方向选择比例：横图用4:3，竖图用3:4（由文件头判断，不解码像素）；默认关闭，使用操作员选择的比例
+        self.auto_ratio_var = tk.BooleanVar(value=False)
+        self.auto_ratio_check = tk.Checkbutton(self.ratio_frame, text="按方向", variable=self.auto_ratio_var,
+                                               font=self.font)
+        self.auto_ratio_check.pack(side=tk.LEFT)
+        
+        # 自动裁剪开关：按画面内容选择初始裁剪框的位置（依赖 NumPy，窗口显示后才加载，加载成功前不可用）
+        self.suggest_crop = None
+        self.auto_crop_var = tk.BooleanVar(value=False)
+        self.auto_crop_check = tk.Checkbutton(self.toolbar, text="自动裁剪", variable=self.auto_crop_var,
+                                              command=self.change_ratio, font=self.font, state=tk.DISABLED)
+        self.auto_crop_check.pack(side=tk.LEFT, padx=5, pady=5)
+        
+        # 导出配置：输出格式与编码参数（速度与文件大小的取舍）
+        self.profile_var = tk.StringVar(value=DEFAULT_PROFILE)
+        self.profile_frame = tk.Frame(self.toolbar)
+        self.profile_frame.pack(side=tk.LEFT, padx=5, pady=5)
+        tk.Label(self.profile_frame, text="导出配置:", font=self.font).pack(side=tk.LEFT)
+        self.profile_menu = tk.OptionMenu(self.profile_frame, self.profile_var, *EXPORT_PROFILES)
+        self.profile_menu.config(font=self.font)
+        self.profile_menu.pack(side=tk.LEFT)
        # 添加导出按钮
         self.export_btn = tk.Button(self.toolbar, text="导出图片", command=self.export_image, font=self.font)
         self.export_btn.pack(side=tk.LEFT, padx=5, pady=5)
@@ -59,6 +222,53 @@ class ImageProcessor:
         self.skip_btn = tk.Button(self.toolbar, text="跳过图片", command=self.skip_image, font=self.font)
         self.skip_btn.pack(side=tk.LEFT, padx=5, pady=5)
         
+        # 把当前裁剪框（按相对位置）应用到队列中的图片，任务运行时按钮变为取消
+        self.apply_btn = tk.Button(self.toolbar, text="应用到队列", command=self.toggle_crop_job, font=self.font)
+        self.apply_btn.pack(side=tk.LEFT, padx=5, pady=5)
+        
+        # 跳过队列中与前面图片重复的图片（每组只保留第一张）
+        self.skip_dup_btn = tk.Button(self.toolbar, text="跳过重复", command=self.skip_duplicates, font=self.font)
+        self.skip_dup_btn.pack(side=tk.LEFT, padx=5, pady=5)
+        
+        # 按文件头中的方向和尺寸排序或筛选队列
+        self.organize_btn = tk.Menubutton(self.toolbar, text="整理队列", font=self.font, relief=tk.RAISED)
+        self.organize_menu = tk.Menu(self.organize_btn, tearoff=False, font=self.font)
+        self.organize_menu.add_command(label="横图在前", command=lambda: self.sort_queue("landscape"))
+        self.organize_menu.add_command(label="竖图在前", command=lambda: self.sort_queue("portrait"))
+        self.organize_menu.add_command(label="按尺寸从大到小", command=lambda: self.sort_queue("largest"))
+        self.organize_menu.add_command(label="按尺寸从小到大", command=lambda: self.sort_queue("smallest"))
+        self.organize_menu.add_separator()
+        self.organize_menu.add_command(label="只保留横图", command=lambda: self.filter_queue("landscape"))
+        self.organize_menu.add_command(label="只保留竖图", command=lambda: self.filter_queue("portrait"))
+        self.organize_menu.add_command(label="移除小尺寸图片…", command=lambda: self.filter_queue("min_side"))
+        self.organize_btn.config(menu=self.organize_menu)
+        self.organize_btn.pack(side=tk.LEFT, padx=5, pady=5)
+        
+        # 统计面板开关：显示各阶段耗时分位数、吞吐量和内存占用
+        self.stats_var = tk.BooleanVar(value=False)
+        self.stats_check = tk.Checkbutton(self.toolbar, text="统计面板", variable=self.stats_var,
+                                          command=self.toggle_stats_panel, font=self.font)
+        self.stats_check.pack(side=tk.LEFT, padx=5, pady=5)
+        
+        # 当前缩放比例（相对原图像素）
+        self.zoom_label = tk.Label(self.toolbar, text="", font=self.font, fg="gray")
+        self.zoom_label.pack(side=tk.RIGHT, padx=5, pady=5)
+        
+        # 创建底部状态栏，显示导出进度和错误
+        self.status_label = tk.Label(self.main_frame, text="", font=self.font, fg="gray", anchor=tk.W)
+        self.status_label.pack(side=tk.BOTTOM, fill=tk.X)
+        
+        # 创建底部的队列缩略图条（只绘制可见的几格）
+        self.strip_frame = tk.Frame(self.main_frame, bd=1, relief=tk.SUNKEN)
+        self.strip_frame.pack(side=tk.BOTTOM, fill=tk.X)
+        self.strip_scroll = tk.Scrollbar(self.strip_frame, orient=tk.HORIZONTAL)
+        self.strip_scroll.pack(side=tk.BOTTOM, fill=tk.X)
+        self.strip_canvas = tk.Canvas(self.strip_frame, bd=0, highlightthickness=0)
+        self.strip_canvas.pack(side=tk.TOP, fill=tk.X)
+        self.thumb_strip = ThumbnailStrip(self.strip_canvas, self.strip_scroll, self.queue_row_count,
+                                          self.queue_row_path, self.thumbnails.get, self.thumbnails.request,
+                                          self.select_row, THUMB_SIZE)
+        
         # 创建中间的内容框架（包含图片显示区域和右侧队列）
         self.content_frame = tk.Frame(self.main_frame)
         self.content_frame.pack(fill=tk.BOTH, expand=True, pady=5)
@@ -73,8 +283,8 @@ class ImageProcessor:
         
         # 创建画布
         self.canvas = tk.Canvas(self.image_frame, bd=0, 
-                               xscrollcommand=self.h_scroll.set,
-                               yscrollcommand=self.v_scroll.set)
+                               xscrollcommand=lambda first, last: self.on_canvas_scroll(self.h_scroll, first, last),
+                               yscrollcommand=lambda first, last: self.on_canvas_scroll(self.v_scroll, first, last))
         
         # 配置滚动条
         self.v_scroll.config(command=self.canvas.yview)
@@ -85,6 +295,13 @@ class ImageProcessor:
         self.h_scroll.pack(side=tk.BOTTOM, fill=tk.X)
         self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         
+        # 裁剪框覆盖层（裁剪框和手柄只创建一次）
+        self.overlay = CropOverlay(self.canvas)
+        
+        # 按块绘制图片，缩放后只生成视口内的块
+        self.tiles = TiledView(self.canvas, governor=self.governor)
+        self.governor.add_releaser(self.tiles.trim)
+        
         # 添加提示文本
         self.info_text = tk.Label(self.image_frame, text="请拖拽图片到此处或点击'加载图片'按钮", 
                                  font=(self.font[0], 12), fg="gray")
@@ -99,6 +316,13 @@ class ImageProcessor:
         self.canvas.bind("<B1-Motion>", self.on_mouse_drag)
         self.canvas.bind("<ButtonRelease-1>", self.on_button_release)
         
+        # 滚轮缩放，中键拖动平移（左键在裁剪框外拖动也可平移）
+        self.canvas.bind("<MouseWheel>", self.on_zoom)
+        self.canvas.bind("<Button-4>", self.on_zoom)
+        self.canvas.bind("<Button-5>", self.on_zoom)
+        self.canvas.bind("<ButtonPress-2>", lambda e: self.canvas.scan_mark(e.x, e.y))
+        self.canvas.bind("<B2-Motion>", lambda e: self.canvas.scan_dragto(e.x, e.y, gain=1))
+        
         # 创建右侧的图片队列列表
         self.queue_frame = tk.Frame(self.content_frame, bd=1, relief=tk.SUNKEN, width=250)
         self.queue_frame.pack(side=tk.RIGHT, fill=tk.Y, padx=5)
@@ -106,91 +330,189 @@ class ImageProcessor:
         # 队列标题
         tk.Label(self.queue_frame, text="待处理图片队列", font=(self.font[0], 11, "bold"), pady=10).pack(side=tk.TOP, fill=tk.X, padx=10)
         
-        # 队列列表框
-        self.queue_listbox = tk.Listbox(self.queue_frame, font=self.font, selectmode=tk.SINGLE, width=30, height=20)
-        self.queue_listbox.pack(side=tk.TOP, fill=tk.BOTH, expand=True, padx=10, pady=5)
+        # 队列列表框（只渲染可见的行）
+        self.queue_list_frame = tk.Frame(self.queue_frame)
+        self.queue_list_frame.pack(side=tk.TOP, fill=tk.BOTH, expand=True, padx=10, pady=5)
+        self.queue_scroll = tk.Scrollbar(self.queue_list_frame, orient=tk.VERTICAL)
+        self.queue_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.queue_listbox = tk.Listbox(self.queue_list_frame, font=self.font, selectmode=tk.SINGLE, width=30, height=20)
+        self.queue_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.queue_view = VirtualListView(self.queue_listbox, self.queue_scroll, self.queue_row_count, self.queue_row_text)
         # 绑定列表选择事件
         self.queue_listbox.bind('<<ListboxSelect>>', self.on_queue_select)
         
         # 队列信息标签
         self.queue_info = tk.Label(self.queue_frame, text="队列中无图片", font=self.font, fg="gray")
         self.queue_info.pack(side=tk.BOTTOM, fill=tk.X, pady=10, padx=10)
+        
+        # 预读缓存命中信息标签
+        self.cache_info = tk.Label(self.queue_frame, text="", font=self.font, fg="gray")
+        self.cache_info.pack(side=tk.BOTTOM, fill=tk.X, padx=10)
+        
+        # 统计面板（默认隐藏）
+        self.stats_panel = tk.Label(self.queue_frame, text="", font=("Courier", 9), fg="gray",
+                                    justify=tk.LEFT, anchor=tk.W)
+        
+        # 关闭窗口前等待剩余导出完成
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.root.after(EXPORT_POLL_MS, self.poll_export_status)
+        self.root.after(DEDUPE_POLL_MS, self.poll_duplicates)
+        self.root.after(METADATA_POLL_MS, self.poll_metadata)
+        self.root.after(THUMB_POLL_MS, self.poll_thumbnails)
+        self.root.after(TILE_POLL_MS, self.poll_tiles)
+        
+        # 窗口显示后再导入自动裁剪模块，然后检查是否有未完成的会话
+        self.root.after_idle(self.load_autocrop)
+        self.root.after_idle(self.offer_resume)
+    
+    def load_autocrop(self):
+        """导入自动裁剪模块（NumPy 导入较慢，放在窗口显示之后）；只启用复选框，是否自动裁剪由用户勾选，未安装 NumPy 时只提供居中裁剪"""
+        try:
+            from autocrop import suggest_crop
+        except ImportError:
+            return
+        self.suggest_crop = suggest_crop
+        self.auto_crop_check.config(state=tk.NORMAL)
+    
+    def offer_resume(self):
+        """回放会话日志，询问是否从上次中断的位置继续；对话框打开期间加入队列的图片在两种回答下都保留"""
+        pending, exported = self.journal.replay()
+        if not pending:
+            self.journal.reset()
+            return
+        # 对话框打开期间仍会处理拖放和其它实例转交的文件，它们的记录追加在 mark 之后
+        mark = self.journal.size()
+        self.resume_prompt_open = True
+        try:
+            resume = messagebox.askyesno("恢复会话", f"上次的批处理还有 {len(pending)} 张图片未完成"
+                                                     f"（已导出 {len(exported)} 张），是否继续？")
+        finally:
+            self.resume_prompt_open = False
+        
+        if resume:
+            self.journal.compact(pending, exported, keep_from=mark)
+            # 期间已加入队列的图片不再重复加入，上次未完成的图片排在它们后面
+            queued = set(self.image_queue)
+            queued.add(self.image_path)
+            pending = [path for path in pending if path not in queued]
+            self.image_queue.extend(pending)
+            self.duplicates.add(pending)
+            self.metadata.add(pending)
+            if not self.image_size and self.image_queue:
+                self.process_image(self.image_queue.popleft())
+            else:
+                self.prefetcher.prefetch(self.image_queue)
+        elif self.journal.size() > mark:
+            self.journal.compact([], {}, keep_from=mark)
+            self.maybe_finish_session()
+        else:
+            self.journal.reset()
     
     def load_image(self):
         """加载多张图片"""
         file_paths = filedialog.askopenfilenames(
-            filetypes=[("图片文件", "*.png;*.jpg;*.jpeg;*.bmp;*.gif")]
+            filetypes=[("图片文件", "*.png;*.jpg;*.jpeg;*.bmp;*.gif;*.tif;*.tiff"), ("所有文件", "*.*")]
         )
         if file_paths:
-            # 将选中的图片添加到队列
-            self.image_queue.extend(file_paths)
-            
-            # 更新队列列表显示
-            self.update_queue_display()
-            
-            # 如果当前没有图片正在处理，立即处理第一张
-            if not self.original_image:
-                next_image_path = self.image_queue.pop(0)
-                self.process_image(next_image_path)
+            self.enqueue_paths(file_paths)
+    
+    def load_folder(self):
+        """加载整个文件夹（包括子文件夹）中的图片"""
+        folder = filedialog.askdirectory()
+        if folder:
+            self.enqueue_paths([folder])
     
     def on_drop(self, event):
         """处理拖放事件"""
-        file_paths = event.data
-        
-        # 打印原始数据以进行调试
-        print(f"原始拖放数据: {file_paths}")
-        
-        # 处理Windows路径格式
-        # 首先去掉可能的大括号
-        if file_paths.startswith("{") and file_paths.endswith("}"):
-            file_paths = file_paths[1:-1]
-        
-        # 处理空格转义
-        file_paths = file_paths.replace("\\ ", " ")
-        
-        # 清理路径字符串
-        file_paths = file_paths.strip(' "\'')
-        
-        # 定义图片文件扩展名
-        image_extensions = [".png", ".jpg", ".jpeg", ".bmp", ".gif"]
-        
-        # 更简单的方法：使用split()分割，然后重新组合
-        parts = file_paths.split(" ")
-        valid_images = []
-        current_path = ""
-        
-        for part in parts:
-            current_path += part
-            # 检查当前路径是否包含完整的图片文件路径
-            for ext in image_extensions:
-                if current_path.lower().endswith(ext):
-                    # 找到完整的图片路径
-                    valid_images.append(current_path.strip())
-                    current_path = ""
-                    break
-            else:
-                # 如果没有找到扩展名，添加空格继续组合
-                current_path += " "
-        
-        # 打印处理后的路径列表
-        print(f"处理后的路径列表: {valid_images}")
-        
-        # 过滤有效的图片文件
-        valid_images = [path for path in valid_images if os.path.isfile(path)]
-        
-        if valid_images:
-            # 将有效的图片添加到队列
-            self.image_queue.extend(valid_images)
-            
-            # 更新队列列表显示
-            self.update_queue_display()
-            
-            # 如果当前没有图片正在处理，立即处理第一张
-            if not self.original_image:
-                next_image_path = self.image_queue.pop(0)
-                self.process_image(next_image_path)
+        # 拖放数据是 Tcl 列表，交给 Tcl 自己拆分，带空格、大括号或反斜杠的路径都能正确还原
+        self.enqueue_paths(self.root.tk.splitlist(event.data))
+    
+    def enqueue_paths(self, paths):
+        """把文件和文件夹交给后台扫描，识别出的图片会分批加入队列"""
+        self.scanner.scan(paths)
+        if not self.scan_job:
+            self.scan_job = self.root.after(SCAN_POLL_MS, self.poll_scan)
+    
+    def poll_scan(self):
+        """取回后台扫描结果并加入队列"""
+        # 先读取忙碌状态再取结果，避免漏掉最后一批
+        busy = self.scanner.busy
+        for kind, value in self.scanner.poll():
+            if kind == "batch":
+                self.add_to_queue(value)
+            elif value == 0:
+                messagebox.showerror("错误", "没有找到有效的图片文件")
+        
+        if busy:
+            self.scan_job = self.root.after(SCAN_POLL_MS, self.poll_scan)
+        else:
+            self.scan_job = None
+    
+    def add_to_queue(self, paths):
+        """把一批已识别的图片记入会话日志并添加到队列，当前没有图片时立即处理第一张"""
+        self.journal.append("enqueue", paths=list(paths))
+        self.image_queue.extend(paths)
+        self.duplicates.add(paths)
+        self.metadata.add(paths)
+        
+        if not self.image_size:
+            next_image_path = self.image_queue.popleft()
+            self.process_image(next_image_path)
+        else:
+            self.prefetcher.prefetch(self.image_queue)
+    
+    def toggle_watch(self):
+        """没有在监视时选择文件夹开始监视，否则停止"""
+        if self.watcher:
+            self.stop_watch()
+            self.update_export_status()
+            return
+        folder = filedialog.askdirectory(title="选择要监视的文件夹")
+        if not folder:
+            return
+        self.watch_ledger = ProcessedLedger(WATCH_LEDGER)
+        self.watcher = FolderWatcher([folder])
+        self.watch_btn.config(text="停止监视")
+        self.export_message = f"正在监视 {folder}（{self.watcher.backend}），新图片写完后自动加入队列"
+        self.update_export_status()
+        self.watch_job = self.root.after(WATCH_POLL_MS, self.poll_watch)
+    
+    def poll_watch(self):
+        """取回监视到的新图片，跳过以前已交给队列的文件，其余加入队列"""
+        for batch in self.watcher.poll(max_batches=WATCH_BATCHES_PER_POLL):
+            entries = self.watch_ledger.unprocessed(batch)
+            if not entries:
+                continue
+            # 交给队列即记为已处理：之后的恢复由会话日志负责
+            self.watch_ledger.record([(key, None) for _, key in entries])
+            self.add_to_queue([path for path, _ in entries])
+        self.watch_job = self.root.after(WATCH_POLL_MS, self.poll_watch)
+    
+    def stop_watch(self):
+        """停止监视文件夹：只通知监视线程退出，不在界面线程中等待，之后的轮询确认它已退出"""
+        if not self.watcher:
+            return
+        self.root.after_cancel(self.watch_job)
+        self.watcher.stop()
+        self.stopping_watchers.append(self.watcher)
+        # 记录只在界面线程中读写，可以立即关闭
+        self.watch_ledger.close()
+        self.watcher = self.watch_ledger = None
+        self.watch_btn.config(text="监视文件夹")
+        self.export_message = "已停止监视文件夹"
+        if self.stopping_job is None:
+            self.stopping_job = self.root.after(WATCH_POLL_MS, self.poll_stopping_watchers)
+    
+    def poll_stopping_watchers(self):
+        """回收后台线程已退出的监视器，仍有未退出的则稍后再检查"""
+        for watcher in [w for w in self.stopping_watchers if w.stopped]:
+            # 线程已退出，close 不会阻塞
+            watcher.close()
+            self.stopping_watchers.remove(watcher)
+        if self.stopping_watchers:
+            self.stopping_job = self.root.after(WATCH_POLL_MS, self.poll_stopping_watchers)
         else:
-            messagebox.showerror("错误", "请拖拽有效的图片文件")
+            self.stopping_job = None
     
     def process_image(self, file_path):
         """处理图片"""
@@ -198,9 +520,28 @@ class ImageProcessor:
             # 隐藏提示文本
             self.info_text.pack_forget()
             
-            # 加载图片
+            # 加载图片（原图只读取文件头，像素到导出时才完整解码）
             self.image_path = file_path
-            self.original_image = Image.open(file_path)
+            self.image_timings = {}
+            with span(self.image_timings, "preview"):
+                self.preview_image = self.prefetcher.get(file_path)
+            with span(self.image_timings, "open"):
+                with Image.open(file_path) as image:
+                    self.image_size = image.size
+            
+            # 按方向选择比例：优先用索引中为整个队列一次算好的结果，尚未索引时按文件头尺寸计算
+            if self.auto_ratio_var.get():
+                self.current_ratio = self.metadata.table.best_ratio(file_path) or best_ratio(*self.image_size)
+                self.ratio_var.set(self.current_ratio)
+            
+            # 新图片从适应窗口大小开始显示
+            self.zoom = 1.0
+            self.tiles.set_image(file_path, self.preview_image, self.image_size)
+            self.canvas.xview_moveto(0)
+            self.canvas.yview_moveto(0)
+            
+            # 在后台预读队列中接下来的图片
+            self.prefetcher.prefetch(self.image_queue)
             
             # 更新队列列表显示
             self.update_queue_display()
@@ -212,397 +553,287 @@ class ImageProcessor:
             self.create_initial_rect()
             
         except Exception as e:
+            # 不留下加载了一半的图片
+            self.release_image()
             messagebox.showerror("错误", f"加载图片失败: {str(e)}")
     
     def display_image(self):
         """在画布上显示图片"""
-        # 获取画布尺寸
-        canvas_width = self.canvas.winfo_width() - 20
-        canvas_height = self.canvas.winfo_height() - 20
+        self.layout_image()
         
-        # 计算缩放比例
-        img_width, img_height = self.original_image.size
-        scale = min(canvas_width / img_width, canvas_height / img_height)
-        
-        # 调整图片大小
-        self.display_width = int(img_width * scale)
-        self.display_height = int(img_height * scale)
-        resized_image = self.original_image.resize((self.display_width, self.display_height), Image.LANCZOS)
-        
-        # 转换为Tkinter可用的图片格式
-        self.canvas_image = ImageTk.PhotoImage(resized_image)
+        # 只绘制视口内的块（从预览代理图重采样，分辨率不够时在后台从原图生成）
+        with span(self.image_timings, "render"):
+            self.tiles.render()
+    
+    def layout_image(self):
+        """按画布尺寸和缩放倍数计算显示尺寸，清空画布并设置滚动区域"""
+        canvas_size = (self.canvas.winfo_width(), self.canvas.winfo_height())
+        fit_width, fit_height = fit_to_canvas(self.image_size, canvas_size)
+        self.display_width = max(1, int(fit_width * self.zoom))
+        self.display_height = max(1, int(fit_height * self.zoom))
         
-        # 清空画布并显示图片（居中显示）
-        self.canvas.delete("all")
-        self.canvas.create_image(self.display_width//2, self.display_height//2, image=self.canvas_image, anchor=tk.CENTER)
+        self.clear_canvas()
+        self.tiles.set_display_size(self.display_size())
         
         # 设置画布滚动区域（确保覆盖整个图片）
         self.canvas.config(scrollregion=(0, 0, self.display_width, self.display_height))
+        self.zoom_label.config(text=f"缩放 {self.display_width / self.image_size[0]:.0%}")
+    
+    def clear_canvas(self):
+        """清空画布上的图片块和裁剪框"""
+        self.canvas.delete("all")
+        self.overlay.forget()
+        self.tiles.forget()
+        self.rect = None
+    
+    def release_image(self):
+        """释放当前图片：关闭预览图、丢弃图片块并清空画布，像素缓冲立即释放而不是等垃圾回收"""
+        if self.preview_image is not None:
+            self.preview_image.close()
+        self.preview_image = None
+        self.image_size = None
+        self.image_path = None
+        self.tiles.set_image(None, None, None)
+        self.clear_canvas()
+        if self.governor.over_budget():
+            self.governor.relieve()
+    
+    def on_zoom(self, event):
+        """滚轮缩放：以光标所在的点为中心放大或缩小"""
+        if not self.image_size or "type" in self.drag_data:
+            return
+        zoom_in = event.num == 4 or event.delta > 0
+        canvas_size = (self.canvas.winfo_width(), self.canvas.winfo_height())
+        fit_width = fit_to_canvas(self.image_size, canvas_size)[0]
+        max_zoom = max(1.0, MAX_PIXEL_ZOOM * self.image_size[0] / fit_width)
+        zoom = min(max_zoom, max(1.0, self.zoom * (ZOOM_STEP if zoom_in else 1 / ZOOM_STEP)))
+        if zoom == self.zoom:
+            return
+        
+        # 缩放前光标下的图片位置（按比例），缩放后仍保持在光标下
+        anchor_x = self.canvas.canvasx(event.x) / self.display_width
+        anchor_y = self.canvas.canvasy(event.y) / self.display_height
+        self.zoom = zoom
+        self.layout_image()
+        self.canvas.xview_moveto(max(0.0, anchor_x - event.x / self.display_width))
+        self.canvas.yview_moveto(max(0.0, anchor_y - event.y / self.display_height))
+        
+        # 裁剪框以原图坐标保存，按新的显示尺寸重新映射
+        self.draw_crop_rect(*original_to_display(self.crop_box, self.display_size(), self.image_size))
+        self.tiles.render()
+        return "break"
+    
+    def on_canvas_scroll(self, scrollbar, first, last):
+        """画布视口变化（滚动、平移、缩放）时同步滚动条，并在空闲时放置新露出的块"""
+        scrollbar.set(first, last)
+        if self.image_size and not self.tile_job:
+            self.tile_job = self.root.after_idle(self.render_tiles)
+    
+    def render_tiles(self):
+        """放置视口内的块"""
+        self.tile_job = None
+        if self.image_size:
+            self.tiles.render()
+    
+    def poll_tiles(self):
+        """取回后台生成的清晰块"""
+        self.tiles.poll()
+        self.root.after(TILE_POLL_MS, self.poll_tiles)
     
     def change_ratio(self):
         """切换裁剪比例"""
         self.current_ratio = self.ratio_var.get()
-        if self.original_image:
+        if self.image_size:
             self.create_initial_rect()
             # 确保切换比例后裁剪框不超出范围
             self.constrain_rect()
+            self.update_overlay()
+            self.crop_box = self.display_to_original_box()
     
     def create_initial_rect(self):
         """创建初始的裁剪框，确保4:3横长，3:4竖长，且不超过图片原始尺寸"""
-        if not self.original_image:
+        if not self.image_size:
             return
         
-        # 获取当前比例
-        is_4_3 = (self.current_ratio == "4:3")
-        
-        # 计算裁剪框的大小
-        img_width, img_height = self.original_image.size
-        
-        if is_4_3:
-            # 4:3比例 - 始终横长（宽度 > 高度）
-            # 计算最大可能的裁剪尺寸，不超过图片原始尺寸
-            if (img_width / img_height) >= 4/3:
-                # 图片比4:3更宽，以图片高度为基准
-                max_crop_height = img_height
-                max_crop_width = int(max_crop_height * 4/3)
-                # 确保宽度不超过图片宽度
-                max_crop_width = min(max_crop_width, img_width)
-                max_crop_height = int(max_crop_width * 3/4)
-            else:
-                # 图片比4:3更窄，以图片宽度为基准
-                max_crop_width = img_width
-                max_crop_height = int(max_crop_width * 3/4)
-                # 确保高度不超过图片高度
-                max_crop_height = min(max_crop_height, img_height)
-                max_crop_width = int(max_crop_height * 4/3)
+        if self.suggest_crop and self.auto_crop_var.get():
+            # 在预览代理图上挑选最佳的裁剪位置
+            origin = self.suggest_crop(self.preview_image, self.image_size, self.current_ratio)[:2]
         else:
-            # 3:4比例 - 始终竖长（高度 > 宽度）
-            if (img_width / img_height) <= 3/4:
-                # 图片比3:4更窄，以图片宽度为基准
-                max_crop_width = img_width
-                max_crop_height = int(max_crop_width * 4/3)
-                # 确保高度不超过图片高度
-                max_crop_height = min(max_crop_height, img_height)
-                max_crop_width = int(max_crop_height * 3/4)
-            else:
-                # 图片比3:4更宽，以图片高度为基准
-                max_crop_height = img_height
-                max_crop_width = int(max_crop_height * 3/4)
-                # 确保宽度不超过图片宽度
-                max_crop_width = min(max_crop_width, img_width)
-                max_crop_height = int(max_crop_width * 4/3)
-        
-        # 计算显示尺寸
-        scale_x = self.display_width / img_width
-        scale_y = self.display_height / img_height
-        
-        display_crop_width = int(max_crop_width * scale_x)
-        display_crop_height = int(max_crop_height * scale_y)
-        
-        # 计算裁剪框位置（居中）
-        x1 = (self.display_width - display_crop_width) // 2
-        y1 = (self.display_height - display_crop_height) // 2
-        x2 = x1 + display_crop_width
-        y2 = y1 + display_crop_height
-        
-        # 清除现有裁剪框
-        if self.rect:
-            self.canvas.delete(self.rect)
-        
-        # 创建新的裁剪框
-        self.rect = self.canvas.create_rectangle(x1, y1, x2, y2, outline="red", width=2, fill="", stipple="gray50")
-        
-        # 保存裁剪框信息
-        self.crop_info = {
-            "x1": x1, "y1": y1, "x2": x2, "y2": y2,
-            "width": max_crop_width, "height": max_crop_height,
-            "ratio": 4/3 if is_4_3 else 3/4
-        }
-        
-        # 添加调整手柄
-        self.add_resize_handles()
-    
-    def add_resize_handles(self):
-        """添加裁剪框调整手柄"""
-        # 清除现有手柄
-        self.canvas.delete("handle")
-        
-        # 获取裁剪框坐标
-        x1, y1, x2, y2 = self.crop_info["x1"], self.crop_info["y1"], self.crop_info["x2"], self.crop_info["y2"]
-        
-        # 手柄大小（进一步增大点击区域）
-        handle_size = 16
-        
-        # 创建八个手柄
-        handles = [
-            (x1 - handle_size//2, y1 - handle_size//2, x1 + handle_size//2, y1 + handle_size//2, "nw"),
-            ((x1+x2)//2 - handle_size//2, y1 - handle_size//2, (x1+x2)//2 + handle_size//2, y1 + handle_size//2, "n"),
-            (x2 - handle_size//2, y1 - handle_size//2, x2 + handle_size//2, y1 + handle_size//2, "ne"),
-            (x1 - handle_size//2, (y1+y2)//2 - handle_size//2, x1 + handle_size//2, (y1+y2)//2 + handle_size//2, "w"),
-            (x2 - handle_size//2, (y1+y2)//2 - handle_size//2, x2 + handle_size//2, (y1+y2)//2 + handle_size//2, "e"),
-            (x1 - handle_size//2, y2 - handle_size//2, x1 + handle_size//2, y2 + handle_size//2, "sw"),
-            ((x1+x2)//2 - handle_size//2, y2 - handle_size//2, (x1+x2)//2 + handle_size//2, y2 + handle_size//2, "s"),
-            (x2 - handle_size//2, y2 - handle_size//2, x2 + handle_size//2, y2 + handle_size//2, "se")
-        ]
-        
-        # 创建手柄并绑定事件
-        for x1h, y1h, x2h, y2h, position in handles:
-            handle = self.canvas.create_rectangle(x1h, y1h, x2h, y2h, fill="blue", tags=("handle", position))
-            self.canvas.tag_bind(handle, "<ButtonPress-1>", lambda e, p=position: self.on_handle_press(e, p))
-    
-    def on_handle_press(self, event, handle_position):
-        """处理手柄按下事件"""
-        self.drag_data["type"] = "resize"
-        self.drag_data["position"] = handle_position
-        self.drag_data["x"] = event.x
-        self.drag_data["y"] = event.y
+            # 居中：优先用索引中为整个队列一次算好的裁剪框，尚未索引时由 initial_rect 计算
+            table = self.metadata.table
+            box = table.crop_box(self.image_path, self.current_ratio)
+            # 文件在索引后被替换时尺寸不同，不使用旧的裁剪框
+            origin = box[:2] if box is not None and table.size(self.image_path) == self.image_size else None
+        x1, y1, x2, y2 = initial_rect(self.image_size, self.display_size(), self.current_ratio, origin)
+        
+        # 绘制裁剪框并以原图坐标记录
+        self.crop_info = {}
+        self.draw_crop_rect(x1, y1, x2, y2)
+        self.crop_box = self.display_to_original_box()
+    
+    def draw_crop_rect(self, x1, y1, x2, y2):
+        """按显示坐标绘制裁剪框及其调整手柄"""
+        self.rect = self.overlay.draw(x1, y1, x2, y2)
+        
+        # 更新裁剪框信息
+        self.crop_info.update({"x1": x1, "y1": y1, "x2": x2, "y2": y2})
+    
+    def update_overlay(self):
+        """按裁剪框信息移动画布上的裁剪框和手柄"""
+        self.overlay.set_box(*self.crop_rect())
+    
+    def display_size(self):
+        """当前图片的显示尺寸"""
+        return self.display_width, self.display_height
+    
+    def crop_rect(self):
+        """当前裁剪框的显示坐标 (x1, y1, x2, y2)"""
+        return self.crop_info["x1"], self.crop_info["y1"], self.crop_info["x2"], self.crop_info["y2"]
+    
+    def set_crop_rect(self, rect):
+        """更新裁剪框的显示坐标"""
+        self.crop_info.update(zip(("x1", "y1", "x2", "y2"), rect))
+    
+    def display_to_original_box(self):
+        """将当前裁剪框的显示坐标转换为原图坐标"""
+        return display_to_original(self.crop_rect(), self.display_size(), self.image_size)
     
     def on_button_press(self, event):
         """处理鼠标按下事件"""
         if not self.rect: return
         
-        # 检查是否点击了裁剪框（检查点击点是否在裁剪框内）
-        x, y = event.x, event.y
-        x1, y1, x2, y2 = self.crop_info["x1"], self.crop_info["y1"], self.crop_info["x2"], self.crop_info["y2"]
+        # 通过手柄表判断点击了哪个手柄，或者是否点击了裁剪框内部（按画布坐标，放大后也能正确命中）
+        x, y = self.canvas.canvasx(event.x), self.canvas.canvasy(event.y)
+        hit = self.overlay.hit_test(x, y)
+        if hit is None:
+            # 在裁剪框外按下则拖动平移画面
+            self.drag_data["type"] = "pan"
+            self.canvas.scan_mark(event.x, event.y)
+            return
         
-        # 检查是否点击了裁剪框内部
-        if x1 <= x <= x2 and y1 <= y <= y2:
-            # 记录当前位置
+        # 记录当前位置
+        if hit == "move":
             self.drag_data["type"] = "move"
-            self.drag_data["x"] = event.x
-            self.drag_data["y"] = event.y
+        else:
+            self.drag_data["type"] = "resize"
+            self.drag_data["position"] = hit
+        self.drag_data["x"] = x
+        self.drag_data["y"] = y
     
     def on_mouse_drag(self, event):
-        """处理鼠标拖拽事件"""
+        """处理鼠标拖拽事件：只记录最新位置，每帧最多更新一次裁剪框"""
         if not self.rect or "type" not in self.drag_data:
             return
+        if self.drag_data["type"] == "pan":
+            self.canvas.scan_dragto(event.x, event.y, gain=1)
+            return
+        
+        self.pending_motion = (self.canvas.canvasx(event.x), self.canvas.canvasy(event.y))
+        if not self.motion_job:
+            self.motion_job = self.root.after(MOTION_FRAME_MS, self.apply_motion)
+    
+    def apply_motion(self):
+        """把合并后的拖拽位移应用到裁剪框"""
+        self.motion_job = None
+        if not self.pending_motion or "type" not in self.drag_data:
+            return
+        x, y = self.pending_motion
+        self.pending_motion = None
         
         # 计算移动距离
-        delta_x = event.x - self.drag_data["x"]
-        delta_y = event.y - self.drag_data["y"]
+        delta_x = x - self.drag_data["x"]
+        delta_y = y - self.drag_data["y"]
         
         # 更新拖拽数据
-        self.drag_data["x"] = event.x
-        self.drag_data["y"] = event.y
+        self.drag_data["x"] = x
+        self.drag_data["y"] = y
         
         if self.drag_data["type"] == "move":
-            # 移动裁剪框
-            self.canvas.move(self.rect, delta_x, delta_y)
-            self.canvas.move("handle", delta_x, delta_y)
-            
-            # 更新裁剪框信息
-            self.crop_info["x1"] += delta_x
-            self.crop_info["y1"] += delta_y
-            self.crop_info["x2"] += delta_x
-            self.crop_info["y2"] += delta_y
-            
-            # 限制裁剪框不超出图片范围
-            self.constrain_rect()
+            # 平移裁剪框并限制不超出图片范围
+            self.set_crop_rect(move_rect(self.crop_rect(), delta_x, delta_y, self.display_size()))
         else:
             # 调整裁剪框大小
             self.resize_rect(delta_x, delta_y, self.drag_data["position"])
+        
+        # 移动画布上的裁剪框
+        self.update_overlay()
     
     def resize_rect(self, delta_x, delta_y, position):
-        """调整裁剪框大小"""
-        # 获取当前比例
-        ratio = self.crop_info["ratio"]
-        
-        # 计算新的裁剪框坐标
-        x1, y1, x2, y2 = self.crop_info["x1"], self.crop_info["y1"], self.crop_info["x2"], self.crop_info["y2"]
-        
-        # 根据手柄位置调整裁剪框
-        if position in ["nw", "w", "sw"]:
-            new_x1 = max(0, x1 + delta_x)
-            if self.current_ratio == "4:3":
-                delta_y = (new_x1 - x1) / ratio
-            else:
-                delta_y = (new_x1 - x1) * ratio
-        
-        if position in ["ne", "e", "se"]:
-            new_x2 = min(self.display_width, x2 + delta_x)
-            if self.current_ratio == "4:3":
-                delta_y = (new_x2 - x2) / ratio
-            else:
-                delta_y = (new_x2 - x2) * ratio
-        
-        if position in ["nw", "n", "ne"]:
-            new_y1 = max(0, y1 + delta_y)
-            if self.current_ratio == "4:3":
-                delta_x = (new_y1 - y1) * ratio
-            else:
-                delta_x = (new_y1 - y1) / ratio
-        
-        if position in ["sw", "s", "se"]:
-            new_y2 = min(self.display_height, y2 + delta_y)
-            if self.current_ratio == "4:3":
-                delta_x = (new_y2 - y2) * ratio
-            else:
-                delta_x = (new_y2 - y2) / ratio
-        
-        # 根据手柄位置应用调整
-        if position == "nw":
-            x1 += delta_x
-            y1 += delta_y
-        elif position == "n":
-            y1 += delta_y
-        elif position == "ne":
-            x2 += delta_x
-            y1 += delta_y
-        elif position == "w":
-            x1 += delta_x
-        elif position == "e":
-            x2 += delta_x
-        elif position == "sw":
-            x1 += delta_x
-            y2 += delta_y
-        elif position == "s":
-            y2 += delta_y
-        elif position == "se":
-            x2 += delta_x
-            y2 += delta_y
-        
-        # 确保裁剪框大小合理
-        min_size = 50
-        if x2 - x1 < min_size or y2 - y1 < min_size:
-            return
-        
-        # 确保不超出图片范围
-        x1 = max(0, x1)
-        y1 = max(0, y1)
-        x2 = min(self.display_width, x2)
-        y2 = min(self.display_height, y2)
-        
-        # 更新裁剪框
-        self.canvas.coords(self.rect, x1, y1, x2, y2)
-        
-        # 更新裁剪框信息
-        self.crop_info["x1"] = x1
-        self.crop_info["y1"] = y1
-        self.crop_info["x2"] = x2
-        self.crop_info["y2"] = y2
-        
-        # 更新调整手柄
-        self.add_resize_handles()
+        """按拖动的手柄调整裁剪框大小"""
+        self.set_crop_rect(resize_rect(self.crop_rect(), delta_x, delta_y, position, self.current_ratio,
+                                       self.display_size()))
     
     def on_button_release(self, event):
         """处理鼠标释放事件"""
+        # 立即应用尚未处理的拖拽位移
+        if self.motion_job:
+            self.root.after_cancel(self.motion_job)
+            self.apply_motion()
+        
+        # 拖拽结束后以原图坐标记录裁剪框
+        if self.rect and self.drag_data.get("type") in ("move", "resize"):
+            self.crop_box = self.display_to_original_box()
+        
         # 清除拖拽数据
         self.drag_data = {}
     
     def constrain_rect(self):
         """限制裁剪框不超出图片范围"""
-        x1, y1, x2, y2 = self.crop_info["x1"], self.crop_info["y1"], self.crop_info["x2"], self.crop_info["y2"]
-        
-        # 计算边界
-        max_x = self.display_width
-        max_y = self.display_height
-        
-        # 调整位置
-        delta_x = 0
-        delta_y = 0
-        
-        if x1 < 0:
-            delta_x = -x1
-        elif x2 > max_x:
-            delta_x = max_x - x2
-        
-        if y1 < 0:
-            delta_y = -y1
-        elif y2 > max_y:
-            delta_y = max_y - y2
-        
-        # 如果需要调整
-        if delta_x != 0 or delta_y != 0:
-            # 移动裁剪框
-            self.canvas.move(self.rect, delta_x, delta_y)
-            self.canvas.move("handle", delta_x, delta_y)
-            
-            # 更新裁剪框信息
-            self.crop_info["x1"] += delta_x
-            self.crop_info["y1"] += delta_y
-            self.crop_info["x2"] += delta_x
-            self.crop_info["y2"] += delta_y
+        self.set_crop_rect(constrain_rect(self.crop_rect(), self.display_size()))
     
     def export_image(self):
         """导出处理后的图片并自动处理下一张"""
-        if not self.original_image:
+        if not self.image_size:
             messagebox.showwarning("警告", "请先加载图片")
             return
         
         try:
-            # 计算实际裁剪区域（基于原始图片尺寸）
-            scale_x = self.original_image.width / self.display_width
-            scale_y = self.original_image.height / self.display_height
-            
-            # 转换裁剪框坐标到原始图片坐标
-            orig_x1 = int(self.crop_info["x1"] * scale_x)
-            orig_y1 = int(self.crop_info["y1"] * scale_y)
-            orig_x2 = int(self.crop_info["x2"] * scale_x)
-            orig_y2 = int(self.crop_info["y2"] * scale_y)
-            
-            # 确保坐标在有效范围内
-            orig_x1 = max(0, orig_x1)
-            orig_y1 = max(0, orig_y1)
-            orig_x2 = min(self.original_image.width, orig_x2)
-            orig_y2 = min(self.original_image.height, orig_y2)
-            
-            # 裁剪图片
-            cropped_image = self.original_image.crop((orig_x1, orig_y1, orig_x2, orig_y2))
-            
-            # 添加固定60像素的白色边框
-            border_size = {
-                "left": 60,
-                "right": 60,
-                "top": 60,
-                "bottom": 60
-            }
-            
-            # 使用Pillow添加边框
-            self.processed_image = ImageOps.expand(cropped_image, 
-                                                 border=(border_size["left"], border_size["top"], 
-                                                         border_size["right"], border_size["bottom"]),
-                                                 fill="white")
-            
             # 选择保存路径
             default_path = os.path.dirname(self.image_path) if self.image_path else os.path.join(os.path.expanduser("~"), "Desktop")
             
-            # 生成NEEKO_1, NEEKO_2格式的文件名
-            def get_next_neeko_filename():
-                counter = 1
-                while True:
-                    file_name = f"NEEKO_{counter}.png"
-                    file_path = os.path.join(default_path, file_name)
-                    if not os.path.exists(file_path):
-                        return file_name, file_path
-                    counter += 1
-            
-            # 获取下一个可用的NEEKO文件名
-            file_name, default_save_path = get_next_neeko_filename()
+            # 获取下一个可用的NEEKO文件名（目录只在第一次导出时扫描一次）
+            allocator = self.allocator_for(default_path)
+            profile = self.profile_var.get()
+            ext = EXPORT_PROFILES[profile]["ext"]
+            _, file_name, default_save_path = allocator.peek(ext)
             
             # 获取保存路径
             save_path = filedialog.asksaveasfilename(
-                defaultextension=".png",
-                filetypes=[("PNG图片", "*.png"), ("JPEG图片", "*.jpg"), ("所有文件", "*.*")],
+                defaultextension=ext,
+                filetypes=[("PNG图片", "*.png"), ("JPEG图片", "*.jpg"), ("WebP图片", "*.webp"), ("GIF动图", "*.gif"),
+                           ("TIFF图片", "*.tif;*.tiff"), ("所有文件", "*.*")],
                 initialdir=default_path,
                 initialfile=file_name
             )
             
             # 保存图片
             if save_path:
-                # 直接保存，不需要再次检查唯一性
-                self.processed_image.save(save_path)
-                messagebox.showinfo("成功", f"图片已导出到：{save_path}")
+                # 使用默认文件名时原子地预留它，若已被其它程序占用则顺延到下一个序号
+                reserved = os.path.normcase(os.path.abspath(save_path)) == os.path.normcase(os.path.abspath(default_save_path))
+                if reserved:
+                    _, _, save_path = allocator.reserve(ext)
                 
-                # 导出完成后，清除当前图片
-                self.original_image = None
-                self.image_path = None
+                # 交给后台写入器裁剪、加60像素白边并按导出配置保存（裁剪框已按原图坐标保存）；
+                # 写入队列已满时不等待，保留当前图片，稍后再导出
+                try:
+                    job_id = self.export_writer.submit(self.image_path, self.crop_box, DEFAULT_BORDER, save_path,
+                                                       profile, self.image_timings, block=False)
+                except queue.Full:
+                    if reserved:
+                        self.remove_placeholder(save_path)
+                    self.export_message = f"后台导出队列已满（{EXPORT_MAX_PENDING} 张），请等待写入完成后再导出当前图片"
+                    self.update_export_status()
+                    return
+                self.pending_exports[job_id] = (self.image_path, self.crop_box, reserved)
+                self.image_timings = None
+                self.update_export_status()
                 
-                # 清空画布
-                self.canvas.delete("all")
+                # 提交后立即释放当前图片（写入器会重新打开源文件，只解码裁剪区域）
+                self.release_image()
                 
                 # 如果队列中还有图片，自动处理下一张
                 if self.image_queue:
-                    next_image_path = self.image_queue.pop(0)
+                    next_image_path = self.image_queue.popleft()
                     self.process_image(next_image_path)
                 else:
                     # 如果队列中没有图片了，显示提示文本
@@ -613,22 +844,334 @@ class ImageProcessor:
         except Exception as e:
             messagebox.showerror("错误", f"导出图片失败: {str(e)}")
     
+    def remove_placeholder(self, path):
+        """删除预留文件名时创建的空文件（已被写入内容时保留）"""
+        try:
+            if os.path.getsize(path) == 0:
+                os.remove(path)
+        except OSError:
+            pass
+    
+    def allocator_for(self, directory):
+        """返回输出目录的 NEEKO 文件名分配器，每个目录只创建一次"""
+        if directory not in self.neeko_allocators:
+            self.neeko_allocators[directory] = NeekoAllocator(directory)
+        return self.neeko_allocators[directory]
+    
+    def toggle_crop_job(self):
+        """没有批量任务时启动，否则取消正在运行的任务"""
+        if self.crop_job:
+            self.crop_job.cancel()
+            self.apply_btn.config(state=tk.DISABLED)
+        else:
+            self.apply_crop_to_queue()
+    
+    def apply_crop_to_queue(self):
+        """把当前裁剪框按相对位置应用到队列中的全部或部分图片，在后台进程池中裁剪、加边框并保存"""
+        if not self.image_size:
+            messagebox.showwarning("警告", "请先加载图片并调整裁剪框")
+            return
+        if not self.image_queue:
+            messagebox.showwarning("警告", "队列中没有其它图片")
+            return
+        
+        spec = simpledialog.askstring("应用到队列", f"输入要应用当前裁剪框的队列序号（如 1-20,25），"
+                                                   f"留空表示全部 {len(self.image_queue)} 张：", parent=self.root)
+        if spec is None:
+            return
+        try:
+            rows = parse_selection(spec, len(self.image_queue))
+        except ValueError as e:
+            messagebox.showerror("错误", str(e))
+            return
+        if not rows:
+            return
+        
+        # 裁剪框按原图宽高归一化，尺寸不同的图片也能套用相同的相对位置
+        norm_box = normalize_box(self.crop_box, *self.image_size)
+        paths = self.image_queue.remove_many([self.image_queue.id_at(row) for row in rows])
+        self.prefetcher.invalidate(self.image_queue)
+        
+        # 分配器在界面线程中创建好，后台线程只调用其线程安全的 reserve
+        allocators = {directory: self.allocator_for(directory) for directory in {os.path.dirname(p) for p in paths}}
+        self.crop_job = CropJob(paths, lambda path: allocators[os.path.dirname(path)], norm_box,
+                                self.current_ratio, DEFAULT_BORDER, self.profile_var.get(), governor=self.governor)
+        self.crop_job_done = 0
+        self.crop_job_errors = []
+        self.apply_btn.config(text="取消批量裁剪")
+        self.update_export_status()
+        self.root.after(CROP_JOB_POLL_MS, self.poll_crop_job)
+    
+    def poll_crop_job(self):
+        """定时取回批量裁剪结果，任务结束前持续轮询"""
+        if not self.handle_crop_job_results(self.crop_job.poll()):
+            self.root.after(CROP_JOB_POLL_MS, self.poll_crop_job)
+    
+    def handle_crop_job_results(self, results):
+        """处理批量裁剪结果：成功的记入会话日志，失败和未处理的放回队列；任务结束时返回 True"""
+        requeue = []
+        finished = False
+        for kind, source_path, save_path, info in results:
+            if kind == "done":
+                self.crop_job_done += 1
+                self.exported_sources.add(source_path)
+                self.stage_stats.record(source_path, info["timings"], output=save_path)
+                try:
+                    key = content_key(source_path)
+                except OSError:
+                    continue
+                self.journal.append("done", path=source_path, key=key, box=list(info["box"]), output=save_path)
+            elif kind == "error":
+                self.crop_job_errors.append((source_path, info))
+                self.stage_stats.record(source_path, None, output=save_path, error=info)
+                requeue.append(source_path)
+            elif kind == "cancelled":
+                requeue.append(source_path)
+            else:
+                finished = True
+        if requeue:
+            self.image_queue.extend(requeue)
+        
+        if finished:
+            job = self.crop_job
+            self.crop_job = None
+            self.apply_btn.config(text="应用到队列", state=tk.NORMAL)
+            self.export_message = (f"批量裁剪{'已取消' if job.cancelled else '完成'}：成功 {self.crop_job_done} 张，"
+                                   f"失败 {len(self.crop_job_errors)} 张")
+            if self.crop_job_errors:
+                self.show_crop_job_errors()
+            self.maybe_finish_session()
+        self.update_export_status()
+        return finished
+    
+    def show_crop_job_errors(self):
+        """在单独的窗口中逐个列出批量裁剪失败的文件和原因（这些文件已放回队列末尾）"""
+        window = tk.Toplevel(self.root)
+        window.title(f"批量裁剪失败 {len(self.crop_job_errors)} 张")
+        scroll = tk.Scrollbar(window, orient=tk.VERTICAL)
+        scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        text = tk.Text(window, font=self.font, width=100, height=20, yscrollcommand=scroll.set)
+        text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scroll.config(command=text.yview)
+        text.insert(tk.END, "\n".join(f"{path}：{error}" for path, error in self.crop_job_errors))
+        text.config(state=tk.DISABLED)
+    
+    def poll_export_status(self):
+        """定时取回后台导出结果并更新状态栏"""
+        results = self.export_writer.poll_results()
+        self.handle_export_results(results)
+        if results:
+            self.update_export_status()
+        self.journal.sync()
+        self.root.after(EXPORT_POLL_MS, self.poll_export_status)
+    
+    def handle_export_results(self, results, closing=False):
+        """处理导出结果：成功的导出记入会话日志，失败的图片放回队尾，整批完成后结束会话"""
+        for job_id, save_path, error, stats in results:
+            source_path, box, reserved = self.pending_exports.pop(job_id)
+            if error:
+                self.export_failed += 1
+                self.export_message = f"导出失败（已放回队列末尾）：{save_path}：{error}"
+                if reserved:
+                    self.remove_placeholder(save_path)
+                # 会话日志中它仍是未完成状态，放回队列后可以重新导出
+                self.image_queue.append(source_path)
+                if not self.image_size and not closing:
+                    self.process_image(self.image_queue.popleft())
+                continue
+            self.export_message = f"已导出：{save_path}（{format_decode_stats(stats)}）"
+            self.exported_sources.add(source_path)
+            try:
+                key = content_key(source_path)
+            except OSError:
+                continue
+            self.journal.append("done", path=source_path, key=key, box=list(box), output=save_path)
+        
+        if results:
+            self.maybe_finish_session()
+    
+    def maybe_finish_session(self):
+        """队列、当前图片、后台扫描、导出和批量裁剪都已结束时，本次会话完成"""
+        if (not self.image_path and not self.image_queue and not self.pending_exports
+                and not self.scanner.busy and not self.crop_job and not self.resume_prompt_open):
+            self.journal.reset()
+    
+    def update_export_status(self):
+        """在状态栏中显示仍在写入的导出数量、失败次数和最近一次结果"""
+        parts = []
+        pending = self.export_writer.pending_count()
+        if pending:
+            parts.append(f"正在后台导出 {pending} 张")
+        if self.crop_job:
+            parts.append(f"批量裁剪 {self.crop_job_done + len(self.crop_job_errors)}/{self.crop_job.total}")
+        if self.export_failed:
+            parts.append(f"失败 {self.export_failed} 张")
+        if self.export_message:
+            parts.append(self.export_message)
+        self.status_label.config(text="  |  ".join(parts), fg="red" if self.export_failed else "gray")
+    
+    def on_close(self):
+        """关闭窗口：等待所有导出写完，再停止后台线程"""
+        if self.export_writer.pending_count():
+            self.status_label.config(text="正在完成剩余导出，请稍候…", fg="blue")
+            self.root.update_idletasks()
+        self.scanner.close()
+        self.stop_watch()
+        if self.stopping_job is not None:
+            # 窗口即将关闭，等待监视线程退出（最多一个检查周期）以关闭 inotify
+            self.root.after_cancel(self.stopping_job)
+            for watcher in self.stopping_watchers:
+                watcher.close()
+        if self.crop_job:
+            # 撤回尚未开始的批量裁剪任务，记录已完成的部分以便下次恢复
+            self.crop_job.cancel()
+            self.crop_job.wait()
+            self.handle_crop_job_results(self.crop_job.poll())
+        self.duplicates.close()
+        self.metadata.close()
+        self.thumbnails.close()
+        self.tiles.close()
+        self.export_writer.close()
+        self.handle_export_results(self.export_writer.poll_results(), closing=True)
+        self.journal.close()
+        self.prefetcher.shutdown()
+        self.stage_stats.close()
+        self.root.destroy()
+    
+    def toggle_stats_panel(self):
+        """显示或隐藏统计面板"""
+        if self.stats_var.get():
+            self.stats_panel.pack(side=tk.BOTTOM, fill=tk.X, padx=10, pady=5)
+            self.refresh_stats_panel()
+        else:
+            self.stats_panel.pack_forget()
+            if self.stats_job:
+                self.root.after_cancel(self.stats_job)
+                self.stats_job = None
+    
+    def refresh_stats_panel(self):
+        """刷新统计面板：各阶段 p50/p95 耗时、每小时处理张数和当前内存占用"""
+        lines = self.stage_stats.summary_lines()
+        rss = current_rss_bytes()
+        if rss is not None:
+            _, reserved, budget = self.governor.status()
+            lines.append(f"内存占用 {rss / 1048576:.0f}MB / 预算 {budget / 1048576:.0f}MB（后台任务预约 {reserved / 1048576:.0f}MB）")
+        self.stats_panel.config(text="\n".join(lines))
+        self.stats_job = self.root.after(STATS_REFRESH_MS, self.refresh_stats_panel)
+    
+    def poll_duplicates(self):
+        """取回重复检测结果，有新的重复时刷新队列标记"""
+        found = sum(duplicates for _, duplicates in self.duplicates.poll())
+        if found:
+            self.duplicate_count += found
+            self.update_queue_display()
+        self.root.after(DEDUPE_POLL_MS, self.poll_duplicates)
+    
+    def poll_thumbnails(self):
+        """取回后台加载完成的缩略图，可见时重绘缩略图条"""
+        paths = self.thumbnails.poll()
+        if paths:
+            self.thumb_strip.refresh(paths)
+        self.root.after(THUMB_POLL_MS, self.poll_thumbnails)
+    
+    def skip_duplicates(self):
+        """从队列中移除与当前图片、已导出图片或队列中更靠前的图片重复的图片"""
+        seen = {self.duplicates.group_of(path) for path in self.exported_sources}
+        if self.image_path:
+            seen.add(self.duplicates.group_of(self.image_path))
+        skipped = []
+        for item_id, path in list(self.image_queue.items()):
+            group = self.duplicates.group_of(path)
+            if group is None:
+                continue
+            if group in seen:
+                skipped.append((item_id, path))
+            else:
+                seen.add(group)
+        self.image_queue.remove_many(item_id for item_id, _ in skipped)
+        for _, path in skipped:
+            self.journal.append("skip", path=path)
+        self.prefetcher.invalidate(self.image_queue)
+        self.export_message = f"已跳过 {len(skipped)} 张重复图片"
+        self.update_export_status()
+    
+    def poll_metadata(self):
+        """取回文件头索引结果，刷新队列中显示的尺寸"""
+        if self.metadata.poll():
+            self.queue_view.render()
+        self.root.after(METADATA_POLL_MS, self.poll_metadata)
+    
+    def sort_queue(self, order):
+        """按文件头中的方向（按 EXIF 摆正后）或尺寸重新排列队列，尚未读取文件头的图片排在最后"""
+        table = self.metadata.table
+        
+        def key(path):
+            size = table.upright_size(path)
+            if size is None:
+                return 1, 0
+            width, height = size
+            if order == "landscape":
+                return 0, width < height
+            if order == "portrait":
+                return 0, width >= height
+            return 0, -width * height if order == "largest" else width * height
+        
+        self.image_queue.sort(key)
+        # 记入会话日志，恢复时按排序后的顺序继续（当前图片仍在最前）
+        order = [self.image_path] if self.image_path else []
+        order.extend(self.image_queue)
+        self.journal.append("order", paths=order)
+        self.prefetcher.invalidate(self.image_queue)
+    
+    def filter_queue(self, kind):
+        """从队列中移除方向或尺寸不符的图片（记为跳过），尚未读取文件头的图片保留"""
+        min_side = None
+        if kind == "min_side":
+            min_side = simpledialog.askinteger("移除小尺寸图片", "移除短边小于多少像素的图片：", parent=self.root,
+                                               minvalue=1)
+            if min_side is None:
+                return
+        table = self.metadata.table
+        removed = []
+        unknown = 0
+        for item_id, path in list(self.image_queue.items()):
+            size = table.upright_size(path)
+            if size is None:
+                unknown += 1
+                continue
+            width, height = size
+            if kind == "landscape":
+                drop = width < height
+            elif kind == "portrait":
+                drop = width >= height
+            else:
+                drop = min(width, height) < min_side
+            if drop:
+                removed.append((item_id, path))
+        self.image_queue.remove_many(item_id for item_id, _ in removed)
+        for _, path in removed:
+            self.journal.append("skip", path=path)
+        self.prefetcher.invalidate(self.image_queue)
+        self.export_message = f"已从队列移除 {len(removed)} 张图片"
+        if unknown:
+            self.export_message += f"（{unknown} 张尚未读取文件头，已保留）"
+        self.update_export_status()
+    
     def skip_image(self):
         """跳过当前图片并处理下一张"""
-        if not self.original_image:
+        if not self.image_size:
             messagebox.showwarning("警告", "没有正在处理的图片")
             return
         
-        # 清除当前图片
-        self.original_image = None
-        self.image_path = None
-        
-        # 清空画布
-        self.canvas.delete("all")
+        # 记入会话日志并记录被跳过图片的界面阶段耗时，然后清除当前图片
+        self.journal.append("skip", path=self.image_path)
+        self.stage_stats.record(self.image_path, self.image_timings, skipped=True)
+        self.image_timings = None
+        self.release_image()
         
         # 如果队列中还有图片，自动处理下一张
         if self.image_queue:
-            next_image_path = self.image_queue.pop(0)
+            next_image_path = self.image_queue.popleft()
             self.process_image(next_image_path)
         else:
             # 如果队列中没有图片了，显示提示文本
@@ -640,55 +1183,82 @@ class ImageProcessor:
         """处理队列列表的选择事件"""
         selection = event.widget.curselection()
         if selection:
-            # 获取选中的索引
-            index = selection[0]
+            # 获取选中的行号（列表框只显示可见窗口）
+            self.select_row(self.queue_view.row_at(selection[0]))
+    
+    def select_row(self, index):
+        """切换到队列列表或缩略图条中第 index 行的图片"""
+        # 检查是否选中了当前正在处理的图片（索引为0）
+        if index == 0 and self.image_path:
+            # 如果选中的是当前图片，不做任何操作
+            return
+        
+        # 计算实际在队列中的索引（减去当前图片的位置）
+        queue_index = index - (1 if self.image_path else 0)
+        
+        # 获取选中的图片路径
+        if queue_index >= 0 and queue_index < len(self.image_queue):
+            # 从队列中移除该图片
+            selected_path = self.image_queue.pop(queue_index)
+            requeue = self.image_path if self.image_size and self.image_path != selected_path else None
+            self.journal.append("select", path=selected_path, requeue=requeue)
             
-            # 检查是否选中了当前正在处理的图片（索引为0）
-            if index == 0 and self.image_path:
-                # 如果选中的是当前图片，不做任何操作
-                return
+            # 如果当前有正在处理的图片，先处理它的保存
+            if self.image_size:
+                # 保存当前正在处理的图片到队列末尾
+                if self.image_path and self.image_path != selected_path:
+                    self.image_queue.append(self.image_path)
+                
+                # 释放当前图片
+                self.release_image()
             
-            # 计算实际在队列中的索引（减去当前图片的位置）
-            queue_index = index - 1
+            # 处理选中的图片
+            self.process_image(selected_path)
             
-            # 获取选中的图片路径
-            if queue_index >= 0 and queue_index < len(self.image_queue):
-                selected_path = self.image_queue[queue_index]
-                
-                # 从队列中移除该图片
-                del self.image_queue[queue_index]
-                
-                # 如果当前有正在处理的图片，先处理它的保存
-                if self.original_image:
-                    # 保存当前正在处理的图片到队列末尾
-                    if self.image_path and self.image_path != selected_path:
-                        self.image_queue.append(self.image_path)
-                    
-                    # 清除当前图片
-                    self.original_image = None
-                    self.image_path = None
-                    self.canvas.delete("all")
-                
-                # 处理选中的图片
-                self.process_image(selected_path)
+            # 队列顺序已改变，丢弃不再需要的预读结果
+            self.prefetcher.invalidate(self.image_queue)
+    
+    def queue_row_count(self):
+        """队列列表的总行数（包括当前正在编辑的图片）"""
+        return (1 if self.image_path else 0) + len(self.image_queue)
+    
+    def queue_row_path(self, row):
+        """队列列表第 row 行对应的图片路径"""
+        if self.image_path:
+            if row == 0:
+                return self.image_path
+            row -= 1
+        return self.image_queue[row]
+    
+    def queue_row_text(self, row):
+        """队列列表第 row 行显示的文字"""
+        if self.image_path:
+            if row == 0:
+                dims = f"  {self.image_size[0]}×{self.image_size[1]}" if self.image_size else ""
+                return f"● 当前：{os.path.basename(self.image_path)}{dims}"
+            row -= 1
+        # 只显示文件名而不是完整路径，与其它图片重复的加 ≈ 标记，已读取文件头的显示尺寸
+        path = self.image_queue[row]
+        marker = "≈ " if self.duplicates.group_size(path) > 1 else ""
+        size = self.metadata.table.size(path)
+        dims = f"  {size[0]}×{size[1]}" if size else ""
+        return f"{row+1}. {marker}{os.path.basename(path)}{dims}"
+    
+    def on_queue_changed(self, kind, row, count):
+        """队列变化时只重绘受影响的行"""
+        self.queue_view.render(row + (1 if self.image_path else 0))
+        self.thumb_strip.render()
+        self.update_queue_info()
     
     def update_queue_display(self):
         """更新待处理图片队列的显示，包括当前正在编辑的图片"""
-        # 清空列表框
-        self.queue_listbox.delete(0, tk.END)
-        
-        # 先添加当前正在处理的图片（如果有）
-        if self.image_path:
-            current_file_name = os.path.basename(self.image_path)
-            self.queue_listbox.insert(tk.END, f"● 当前：{current_file_name}")
-        
-        # 再添加队列中的图片
-        for i, file_path in enumerate(self.image_queue):
-            # 只显示文件名而不是完整路径
-            file_name = os.path.basename(file_path)
-            self.queue_listbox.insert(tk.END, f"{i+1}. {file_name}")
-        
-        # 更新队列信息
+        self.queue_view.render()
+        self.thumb_strip.current_row = 0 if self.image_path else None
+        self.thumb_strip.render()
+        self.update_queue_info()
+    
+    def update_queue_info(self):
+        """更新队列数量和预读缓存信息（无需遍历队列）"""
         queue_size = len(self.image_queue)
         current_size = 1 if self.image_path else 0
         total_size = current_size + queue_size
@@ -700,31 +1270,33 @@ class ImageProcessor:
             if current_size > 0:
                 status_text += f"1张正在处理 + "
             status_text += f"{queue_size}张待处理"
+            if self.duplicate_count:
+                status_text += f"（发现 {self.duplicate_count} 张疑似重复）"
             self.queue_info.config(text=status_text, fg="blue")
         
-        # 确保队列框架和列表框正确显示
-        self.queue_frame.update_idletasks()
-        self.queue_listbox.update_idletasks()
+        # 更新预读缓存信息
+        hits, misses, entries, used_bytes = self.preview_cache.stats()
+        self.cache_info.config(text=f"预读缓存：命中 {hits} / 未命中 {misses}，{entries}张 {used_bytes / 1048576:.0f}MB")
     
     def on_resize(self, event):
-        """处理窗口大小变化"""
-        if self.original_image:
-            self.display_image()
-            self.create_initial_rect()
-
-if __name__ == "__main__":
-    # 创建支持拖放的根窗口
-    root = TkinterDnD.Tk()
-    
-    # 设置窗口图标（如果有）
-    if os.path.exists("ZZZZZZ.ico"):
-        root.iconbitmap("ZZZZZZ.ico")
-    
-    # 创建应用实例
-    app = ImageProcessor(root)
-    
-    # 绑定窗口大小变化事件
-    root.bind("<Configure>", app.on_resize)
+        """处理窗口大小变化：忽略画布尺寸未变的事件，并将连续的变化合并为一次重绘"""
+        canvas_size = (self.canvas.winfo_width(), self.canvas.winfo_height())
+        if canvas_size == self.canvas_size:
+            return
+        self.canvas_size = canvas_size
+        
+        # 用户停止拖动窗口边缘后才重绘
+        if self.resize_job:
+            self.root.after_cancel(self.resize_job)
+        self.resize_job = self.root.after(RESIZE_DEBOUNCE_MS, self.redraw_image)
     
-    # 启动应用
-    root.mainloop()
\ No newline at end of file
+    def redraw_image(self):
+        """按当前画布尺寸重绘图片，并从原图坐标恢复用户的裁剪框"""
+        self.resize_job = None
+        if not self.image_size:
+            return
+        
+        self.display_image()
+        
+        # 将原图坐标的裁剪框映射到新的显示尺寸
+        self.draw_crop_rect(*original_to_display(self.crop_box, self.display_size(), self.image_size))
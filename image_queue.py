@@ -0,0 +1,174 @@
+"""待处理图片队列模型：按编号删除、从队首出队，并把变化的行通知给视图"""
+from itertools import islice
+
+
+class _Fenwick:
+    """树状数组，记录每个槽位是否仍在队列中，用于按行号定位槽位"""
+
+    def __init__(self, flags):
+        self.size = len(flags)
+        self.tree = [0] * (self.size + 1)
+        # 线性时间建树
+        for i in range(1, self.size + 1):
+            self.tree[i] += flags[i - 1]
+            parent = i + (i & -i)
+            if parent <= self.size:
+                self.tree[parent] += self.tree[i]
+
+    def add(self, pos, delta):
+        """槽位 pos 的计数加上 delta"""
+        i = pos + 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix(self, pos):
+        """槽位 [0, pos) 中仍在队列中的数量"""
+        total = 0
+        i = pos
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def find(self, k):
+        """返回第 k 个（从0开始）仍在队列中的槽位"""
+        pos = 0
+        bit = 1 << self.size.bit_length()
+        while bit:
+            nxt = pos + bit
+            if nxt <= self.size and self.tree[nxt] <= k:
+                pos = nxt
+                k -= self.tree[nxt]
+            bit >>= 1
+        return pos
+
+
+class ImageQueue:
+    """图片路径队列：出队和按编号删除为均摊 O(1)，按行号取值为 O(log n)"""
+
+    def __init__(self, paths=()):
+        self._slots = []       # 槽位 → 编号，已移除的槽位为 None
+        self._paths = {}       # 编号 → 路径
+        self._positions = {}   # 编号 → 槽位
+        self._next_id = 0
+        self._tree = _Fenwick([])
+        self._listeners = []
+        self.extend(paths)
+
+    def subscribe(self, callback):
+        """注册变化通知 callback(kind, row, count)，kind 为 "insert"、"remove" 或 "reorder"（整个队列重新排序）"""
+        self._listeners.append(callback)
+
+    def _notify(self, kind, row, count):
+        for callback in self._listeners:
+            callback(kind, row, count)
+
+    def __len__(self):
+        return len(self._paths)
+
+    def __bool__(self):
+        return bool(self._paths)
+
+    def __iter__(self):
+        for _, path in self.items():
+            yield path
+
+    def items(self):
+        """按顺序遍历 (编号, 路径)"""
+        if not self._paths:
+            return
+        for item_id in islice(self._slots, self._tree.find(0), None):
+            if item_id is not None:
+                yield item_id, self._paths[item_id]
+
+    def id_at(self, row):
+        """返回第 row 行的编号"""
+        if not 0 <= row < len(self._paths):
+            raise IndexError("队列索引超出范围")
+        return self._slots[self._tree.find(row)]
+
+    def __getitem__(self, row):
+        return self._paths[self.id_at(row)]
+
+    def row_of(self, item_id):
+        """返回编号所在的行号"""
+        return self._tree.prefix(self._positions[item_id])
+
+    def extend(self, paths):
+        """在队尾追加多张图片，返回它们的编号列表"""
+        start_row = len(self._paths)
+        ids = []
+        for path in paths:
+            item_id = self._next_id
+            self._next_id += 1
+            self._positions[item_id] = len(self._slots)
+            self._slots.append(item_id)
+            self._paths[item_id] = path
+            ids.append(item_id)
+        if not ids:
+            return ids
+        if len(self._slots) > self._tree.size:
+            self._rebuild(2 * len(self._slots))
+        else:
+            for item_id in ids:
+                self._tree.add(self._positions[item_id], 1)
+        self._notify("insert", start_row, len(ids))
+        return ids
+
+    def append(self, path):
+        """在队尾追加一张图片，返回其编号"""
+        return self.extend([path])[0]
+
+    def popleft(self):
+        """取出队首图片"""
+        return self.pop(0)
+
+    def pop(self, row=0):
+        """取出第 row 行的图片"""
+        item_id = self.id_at(row)
+        path = self._discard(item_id)
+        self._notify("remove", row, 1)
+        return path
+
+    def remove(self, item_id):
+        """按编号移除图片，返回其路径"""
+        row = self.row_of(item_id)
+        path = self._discard(item_id)
+        self._notify("remove", row, 1)
+        return path
+
+    def remove_many(self, item_ids):
+        """按编号批量移除图片，只通知一次（从最靠前的行开始），返回路径列表"""
+        item_ids = list(item_ids)
+        if not item_ids:
+            return []
+        first_row = min(self.row_of(item_id) for item_id in item_ids)
+        paths = [self._discard(item_id) for item_id in item_ids]
+        self._notify("remove", first_row, len(paths))
+        return paths
+
+    def sort(self, key):
+        """按 key(路径) 稳定排序整个队列，编号保持不变"""
+        items = sorted(self.items(), key=lambda item: key(item[1]))
+        self._slots = [item_id for item_id, _ in items]
+        self._positions = {item_id: pos for pos, item_id in enumerate(self._slots)}
+        self._rebuild(2 * len(self._slots))
+        self._notify("reorder", 0, len(self._slots))
+
+    def _discard(self, item_id):
+        pos = self._positions.pop(item_id)
+        self._slots[pos] = None
+        self._tree.add(pos, -1)
+        path = self._paths.pop(item_id)
+        # 空槽位过半时压缩，保证均摊 O(1)
+        if len(self._slots) > 64 and len(self._paths) < len(self._slots) // 2:
+            self._slots = [i for i in self._slots if i is not None]
+            self._positions = {item_id: pos for pos, item_id in enumerate(self._slots)}
+            self._rebuild(2 * len(self._slots))
+        return path
+
+    def _rebuild(self, capacity):
+        flags = [0 if item_id is None else 1 for item_id in self._slots]
+        flags.extend([0] * (max(capacity, 16) - len(flags)))
+        self._tree = _Fenwick(flags)
@@ -0,0 +1,80 @@
+"""程序入口：已有窗口在运行时把文件转交给它后立即退出；否则先显示窗口，再导入 PIL 等较重的模块并创建界面，记录启动各阶段耗时"""
+import os
+import sys
+import time
+
+from single_instance import InstanceServer, forward_paths
+
+# 轮询其它实例转交的文件的间隔（毫秒）
+FORWARD_POLL_MS = 200
+
+
+def format_startup(timings):
+    """把启动各阶段的耗时（秒）格式化为一行文字"""
+    return (f"启动 {timings['ready'] * 1000:.0f} ms（窗口显示 {timings['window'] * 1000:.0f} ms，"
+            f"导入模块 {timings['import'] * 1000:.0f} ms，创建界面 {timings['ui'] * 1000:.0f} ms）")
+
+
+def poll_forwarded(root, app, server):
+    """把其它实例转交的文件加入队列，并把窗口调到前台"""
+    for paths in server.poll():
+        if paths:
+            app.enqueue_paths(paths)
+        root.deiconify()
+        root.lift()
+        root.focus_force()
+    root.after(FORWARD_POLL_MS, poll_forwarded, root, app, server)
+
+
+def main(argv=None):
+    start = time.perf_counter()
+    paths = sys.argv[1:] if argv is None else argv
+
+    # 已有实例在运行时只转交文件，不导入 Tk 和 PIL
+    if forward_paths(paths):
+        return 0
+    server = InstanceServer()
+    listening = server.start()
+    if not listening and forward_paths(paths):
+        # 另一个实例恰好在此期间启动
+        return 0
+
+    # 先显示一个空窗口，让用户立即看到响应
+    import tkinter as tk
+    from tkinterdnd2 import TkinterDnD
+    root = TkinterDnD.Tk()
+    root.title("图片裁剪与边框添加工具")
+    root.geometry("1500x900")
+    if os.path.exists("ZZZZZZ.ico"):
+        root.iconbitmap("ZZZZZZ.ico")
+    splash = tk.Label(root, text="正在启动…", font=("SimHei", 12), fg="gray")
+    splash.pack(expand=True)
+    root.update()
+    timings = {"window": time.perf_counter() - start}
+
+    # 窗口显示后才导入界面模块（PIL、进程池、SQLite 等）
+    from image_processor import ImageProcessor
+    from image_engine import ignore_pixel_warnings
+    ignore_pixel_warnings()
+    timings["import"] = time.perf_counter() - start - timings["window"]
+    splash.destroy()
+    app = ImageProcessor(root)
+    root.bind("<Configure>", app.on_resize)
+    timings["ready"] = time.perf_counter() - start
+    timings["ui"] = timings["ready"] - timings["window"] - timings["import"]
+    app.export_message = format_startup(timings)
+    app.update_export_status()
+
+    if paths:
+        app.enqueue_paths(paths)
+    if listening:
+        root.after(FORWARD_POLL_MS, poll_forwarded, root, app, server)
+    try:
+        root.mainloop()
+    finally:
+        server.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""常驻内存预算：后台任务解码前按估算的字节数预约，超出预算时先释放可丢弃的缓存并把空闲堆内存还给系统，仍不够时等待或放弃"""
+import ctypes
+import ctypes.util
+import gc
+import os
+import threading
+from contextlib import contextmanager
+
+from PIL import Image
+
+from image_engine import current_rss_bytes
+
+# 常驻内存预算（MB，由环境变量指定）
+MEMORY_BUDGET = int(os.environ.get("NEEKO_MEMORY_BUDGET_MB") or 1536) * 1024 * 1024
+
+# 等待其它任务释放内存时重新检查的间隔（秒）
+RELIEVE_WAIT = 0.2
+
+_malloc_trim = None
+
+
+def trim_heap():
+    """把 C 库堆中空闲的内存还给系统（仅 glibc），返回是否执行"""
+    global _malloc_trim
+    if _malloc_trim is None:
+        try:
+            _malloc_trim = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6").malloc_trim
+        except (OSError, AttributeError, TypeError):
+            # 非 glibc 平台没有 malloc_trim
+            _malloc_trim = False
+    if not _malloc_trim:
+        return False
+    _malloc_trim(0)
+    return True
+
+
+def estimate_decode_bytes(path, box=None):
+    """只读取文件头，估算完整解码（或只解码裁剪框 box 内）需要的像素字节数"""
+    with Image.open(path) as image:
+        width, height = image.size
+        bands = len(image.getbands())
+    if box is not None:
+        width, height = box[2] - box[0], box[3] - box[1]
+    return width * height * max(bands, 3)
+
+
+def estimate_job_bytes(path):
+    """估算在工作进程中裁剪、加边框并编码一张图片需要的内存（按完整解码的两倍）；无法读取文件头时返回 0，由工作进程报告错误"""
+    try:
+        return 2 * estimate_decode_bytes(path)
+    except Exception:
+        return 0
+
+
+class MemoryGovernor:
+    """按常驻内存加上尚未用完的预约判断是否还有余量；读不到当前常驻内存的平台只按预约判断。没有其它预约时阻塞式预约总是放行，单个超大任务不会死锁"""
+
+    def __init__(self, budget_bytes=MEMORY_BUDGET, rss=current_rss_bytes):
+        self.budget_bytes = budget_bytes
+        self._rss = rss
+        self._reserved = 0
+        self._releasers = []
+        self._cond = threading.Condition()
+
+    def add_releaser(self, callback):
+        """登记内存紧张时调用的回调（应当线程安全），用于丢弃可以重新生成的缓存"""
+        self._releasers.append(callback)
+
+    def rss(self):
+        """当前常驻内存（字节）；读不到当前值的平台返回 0，即不检查常驻内存"""
+        return self._rss() or 0
+
+    def over_budget(self):
+        """常驻内存是否已超出预算"""
+        return self.rss() > self.budget_bytes
+
+    def relieve(self):
+        """释放可丢弃的缓存、回收循环引用并把空闲堆内存还给系统"""
+        for callback in self._releasers:
+            callback()
+        gc.collect()
+        trim_heap()
+
+    def _fits(self, nbytes):
+        return self.rss() + self._reserved + nbytes <= self.budget_bytes
+
+    def reserve(self, nbytes, block=True):
+        """预约 nbytes；非阻塞时余量不足（释放缓存后仍不足）返回 False，阻塞时等待其它预约释放"""
+        with self._cond:
+            if self._fits(nbytes):
+                self._reserved += nbytes
+                return True
+        self.relieve()
+        with self._cond:
+            while not self._fits(nbytes):
+                if not block:
+                    return False
+                if not self._reserved:
+                    break
+                self._cond.wait(RELIEVE_WAIT)
+            self._reserved += nbytes
+            return True
+
+    def release(self, nbytes):
+        """归还预约，并唤醒等待中的任务"""
+        with self._cond:
+            self._reserved -= nbytes
+            self._cond.notify_all()
+
+    @contextmanager
+    def reserved(self, nbytes):
+        """阻塞式预约 nbytes，离开时归还"""
+        self.reserve(nbytes)
+        try:
+            yield
+        finally:
+            self.release(nbytes)
+
+    def status(self):
+        """返回 (常驻内存, 预约字节数, 预算)"""
+        with self._cond:
+            return self.rss(), self._reserved, self.budget_bytes
@@ -0,0 +1,244 @@
+"""只渲染可见行的虚拟列表视图和缩略图条，用于显示十万级的图片队列"""
+import os
+import tkinter as tk
+import tkinter.font as tkfont
+
+from PIL import ImageTk
+
+
+class VirtualListView:
+    """把 Listbox 当作固定行数的窗口，按滚动位置只填入可见的那几行"""
+
+    def __init__(self, listbox, scrollbar, row_count, row_text):
+        self.listbox = listbox
+        self.scrollbar = scrollbar
+        self.row_count = row_count
+        self.row_text = row_text
+        self.top = 0
+        self.visible = int(listbox.cget("height"))
+        self._shown_top = 0
+        self._texts = []  # 列表框中当前显示的各行文字，从第 _shown_top 行开始
+        self.line_height = tkfont.Font(font=listbox.cget("font")).metrics("linespace") + 1
+
+        self.scrollbar.config(command=self.on_scroll)
+        self.listbox.bind("<Configure>", self.on_configure)
+        self.listbox.bind("<MouseWheel>", self.on_mousewheel)
+        self.listbox.bind("<Button-4>", lambda e: self.scroll_by(-3))
+        self.listbox.bind("<Button-5>", lambda e: self.scroll_by(3))
+
+    def row_at(self, index):
+        """把 Listbox 中的行索引换算为数据行号"""
+        return self.top + index
+
+    def render(self, first_row=None):
+        """重新渲染可见窗口中从 first_row 开始的各行，只改动文字有变化的行，窗口之外的变化只更新滚动条"""
+        total = self.row_count()
+        top = max(0, min(self.top, total - self.visible))
+        if top != self.top:
+            self.top = top
+            first_row = None
+        if self.top != self._shown_top:
+            # 滚动：移走滚出窗口的行，其余行原样保留，之后只需补上新露出的行
+            self._shift(self.top - self._shown_top)
+            first_row = None
+        end = min(total, self.top + self.visible)
+        start = self.top if first_row is None else max(self.top, first_row)
+        for row in range(start, end):
+            index = row - self.top
+            text = self.row_text(row)
+            if index >= len(self._texts):
+                self.listbox.insert(tk.END, text)
+                self._texts.append(text)
+            elif self._texts[index] != text:
+                self.listbox.delete(index)
+                self.listbox.insert(index, text)
+                self._texts[index] = text
+        if len(self._texts) > max(0, end - self.top):
+            self.listbox.delete(max(0, end - self.top), tk.END)
+            del self._texts[max(0, end - self.top):]
+        self.update_scrollbar(total)
+
+    def _shift(self, rows):
+        """窗口下移（正数）或上移（负数）若干行：删除滚出的行，上移时在顶部留出待填入的空行"""
+        if abs(rows) >= len(self._texts):
+            self.listbox.delete(0, tk.END)
+            self._texts = []
+        elif rows > 0:
+            self.listbox.delete(0, rows - 1)
+            del self._texts[:rows]
+        else:
+            self.listbox.insert(0, *([""] * -rows))
+            self._texts[:0] = [None] * -rows
+        self._shown_top = self.top
+
+    def update_scrollbar(self, total):
+        """按当前窗口位置设置滚动条"""
+        if total <= 0:
+            self.scrollbar.set(0, 1)
+        else:
+            self.scrollbar.set(self.top / total, min(1.0, (self.top + self.visible) / total))
+
+    def scroll_by(self, rows):
+        """向下（正数）或向上（负数）滚动若干行"""
+        self.top = max(0, self.top + rows)
+        self.render()
+        return "break"
+
+    def on_scroll(self, *args):
+        """处理滚动条拖动和点击"""
+        if args[0] == "moveto":
+            self.top = int(float(args[1]) * self.row_count())
+            self.render()
+        elif args[0] == "scroll":
+            step = int(args[1])
+            self.scroll_by(step * self.visible if args[2] == "pages" else step)
+
+    def on_mousewheel(self, event):
+        """处理鼠标滚轮"""
+        return self.scroll_by(-3 if event.delta > 0 else 3)
+
+    def on_configure(self, event):
+        """列表框高度变化时调整可见行数"""
+        visible = max(1, event.height // self.line_height)
+        if visible != self.visible:
+            self.visible = visible
+            self.render()
+
+
+class ThumbnailStrip:
+    """横向缩略图条：在 Canvas 上只绘制可见的几格，缩略图由调用方在后台加载"""
+
+    def __init__(self, canvas, scrollbar, row_count, row_path, thumbnail, request, on_select, thumb_size,
+                 label_height=16, padding=4):
+        self.canvas = canvas
+        self.scrollbar = scrollbar
+        self.row_count = row_count
+        self.row_path = row_path
+        self.thumbnail = thumbnail
+        self.request = request
+        self.on_select = on_select
+        self.thumb_size = thumb_size
+        self.label_height = label_height
+        self.padding = padding
+        self.cell_width = thumb_size[0] + 2 * padding
+        self.top = 0
+        self.visible = 1
+        self.current_row = None
+        self._photos = {}
+        self._slots = []  # 每格的画布对象编号 (缩略图, 占位框, 边框, 文件名)，创建后只修改内容
+        self._shown = []  # 每格当前显示的 (路径, PhotoImage, 是否当前图片)，隐藏的格为 None
+
+        self.scrollbar.config(command=self.on_scroll)
+        self.canvas.config(height=thumb_size[1] + label_height + 2 * padding)
+        self.canvas.bind("<Configure>", self.on_configure)
+        self.canvas.bind("<Button-1>", self.on_click)
+        self.canvas.bind("<MouseWheel>", self.on_mousewheel)
+        self.canvas.bind("<Button-4>", lambda e: self.scroll_by(-3))
+        self.canvas.bind("<Button-5>", lambda e: self.scroll_by(3))
+
+    def visible_paths(self):
+        """可见各格对应的图片路径"""
+        end = min(self.row_count(), self.top + self.visible)
+        return [self.row_path(row) for row in range(self.top, end)]
+
+    def _slot(self, i):
+        """返回第 i 格的画布对象编号，第一次用到时创建"""
+        width, height = self.thumb_size
+        while len(self._slots) <= i:
+            x = len(self._slots) * self.cell_width + self.padding
+            y = self.padding
+            self._slots.append((
+                self.canvas.create_image(x + width // 2, y + height // 2, anchor=tk.CENTER),
+                self.canvas.create_rectangle(x, y, x + width, y + height, fill="#eeeeee", outline=""),
+                self.canvas.create_rectangle(x - 2, y - 2, x + width + 2, y + height + 2),
+                self.canvas.create_text(x + width // 2, y + height + self.label_height // 2 + 1,
+                                        font=("Microsoft YaHei", 8), fill="gray"),
+            ))
+            self._shown.append(None)
+        return self._slots[i]
+
+    def render(self):
+        """更新可见的各格（只修改内容有变化的格），并为其中尚未加载的缩略图安排后台加载"""
+        total = self.row_count()
+        self.top = max(0, min(self.top, total - self.visible))
+        paths = self.visible_paths()
+        photos = {}
+        for i, path in enumerate(paths):
+            row = self.top + i
+            # 只为可见的缩略图保留 PhotoImage，滚出窗口的随之释放
+            photo = self._photos.get(path)
+            if photo is None:
+                image = self.thumbnail(path)
+                if image is not None:
+                    photo = ImageTk.PhotoImage(image)
+            if photo is not None:
+                photos[path] = photo
+            image_id, placeholder_id, outline_id, text_id = self._slot(i)
+            shown = self._shown[i]
+            current = row == self.current_row
+            if shown == (path, photo, current):
+                continue
+            if shown is None or shown[0] != path:
+                name = os.path.basename(path)
+                if len(name) > 14:
+                    name = name[:6] + "…" + name[-7:]
+                self.canvas.itemconfigure(text_id, text=name, state=tk.NORMAL)
+            if shown is None or shown[1] is not photo:
+                self.canvas.itemconfigure(image_id, image=photo if photo is not None else "",
+                                          state=tk.NORMAL if photo is not None else tk.HIDDEN)
+                self.canvas.itemconfigure(placeholder_id, state=tk.HIDDEN if photo is not None else tk.NORMAL)
+            self.canvas.itemconfigure(outline_id, outline="blue" if current else "#cccccc", width=2 if current else 1,
+                                      state=tk.NORMAL)
+            self._shown[i] = (path, photo, current)
+        for i in range(len(paths), len(self._slots)):
+            if self._shown[i] is not None:
+                for item in self._slots[i]:
+                    self.canvas.itemconfigure(item, state=tk.HIDDEN)
+                self._shown[i] = None
+        self._photos = photos
+        self.update_scrollbar(total)
+        self.request(paths)
+
+    def update_scrollbar(self, total):
+        """按当前窗口位置设置滚动条"""
+        if total <= 0:
+            self.scrollbar.set(0, 1)
+        else:
+            self.scrollbar.set(self.top / total, min(1.0, (self.top + self.visible) / total))
+
+    def refresh(self, paths):
+        """有缩略图加载完成时，只在其中有可见的图片时重绘"""
+        if set(paths) & set(self.visible_paths()):
+            self.render()
+
+    def scroll_by(self, cells):
+        """向右（正数）或向左（负数）滚动若干格"""
+        self.top = max(0, self.top + cells)
+        self.render()
+        return "break"
+
+    def on_scroll(self, *args):
+        """处理滚动条拖动和点击"""
+        if args[0] == "moveto":
+            self.top = int(float(args[1]) * self.row_count())
+            self.render()
+        elif args[0] == "scroll":
+            step = int(args[1])
+            self.scroll_by(step * self.visible if args[2] == "pages" else step)
+
+    def on_mousewheel(self, event):
+        """处理鼠标滚轮"""
+        return self.scroll_by(-3 if event.delta > 0 else 3)
+
+    def on_click(self, event):
+        """点击某一格时选中对应的行"""
+        row = self.top + int(self.canvas.canvasx(event.x)) // self.cell_width
+        if row < self.row_count():
+            self.on_select(row)
+
+    def on_configure(self, event):
+        """画布宽度变化时调整可见格数"""
+        visible = max(1, event.width // self.cell_width + 1)
+        if visible != self.visible:
+            self.visible = visible
+            self.render()
@@ -0,0 +1,144 @@
+"""只追加的批处理会话日志：记录入队、切换、排序、跳过和导出完成，程序崩溃后一次回放即可恢复队列"""
+import json
+import os
+import time
+from collections import OrderedDict
+
+# 两次 fsync 之间的最短间隔（秒）：每条记录都立即写入系统缓冲，落盘按批进行
+JOURNAL_SYNC_SECONDS = 1.0
+
+
+def content_key(path):
+    """图片的内容标识 (绝对路径, 文件大小, 修改时间)，文件被替换或修改后标识随之改变"""
+    stat = os.stat(path)
+    return [os.path.abspath(path), stat.st_size, stat.st_mtime_ns]
+
+
+class SessionJournal:
+    """JSON Lines 格式的会话日志，每行一条操作记录"""
+
+    def __init__(self, path, sync_interval=JOURNAL_SYNC_SECONDS):
+        self.path = path
+        self.sync_interval = sync_interval
+        self._file = None
+        self._dirty = False
+        self._last_sync = time.monotonic()
+
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        return self._file
+
+    def append(self, op, **fields):
+        """追加一条记录；写入系统缓冲后即可在进程崩溃时保留，距上次 fsync 足够久时才落盘"""
+        record = {"op": op}
+        record.update(fields)
+        f = self._open()
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        f.flush()
+        self._dirty = True
+        self.sync()
+
+    def sync(self, force=False):
+        """把已写入的记录落盘；未到间隔时跳过，除非 force"""
+        if not self._dirty or self._file is None:
+            return
+        if force or time.monotonic() - self._last_sync >= self.sync_interval:
+            os.fsync(self._file.fileno())
+            self._dirty = False
+            self._last_sync = time.monotonic()
+
+    def replay(self):
+        """一次遍历日志，返回 (待处理路径列表, {内容标识: 导出记录})；最后一行若写到一半则忽略"""
+        pending = OrderedDict()
+        exported = {}
+        try:
+            f = open(self.path, encoding="utf-8")
+        except FileNotFoundError:
+            return [], exported
+        with f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                op = record.get("op")
+                if op == "enqueue":
+                    for path in record["paths"]:
+                        pending.setdefault(path, None)
+                elif op == "select":
+                    # 选中的图片移到队首，原来的当前图片移到队尾
+                    pending.setdefault(record["path"], None)
+                    pending.move_to_end(record["path"], last=False)
+                    if record.get("requeue"):
+                        pending.setdefault(record["requeue"], None)
+                        pending.move_to_end(record["requeue"])
+                elif op == "order":
+                    # 队列被重新排序：按记录的顺序排在最前，未列出的图片保持原有次序排在后面
+                    for path in reversed(record["paths"]):
+                        if path in pending:
+                            pending.move_to_end(path, last=False)
+                elif op in ("skip", "done"):
+                    pending.pop(record["path"], None)
+                    if op == "done":
+                        exported[tuple(record["key"])] = record
+
+        # 已按相同内容导出过的图片（例如导出后又被再次加入队列）不再处理
+        remaining = []
+        for path in pending:
+            try:
+                key = tuple(content_key(path))
+            except OSError:
+                # 源文件已被删除或移走
+                continue
+            if key not in exported:
+                remaining.append(path)
+        return remaining, exported
+
+    def size(self):
+        """日志当前的字节数（追加的记录都已写入系统缓冲）；回放前记下它，之后追加的记录可在 compact 时保留"""
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+    def compact(self, pending, exported, keep_from=None):
+        """把回放结果重写为精简的日志（原子替换），之后继续追加；keep_from 之后追加的原始记录接在后面保留，
+        回放结果中的待处理图片排在这些记录之后入队"""
+        self.close()
+        tail = b""
+        if keep_from is not None:
+            with open(self.path, "rb") as f:
+                f.seek(keep_from)
+                tail = f.read()
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            for record in exported.values():
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            f.buffer.write(tail)
+            if pending:
+                f.write(json.dumps({"op": "enqueue", "paths": list(pending)}, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+
+    def reset(self):
+        """会话已全部完成或用户放弃恢复：删除日志"""
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    @property
+    def active(self):
+        """日志文件是否存在（即有尚未结束的会话）"""
+        return self._file is not None or os.path.exists(self.path)
+
+    def close(self):
+        """落盘并关闭日志文件"""
+        if self._file is not None:
+            self.sync(force=True)
+            self._file.close()
+            self._file = None
@@ -0,0 +1,182 @@
+"""单实例运行：第一个实例在本地套接字上监听，之后启动的实例把要打开的文件转交给它后立即退出；只依赖标准库，转发时不导入 Tk 和 PIL"""
+import json
+import os
+import queue
+import socket
+import stat
+import tempfile
+import threading
+
+
+def _default_address():
+    """默认的套接字位置：优先放在 $XDG_RUNTIME_DIR 中，否则放在临时目录下只属于当前用户的子目录中"""
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir and hasattr(socket, "AF_UNIX"):
+        return os.path.join(runtime_dir, "neeko.sock")
+    if hasattr(os, "getuid"):
+        owner = str(os.getuid())
+    else:
+        owner = os.environ.get("USERNAME") or "user"
+    return os.path.join(tempfile.gettempdir(), f"neeko-{owner}", "instance.sock")
+
+
+# 本地套接字的位置（由环境变量指定，所在目录必须只属于当前用户）；没有 Unix 套接字的平台在该文件中记录回环地址的端口
+INSTANCE_ADDRESS = os.environ.get("NEEKO_INSTANCE_SOCKET") or _default_address()
+
+# 连接和等待确认的超时（秒）：正在运行的实例没有及时响应时自己启动窗口
+FORWARD_TIMEOUT = 1.0
+
+# 单条转发消息的长度上限（字节）
+MAX_MESSAGE_BYTES = 4 * 1024 * 1024
+
+
+def _private_dir(address):
+    """确保套接字所在的目录存在（以 0700 创建）且只有当前用户可以写入，否则抛出 OSError，防止其它用户预先放置的套接字冒充正在运行的实例"""
+    directory = os.path.dirname(os.path.abspath(address))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    if not hasattr(os, "getuid"):
+        return
+    info = os.lstat(directory)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o022:
+        raise OSError(f"套接字目录不属于当前用户或其它用户可写：{directory}")
+
+
+def _connect(address):
+    """连接正在运行的实例，没有实例时抛出 OSError"""
+    _private_dir(address)
+    if hasattr(socket, "AF_UNIX"):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        target = address
+    else:
+        try:
+            with open(address, encoding="utf-8") as f:
+                port = int(f.read().strip())
+        except ValueError:
+            raise OSError(f"端口文件已损坏：{address}")
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        target = ("127.0.0.1", port)
+    sock.settimeout(FORWARD_TIMEOUT)
+    try:
+        sock.connect(target)
+    except OSError:
+        sock.close()
+        raise OSError(f"没有正在运行的实例：{address}")
+    return sock
+
+
+def forward_paths(paths, address=INSTANCE_ADDRESS):
+    """把文件路径（转换为绝对路径）交给正在运行的实例，对方确认收到时返回 True；没有实例或对方无响应时返回 False"""
+    message = json.dumps({"paths": [os.path.abspath(path) for path in paths]}, ensure_ascii=False)
+    try:
+        sock = _connect(address)
+    except OSError:
+        return False
+    try:
+        with sock:
+            sock.sendall(message.encode("utf-8") + b"\n")
+            return sock.makefile("rb").readline().strip() == b"ok"
+    except OSError:
+        return False
+
+
+class InstanceServer:
+    """在后台线程中接受其它实例转发的文件路径；界面线程轮询 poll 取回"""
+
+    def __init__(self, address=INSTANCE_ADDRESS):
+        self.address = address
+        self._sock = None
+        self._results = queue.Queue()
+        self._thread = None
+
+    def start(self):
+        """开始监听；已有实例在监听或套接字位置不可用时返回 False（此时程序不以单实例方式运行）。上次异常退出留下的套接字文件会被清理"""
+        try:
+            _private_dir(self.address)
+        except OSError:
+            return False
+        if hasattr(socket, "AF_UNIX"):
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.bind(self.address)
+            except OSError:
+                try:
+                    _connect(self.address).close()
+                    sock.close()
+                    return False
+                except OSError:
+                    pass
+                try:
+                    # 没有进程在监听，是残留的套接字文件；只删除当前用户自己的套接字
+                    info = os.lstat(self.address)
+                    if not stat.S_ISSOCK(info.st_mode) or info.st_uid != os.getuid():
+                        raise OSError(f"不是当前用户的套接字文件：{self.address}")
+                    os.unlink(self.address)
+                    sock.bind(self.address)
+                except OSError:
+                    sock.close()
+                    return False
+        else:
+            try:
+                _connect(self.address).close()
+                return False
+            except OSError:
+                pass
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            try:
+                sock.bind(("127.0.0.1", 0))
+                with open(self.address, "w", encoding="utf-8") as f:
+                    f.write(str(sock.getsockname()[1]))
+            except OSError:
+                sock.close()
+                return False
+        sock.listen(16)
+        self._sock = sock
+        self._thread = threading.Thread(target=self._serve, name="instance-server", daemon=True)
+        self._thread.start()
+        return True
+
+    def _serve(self):
+        """后台线程：逐个接受连接，读取一行 JSON 并回复确认"""
+        while True:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                # 套接字已关闭
+                return
+            with conn:
+                try:
+                    conn.settimeout(FORWARD_TIMEOUT)
+                    line = conn.makefile("rb").readline(MAX_MESSAGE_BYTES)
+                    paths = json.loads(line.decode("utf-8"))["paths"]
+                except (OSError, ValueError, KeyError, TypeError):
+                    continue
+                self._results.put([str(path) for path in paths])
+                try:
+                    conn.sendall(b"ok\n")
+                except OSError:
+                    pass
+
+    def poll(self):
+        """取出自上次轮询以来收到的转发，每项为一次启动转交的路径列表（可能为空，表示只需把窗口调到前台）"""
+        results = []
+        while True:
+            try:
+                results.append(self._results.get_nowait())
+            except queue.Empty:
+                return results
+
+    def close(self):
+        """停止监听并删除套接字文件"""
+        if self._sock is None:
+            return
+        try:
+            # 唤醒阻塞在 accept 中的后台线程
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._sock.close()
+        self._sock = None
+        try:
+            os.unlink(self.address)
+        except OSError:
+            pass
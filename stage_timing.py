@@ -0,0 +1,90 @@
+"""分阶段计时：span 把各阶段耗时累加到每张图片的记录中，StageStats 把记录写成 JSON Lines 并统计滚动分位数"""
+import json
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# 滚动统计保留的最近样本数
+ROLLING_WINDOW = 500
+
+# 统计面板中各阶段的显示顺序，未列出的阶段排在后面
+STAGE_ORDER = ("open", "preview", "render", "autocrop", "decode", "crop", "border", "encode", "write")
+
+
+@contextmanager
+def span(timings, stage):
+    """计时一个阶段并累加到 timings[stage]（秒）；timings 为 None 时不计时"""
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+
+def percentile(sorted_values, fraction):
+    """按最近秩法取已排序样本的分位数"""
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+class StageStats:
+    """线程安全地汇总每张图片的阶段耗时：追加写入 JSON Lines 日志，并维护最近若干张的分位数和吞吐量"""
+
+    def __init__(self, log_path=None, window=ROLLING_WINDOW):
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._window = window
+        self._finished = deque(maxlen=window)
+        self.count = 0
+        self._log = open(log_path, "a", encoding="utf-8") if log_path else None
+
+    def record(self, image_path, timings, **fields):
+        """记录一张图片的各阶段耗时（秒），fields 为额外写入日志的字段"""
+        timings = timings or {}
+        entry = {"time": round(time.time(), 3), "image": image_path,
+                 "stages_ms": {stage: round(seconds * 1000, 3) for stage, seconds in timings.items()}}
+        entry.update(fields)
+        with self._lock:
+            for stage, seconds in timings.items():
+                self._samples.setdefault(stage, deque(maxlen=self._window)).append(seconds)
+            self._finished.append(time.monotonic())
+            self.count += 1
+            if self._log:
+                self._log.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                self._log.flush()
+
+    def percentiles(self):
+        """返回 [(阶段, p50 秒, p95 秒, 样本数)]，按处理流程排序"""
+        with self._lock:
+            samples = {stage: sorted(values) for stage, values in self._samples.items()}
+        order = {stage: i for i, stage in enumerate(STAGE_ORDER)}
+        return [(stage, percentile(values, 0.5), percentile(values, 0.95), len(values))
+                for stage, values in sorted(samples.items(), key=lambda item: (order.get(item[0], len(order)), item[0]))]
+
+    def images_per_hour(self):
+        """按最近完成的若干张图片估算每小时处理张数，样本不足时返回 None"""
+        with self._lock:
+            if len(self._finished) < 2:
+                return None
+            elapsed = self._finished[-1] - self._finished[0]
+            count = len(self._finished) - 1
+        return count / elapsed * 3600 if elapsed > 0 else None
+
+    def summary_lines(self):
+        """格式化为多行文字：每个阶段一行 p50/p95（毫秒），最后一行为吞吐量"""
+        lines = [f"{stage:<9}p50 {p50 * 1000:7.1f}ms  p95 {p95 * 1000:7.1f}ms"
+                 for stage, p50, p95, _ in self.percentiles()]
+        rate = self.images_per_hour()
+        lines.append(f"已处理 {self.count} 张" + (f"，约 {rate:.0f} 张/小时" if rate else ""))
+        return lines
+
+    def close(self):
+        """关闭日志文件"""
+        with self._lock:
+            if self._log:
+                self._log.close()
+                self._log = None
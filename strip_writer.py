@@ -0,0 +1,217 @@
+"""逐条带写出带白边的 PNG：边框行和裁剪行直接送入压缩器，不在内存中生成加边框后的整张图片"""
+import os
+import struct
+import zlib
+
+import numpy as np
+from PIL import Image, ImageColor, features
+
+from image_engine import _restrict_tiles, decode_region
+from stage_timing import span
+
+# 可以逐条带写出的模式 → (PNG 颜色类型, 每像素字节数)
+STREAM_MODES = {"L": (0, 1), "LA": (4, 2), "RGB": (2, 3), "RGBA": (6, 4)}
+
+# 每个条带的行数
+STRIP_ROWS = 256
+
+# 每次滤波的行数：滤波时会产生若干份 int16/int32 临时数组，分小批处理以控制内存
+FILTER_ROWS = 16
+
+# 与 Pillow 的 ImageFile.MAXBLOCK 相同：每个 IDAT 块的最小长度
+PNG_BLOCK_SIZE = 65536
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def can_stream(mode, save_path, options=None):
+    """判断能否逐条带写出且与 Pillow 以相同参数保存的文件逐字节一致"""
+    options = options or {}
+    # optimize 会启用 Average 滤波，级别 0 时 Pillow 不做滤波，这些情况交给 Pillow
+    if set(options) - {"compress_level"} or options.get("compress_level", 1) not in range(1, 10):
+        return False
+    # 压缩结果取决于 zlib 实现，只有 Pillow 与 Python 链接同一版本的 zlib 时才能保证一致
+    return (os.path.splitext(save_path)[1].lower() == ".png" and mode in STREAM_MODES
+            and features.version("zlib") == zlib.ZLIB_RUNTIME_VERSION)
+
+
+def _chunk(fp, tag, data):
+    """写出一个 PNG 数据块"""
+    fp.write(struct.pack(">I", len(data)) + tag + data)
+    fp.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(tag)) & 0xFFFFFFFF))
+
+
+def _distance(rows):
+    """每行滤波结果按有符号字节计的绝对值之和（与 libpng/Pillow 的选择依据相同）"""
+    values = rows.astype(np.int32)
+    return np.minimum(values, 256 - values).sum(axis=1)
+
+
+def filter_rows(rows, prior, bytes_per_pixel):
+    """按 Pillow 的规则为每行挑选 None/Up/Sub/Paeth 中绝对值和最小的滤波，返回带滤波类型字节的行"""
+    height, width = rows.shape
+    left = np.zeros_like(rows)
+    left[:, bytes_per_pixel:] = rows[:, :-bytes_per_pixel]
+    upper_left = np.zeros_like(prior)
+    upper_left[:, bytes_per_pixel:] = prior[:, :-bytes_per_pixel]
+
+    a = left.astype(np.int16)
+    b = prior.astype(np.int16)
+    c = upper_left.astype(np.int16)
+    pa = np.abs(b - c)
+    pb = np.abs(a - c)
+    pc = np.abs(a + b - 2 * c)
+    predictor = np.where((pa <= pb) & (pa <= pc), left, np.where(pb <= pc, prior, upper_left))
+
+    # 依次尝试 Up、Sub、Paeth，只有严格更小时才替换（与 Pillow 的尝试顺序一致）
+    candidates = ((2, rows - prior), (1, rows - left), (4, rows - predictor))
+    best = _distance(rows)
+    choice = np.zeros(height, dtype=np.uint8)
+    output = np.empty((height, width + 1), dtype=np.uint8)
+    output[:, 1:] = rows
+    for filter_type, filtered in candidates:
+        distance = _distance(filtered)
+        better = distance < best
+        best = np.where(better, distance, best)
+        choice[better] = filter_type
+        output[better, 1:] = filtered[better]
+    output[:, 0] = choice
+    return output
+
+
+class _IdatStream:
+    """压缩滤波后的行并按 Pillow 的缓冲区大小切分为 IDAT 块"""
+
+    def __init__(self, fp, block_size, level=zlib.Z_DEFAULT_COMPRESSION, timings=None):
+        self.fp = fp
+        self.block_size = block_size
+        self.timings = timings
+        # Pillow 写 PNG 时使用 memLevel 9 和 Z_FILTERED 策略
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 15, 9, zlib.Z_FILTERED)
+        self.pending = bytearray()
+
+    def write(self, data):
+        with span(self.timings, "encode"):
+            self.pending += self.compressor.compress(data)
+        with span(self.timings, "write"):
+            self._emit(final=False)
+
+    def close(self):
+        with span(self.timings, "encode"):
+            self.pending += self.compressor.flush()
+        with span(self.timings, "write"):
+            self._emit(final=True)
+
+    def _emit(self, final):
+        start = 0
+        while len(self.pending) - start >= self.block_size:
+            _chunk(self.fp, b"IDAT", bytes(self.pending[start:start + self.block_size]))
+            start += self.block_size
+        if final and start < len(self.pending):
+            _chunk(self.fp, b"IDAT", bytes(self.pending[start:]))
+            start = len(self.pending)
+        del self.pending[:start]
+
+
+def strip_bounds(file_path, box, strip_rows=STRIP_ROWS):
+    """返回可以独立解码的条带行范围列表；格式不支持按条带解码时返回 None"""
+    x1, y1, x2, y2 = box
+    with Image.open(file_path) as image:
+        method, (left, top) = _restrict_tiles(image, box)
+        tiles = image.tile
+    if method == "rows" and tiles[0][0] == "raw":
+        # 未压缩数据可以按行号直接跳读，条带大小任意
+        return [(y, min(y + strip_rows, y2)) for y in range(y1, y2, strip_rows)]
+    if method == "tiles":
+        # 分块或分条带的 TIFF：条带边界对齐到块的上下边，避免同一块被解码两次
+        edges = sorted({y1, y2} | {min(max(t[1][1] + top, y1), y2) for t in tiles})
+        bounds = []
+        start = y1
+        for edge in edges[1:]:
+            if edge - start >= strip_rows or edge == y2:
+                bounds.append((start, edge))
+                start = edge
+        return bounds
+    return None
+
+
+def iter_region_strips(file_path, box, stats, strip_rows=STRIP_ROWS, timings=None):
+    """按条带依次产出裁剪区域的像素，同时在 stats 中累计解码统计；只有未压缩或分块、分条带存储的源图逐条带解码，PNG、JPEG 等只能顺序解码的格式先解码出整个裁剪区域（Pillow 不支持逐行取出这些格式的解码结果）"""
+    x1, y1, x2, y2 = box
+    bounds = strip_bounds(file_path, box, strip_rows)
+    if bounds is None:
+        # PNG、JPEG 等只能顺序解码的格式：一次解码裁剪区域（PNG 解到裁剪框底边为止），再分条带送入编码器；
+        # 此时内存中有整个裁剪区域
+        cropped_image, region_stats = decode_region(file_path, box, timings)
+        stats.update(region_stats)
+        for y in range(0, y2 - y1, strip_rows):
+            with span(timings, "crop"):
+                strip = cropped_image.crop((0, y, cropped_image.width, min(y + strip_rows, y2 - y1)))
+            yield strip
+        return
+    for top, bottom in bounds:
+        strip, strip_stats = decode_region(file_path, (x1, top, x2, bottom), timings)
+        stats["method"] = strip_stats["method"]
+        stats["full_bytes"] = strip_stats["full_bytes"]
+        stats["decoded_bytes"] = stats.get("decoded_bytes", 0) + strip_stats["decoded_bytes"]
+        yield strip
+
+
+def write_bordered_png(save_path, strips, size, mode, border, level=zlib.Z_DEFAULT_COMPRESSION, timings=None):
+    """把逐条带产出的裁剪图片加上白边后写成 PNG，本函数同时只持有一个条带；源图解码占用的内存取决于 strips（见 iter_region_strips）"""
+    color_type, bytes_per_pixel = STREAM_MODES[mode]
+    crop_width, crop_height = size
+    width = crop_width + 2 * border
+    height = crop_height + 2 * border
+    white = np.array(ImageColor.getcolor("white", mode), dtype=np.uint8)
+
+    with open(save_path, "wb") as fp:
+        fp.write(PNG_SIGNATURE)
+        _chunk(fp, b"IHDR", struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0))
+        idat = _IdatStream(fp, max(PNG_BLOCK_SIZE, width * 4), level, timings)
+        prior = np.zeros((1, width * bytes_per_pixel), dtype=np.uint8)
+
+        def emit(rows):
+            nonlocal prior
+            for start in range(0, len(rows), FILTER_ROWS):
+                batch = rows[start:start + FILTER_ROWS]
+                with span(timings, "encode"):
+                    previous = np.concatenate((prior, batch[:-1]))
+                    filtered = filter_rows(batch, previous, bytes_per_pixel).tobytes()
+                idat.write(filtered)
+                prior = batch[-1:]
+
+        def blank(count):
+            with span(timings, "border"):
+                return np.broadcast_to(white, (count, width, bytes_per_pixel)).reshape(count, -1).copy()
+
+        for y in range(0, border, STRIP_ROWS):
+            emit(blank(min(STRIP_ROWS, border - y)))
+        for strip in strips:
+            if strip.mode != mode or strip.width != crop_width:
+                raise ValueError("条带的模式或宽度与图片不一致")
+            rows = blank(strip.height)
+            with span(timings, "border"):
+                pixels = np.asarray(strip).reshape(strip.height, -1)
+                rows[:, border * bytes_per_pixel:(border + crop_width) * bytes_per_pixel] = pixels
+            emit(rows)
+        for y in range(0, border, STRIP_ROWS):
+            emit(blank(min(STRIP_ROWS, border - y)))
+
+        idat.close()
+        _chunk(fp, b"IEND", b"")
+
+
+def save_region_with_border(file_path, box, border, save_path, options=None, strip_rows=STRIP_ROWS, timings=None):
+    """逐条带解码裁剪区域并加白边写出 PNG，返回解码统计；无法保证与 Pillow 输出一致时返回 None"""
+    with Image.open(file_path) as image:
+        mode = image.mode
+    if not can_stream(mode, save_path, options):
+        return None
+    level = (options or {}).get("compress_level", zlib.Z_DEFAULT_COMPRESSION)
+    x1, y1, x2, y2 = box
+    stats = {}
+    strips = iter_region_strips(file_path, box, stats, strip_rows, timings)
+    write_bordered_png(save_path, strips, (x2 - x1, y2 - y1), mode, border, level, timings)
+    stats["streamed"] = True
+    return stats
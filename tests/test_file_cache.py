@@ -0,0 +1,49 @@
+"""按批取出的路径队列保持提交顺序，SQLite 缓存在文件大小或修改时间变化后失效"""
+import os
+
+from duplicates import HashCache
+from file_cache import BatchQueue, file_key
+from image_index import MetadataCache
+
+
+def test_batch_queue_keeps_submission_order():
+    jobs = BatchQueue(4)
+    jobs.put([f"a{i}" for i in range(10)])
+    jobs.put(["b0", "b1"])
+    assert jobs.next_batch() == ["a0", "a1", "a2", "a3"]
+    # 超出的部分留在队首，之后提交的路径排在它们后面
+    jobs.put(["c0"])
+    assert jobs.next_batch() == ["a4", "a5", "a6", "a7"]
+    assert jobs.next_batch() == ["a8", "a9", "b0", "b1"]
+    assert jobs.next_batch() == ["c0"]
+
+
+def test_batch_queue_close():
+    jobs = BatchQueue(4)
+    jobs.put(["a", "b"])
+    jobs.close()
+    jobs.put(["c"])
+    assert jobs.next_batch() == ["a", "b"]
+    assert jobs.next_batch() is None
+    assert jobs.next_batch() is None
+
+
+def test_caches_invalidate_on_change(tmp_path):
+    path = tmp_path / "a.png"
+    path.write_bytes(b"one")
+    key = file_key(str(path))
+    hashes = HashCache(str(tmp_path / "cache.db"))
+    headers = MetadataCache(str(tmp_path / "cache.db"))
+    try:
+        hashes.store([(key, 0xdeadbeef)])
+        headers.store([(key, ("PNG", 4000, 3000, "RGB", 6))])
+        assert hashes.lookup([key]) == {key[0]: 0xdeadbeef}
+        assert headers.lookup([key, key]) == {key[0]: ("PNG", 4000, 3000, "RGB", 6)}
+        path.write_bytes(b"longer")
+        os.utime(str(path), ns=(key[2] + 10 ** 9, key[2] + 10 ** 9))
+        changed = file_key(str(path))
+        assert hashes.lookup([changed]) == {}
+        assert headers.lookup([changed]) == {}
+    finally:
+        hashes.close()
+        headers.close()
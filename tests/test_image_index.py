@@ -0,0 +1,82 @@
+"""向量化的默认裁剪框与逐张计算的结果一致，按列存放的元数据表增量补算裁剪框"""
+import random
+import sys
+from array import array
+
+import pytest
+
+from image_engine import compute_centered_crop
+from image_index import RATIOS, MetadataTable, best_ratio, centered_crops
+
+
+def sizes(seed, count=20000):
+    """随机尺寸，另加恰好为 4:3 或 3:4、只差一个像素和极端长宽比的尺寸"""
+    rng = random.Random(seed)
+    result = [(1, 1), (1, 5000), (5000, 1), (4, 3), (3, 4), (400, 300), (300, 400), (401, 300), (400, 301),
+              (299, 400), (300, 399), (65535, 65535), (100000, 3)]
+    for _ in range(count):
+        result.append((rng.randint(1, 12000), rng.randint(1, 12000)))
+    for _ in range(count // 4):
+        height = rng.randint(1, 9000)
+        width = height * 4 // 3 + rng.randint(-2, 2)
+        result.append((max(1, width), height))
+        result.append((height, max(1, width)))
+    return result
+
+
+@pytest.mark.parametrize("ratio", RATIOS)
+@pytest.mark.parametrize("seed", range(3))
+def test_centered_crops_match_compute_centered_crop(ratio, seed):
+    pytest.importorskip("numpy")
+    pairs = sizes(seed)
+    widths = array("I", [w for w, _ in pairs])
+    heights = array("I", [h for _, h in pairs])
+    assert centered_crops(widths, heights, ratio) == [compute_centered_crop(w, h, ratio) for w, h in pairs]
+
+
+def test_centered_crops_without_numpy(monkeypatch):
+    # 导入 numpy 失败时逐张计算
+    monkeypatch.setitem(sys.modules, "numpy", None)
+    pairs = sizes(0, count=200)
+    widths = array("I", [w for w, _ in pairs])
+    heights = array("I", [h for _, h in pairs])
+    assert centered_crops(widths, heights, "4:3") == [compute_centered_crop(w, h, "4:3") for w, h in pairs]
+
+
+def test_empty_input():
+    assert centered_crops(array("I"), array("I"), "4:3") == []
+
+
+def test_table_crops_are_extended_incrementally():
+    table = MetadataTable()
+    pairs = sizes(7, count=3000)
+    rows = [(f"img{i}.jpg", ("JPEG", w, h, "RGB", 1)) for i, (w, h) in enumerate(pairs)]
+    rng = random.Random(7)
+    start = 0
+    while start < len(rows):
+        end = start + rng.randint(1, 500)
+        table.add_many(rows[start:end])
+        # 每批加入后查询一部分，迫使裁剪框分多次补算
+        for path, (_, w, h, _, _) in rng.sample(rows[:end], 20):
+            for ratio in RATIOS:
+                assert table.crop_box(path, ratio) == compute_centered_crop(w, h, ratio)
+            assert table.best_ratio(path) == best_ratio(w, h)
+        start = end
+    for path, (_, w, h, _, _) in rows:
+        assert table.crop_box(path, "3:4") == compute_centered_crop(w, h, "3:4")
+    assert table.crop_box("missing.jpg", "4:3") is None
+
+
+def test_duplicates_and_orientation():
+    table = MetadataTable()
+    table.add("a.jpg", ("JPEG", 4000, 3000, "RGB", 6))
+    table.add("a.jpg", ("JPEG", 10, 10, "L", 1))
+    table.add("b.png", ("PNG", 300, 400, "RGBA", 1))
+    assert len(table) == 2
+    assert table.get("a.jpg") == ("JPEG", 4000, 3000, "RGB", 6)
+    # 方向 6：存储为横图，摆正后是竖图；裁剪框仍按存储的像素计算
+    assert table.size("a.jpg") == (4000, 3000)
+    assert table.upright_size("a.jpg") == (3000, 4000)
+    assert table.upright_size("b.png") == (300, 400)
+    assert table.crop_box("a.jpg", "4:3") == compute_centered_crop(4000, 3000, "4:3")
+    assert table.upright_size("missing.jpg") is None
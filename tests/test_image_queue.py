@@ -0,0 +1,79 @@
+"""ImageQueue 与普通列表在随机操作序列下的行为一致"""
+import random
+
+import pytest
+
+from image_queue import ImageQueue
+
+
+def check(queue, model):
+    """逐行核对路径、编号与行号的对应关系以及长度"""
+    assert len(queue) == len(model)
+    assert bool(queue) == bool(model)
+    assert list(queue) == [path for _, path in model]
+    assert [item_id for item_id, _ in queue.items()] == [item_id for item_id, _ in model]
+    for row, (item_id, path) in enumerate(model):
+        assert queue[row] == path
+        assert queue.id_at(row) == item_id
+        assert queue.row_of(item_id) == row
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_operations_match_list(seed):
+    rng = random.Random(seed)
+    events = []
+    queue = ImageQueue()
+    queue.subscribe(lambda kind, row, count: events.append((kind, row, count)))
+    model = []  # [(编号, 路径)]
+    counter = 0
+    for step in range(1500):
+        op = rng.random()
+        if len(model) > 300:
+            # 保持队列较小，每一步都能完整核对；压缩空槽位的分支仍会被反复触发
+            op = max(op, 0.55)
+        events.clear()
+        if op < 0.3 or not model:
+            paths = [f"img{counter + i}.png" for i in range(rng.randint(1, 40))]
+            counter += len(paths)
+            row = len(model)
+            ids = queue.extend(paths)
+            model.extend(zip(ids, paths))
+            assert events == [("insert", row, len(paths))]
+        elif op < 0.4:
+            path = f"img{counter}.png"
+            counter += 1
+            model.append((queue.append(path), path))
+        elif op < 0.55:
+            row = rng.randrange(len(model))
+            assert queue.pop(row) == model.pop(row)[1]
+            assert events == [("remove", row, 1)]
+        elif op < 0.6:
+            assert queue.popleft() == model.pop(0)[1]
+        elif op < 0.75:
+            row = rng.randrange(len(model))
+            item_id, path = model.pop(row)
+            assert queue.remove(item_id) == path
+            assert events == [("remove", row, 1)]
+        elif op < 0.9:
+            chosen = rng.sample(model, rng.randint(0, min(len(model), 50)))
+            first_row = min((model.index(item) for item in chosen), default=None)
+            assert queue.remove_many(item_id for item_id, _ in chosen) == [path for _, path in chosen]
+            model = [item for item in model if item not in chosen]
+            assert events == ([("remove", first_row, len(chosen))] if chosen else [])
+        else:
+            weights = {path: rng.randrange(5) for _, path in model}
+            queue.sort(lambda path: weights[path])
+            # sorted 是稳定排序，与 ImageQueue.sort 的约定一致
+            model.sort(key=lambda item: weights[item[1]])
+            assert events == [("reorder", 0, len(model))]
+        check(queue, model)
+
+
+def test_initial_paths_and_empty_queue():
+    queue = ImageQueue(["a.png", "b.png"])
+    assert list(queue) == ["a.png", "b.png"]
+    assert queue.popleft() == "a.png"
+    assert queue.pop() == "b.png"
+    assert not queue
+    with pytest.raises(IndexError):
+        queue.id_at(0)
@@ -0,0 +1,135 @@
+"""会话日志的回放与压缩"""
+import os
+
+import pytest
+
+from session_journal import SessionJournal, content_key
+
+
+@pytest.fixture
+def images(tmp_path):
+    paths = []
+    for name in "abcdef":
+        path = tmp_path / f"{name}.png"
+        path.write_bytes(name.encode())
+        paths.append(str(path))
+    return paths
+
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = SessionJournal(str(tmp_path / "session.jsonl"))
+    yield journal
+    journal.close()
+
+
+def done(journal, path):
+    journal.append("done", path=path, key=content_key(path), box=[0, 0, 1, 1], output=path + ".out")
+
+
+def names(paths):
+    return [os.path.basename(path)[0] for path in paths]
+
+
+def test_missing_journal_replays_empty(journal):
+    assert journal.replay() == ([], {})
+    assert not journal.active
+
+
+def test_enqueue_select_skip_done(journal, images):
+    a, b, c, d, e, _ = images
+    journal.append("enqueue", paths=[a, b, c])
+    journal.append("enqueue", paths=[d, e, a])
+    # 选中 d：d 移到队首，原来的当前图片 a 移到队尾
+    journal.append("select", path=d, requeue=a)
+    journal.append("skip", path=b)
+    done(journal, c)
+    pending, exported = journal.replay()
+    assert names(pending) == ["d", "e", "a"]
+    assert list(exported) == [tuple(content_key(c))]
+
+
+def test_order_record(journal, images):
+    a, b, c, d, _, _ = images
+    journal.append("enqueue", paths=[a, b, c, d])
+    journal.append("order", paths=[c, a])
+    assert names(journal.replay()[0]) == ["c", "a", "b", "d"]
+
+
+def test_truncated_last_line_is_ignored(journal, images):
+    a, b, _, _, _, _ = images
+    journal.append("enqueue", paths=[a, b])
+    journal.close()
+    with open(journal.path, "a", encoding="utf-8") as f:
+        f.write('{"op": "skip", "pa')
+    assert names(journal.replay()[0]) == ["a", "b"]
+
+
+def test_exported_content_is_not_redone(journal, images):
+    a, b, _, _, _, _ = images
+    journal.append("enqueue", paths=[a, b])
+    done(journal, a)
+    # 导出后又加入队列：内容未变时跳过，文件被修改后重新处理
+    journal.append("enqueue", paths=[a, b])
+    assert names(journal.replay()[0]) == ["b"]
+    with open(b, "ab") as f:
+        f.write(b"x")
+    done(journal, b)
+    os.utime(a, ns=(0, 1))
+    journal.append("enqueue", paths=[b])
+    assert names(journal.replay()[0]) == ["a"]
+
+
+def test_deleted_files_are_dropped(journal, images):
+    a, b, _, _, _, _ = images
+    journal.append("enqueue", paths=[a, b])
+    os.remove(a)
+    assert names(journal.replay()[0]) == ["b"]
+
+
+def test_compact_keeps_state_and_appends(journal, images):
+    a, b, c, d, _, _ = images
+    journal.append("enqueue", paths=[a, b, c])
+    done(journal, a)
+    journal.append("skip", path=b)
+    pending, exported = journal.replay()
+    journal.compact(pending, exported)
+    with open(journal.path, encoding="utf-8") as f:
+        assert len(f.readlines()) == 2
+    assert journal.replay() == (pending, exported)
+    journal.append("enqueue", paths=[d])
+    assert names(journal.replay()[0]) == ["c", "d"]
+
+
+def test_compact_keeps_records_appended_after_mark(journal, images):
+    a, b, c, d, e, _ = images
+    journal.append("enqueue", paths=[a, b])
+    done(journal, a)
+    pending, exported = journal.replay()
+    mark = journal.size()
+    # 询问是否恢复期间又加入了图片
+    journal.append("enqueue", paths=[c, d])
+    journal.append("skip", path=c)
+    journal.compact(pending, exported, keep_from=mark)
+    pending, exported = journal.replay()
+    assert names(pending) == ["d", "b"]
+    assert list(exported) == [tuple(content_key(a))]
+    journal.append("enqueue", paths=[e])
+    assert names(journal.replay()[0]) == ["d", "b", "e"]
+
+
+def test_declined_resume_keeps_only_new_records(journal, images):
+    a, b, c, _, _, _ = images
+    journal.append("enqueue", paths=[a, b])
+    mark = journal.size()
+    journal.append("enqueue", paths=[c])
+    journal.compact([], {}, keep_from=mark)
+    assert names(journal.replay()[0]) == ["c"]
+
+
+def test_reset_removes_journal(journal, images):
+    journal.append("enqueue", paths=images[:1])
+    assert journal.active
+    journal.reset()
+    assert not journal.active
+    assert journal.size() == 0
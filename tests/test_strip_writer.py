@@ -0,0 +1,74 @@
+"""逐条带写出的 PNG 必须与整张加边框后由 Pillow 保存的 PNG 逐字节一致"""
+import random
+
+import pytest
+from PIL import Image
+
+pytest.importorskip("numpy")
+
+from image_engine import DEFAULT_BORDER, EXPORT_PROFILES, add_border, decode_region, export_region
+from strip_writer import can_stream, save_region_with_border
+
+SIZE = (531, 407)
+BOX = (37, 29, 480, 361)
+
+
+def make_source(path, mode, fmt=None):
+    """生成带噪声和渐变的测试图片，避免压缩结果过于简单"""
+    rng = random.Random(f"{mode}{path.suffix}")
+    width, height = SIZE
+    bands = len(Image.new(mode, (1, 1)).getbands())
+    data = bytearray()
+    for y in range(height):
+        for x in range(width):
+            for band in range(bands):
+                data.append((x * (band + 1) + y * 3 + rng.randrange(24)) & 0xFF)
+    Image.frombytes(mode, SIZE, bytes(data)).save(path, fmt)
+    return path
+
+
+def reference_png(source, path, options):
+    """以前的做法：解码裁剪区域、整张加白边，再由 Pillow 保存"""
+    cropped, _ = decode_region(str(source), BOX)
+    add_border(cropped, DEFAULT_BORDER).save(path, "PNG", **options)
+
+
+SOURCES = [
+    ("L", ".png"),
+    ("LA", ".png"),
+    ("RGB", ".png"),
+    ("RGBA", ".png"),
+    ("RGB", ".jpg"),
+    ("RGB", ".bmp"),
+    ("RGB", ".tif"),
+    ("RGBA", ".tif"),
+]
+
+
+@pytest.mark.parametrize("mode, suffix", SOURCES)
+@pytest.mark.parametrize("profile", ["png", "png-fast"])
+def test_export_matches_pillow(tmp_path, mode, suffix, profile):
+    source = make_source(tmp_path / f"source{suffix}", mode)
+    options = EXPORT_PROFILES[profile]["options"]
+    with Image.open(source) as image:
+        if not can_stream(image.mode, "out.png", options):
+            pytest.skip("Pillow 与 Python 链接的 zlib 版本不同，无法保证逐字节一致")
+    streamed = tmp_path / "streamed.png"
+    stats = export_region(str(source), BOX, DEFAULT_BORDER, str(streamed), profile)
+    assert stats.get("streamed")
+    expected = tmp_path / "expected.png"
+    reference_png(source, expected, options)
+    assert streamed.read_bytes() == expected.read_bytes()
+
+
+@pytest.mark.parametrize("mode, suffix", [("RGB", ".bmp"), ("L", ".tif"), ("RGBA", ".png"), ("RGB", ".jpg")])
+def test_small_strips_match_pillow(tmp_path, mode, suffix):
+    source = make_source(tmp_path / f"source{suffix}", mode)
+    streamed = tmp_path / "streamed.png"
+    # 条带行数不整除裁剪高度，最后一个条带较短
+    stats = save_region_with_border(str(source), BOX, DEFAULT_BORDER, str(streamed), {}, strip_rows=37)
+    if stats is None:
+        pytest.skip("Pillow 与 Python 链接的 zlib 版本不同，无法保证逐字节一致")
+    expected = tmp_path / "expected.png"
+    reference_png(source, expected, {})
+    assert streamed.read_bytes() == expected.read_bytes()
@@ -0,0 +1,169 @@
+"""队列缩略图：在线程池中用 draft 和 thumbnail 生成小图，按 (路径, 大小, 修改时间) 缓存到磁盘，超出容量时淘汰最久未用的条目"""
+import io
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from session_journal import content_key
+
+# 缩略图的最大尺寸（像素）
+THUMB_SIZE = (96, 72)
+
+# 磁盘缓存的容量上限（字节），超出后淘汰到上限的 90%
+THUMB_CACHE_BYTES = 128 * 1024 * 1024
+
+# 内存中保留的缩略图张数
+THUMB_MEMORY_ITEMS = 512
+
+# 缓存命中时更新使用时间，累计多少条后才提交一次
+TOUCH_BATCH = 64
+
+
+def make_thumbnail(path, size=THUMB_SIZE):
+    """生成缩略图：JPEG 在解码阶段按整数倍缩小，再用 thumbnail 缩放到 size 以内"""
+    with Image.open(path) as image:
+        image.draft("RGB", size)
+        image.thumbnail(size, Image.BILINEAR)
+        return image.convert("RGB")
+
+
+class ThumbnailStore:
+    """SQLite 中的缩略图缓存，按最近使用时间淘汰；连接由锁保护，可在多个线程中使用"""
+
+    def __init__(self, db_path, max_bytes=THUMB_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._touched = []
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS thumbs "
+                         "(path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, used REAL, bytes INTEGER, data BLOB)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS thumbs_used ON thumbs (used)")
+        self.total_bytes = self._db.execute("SELECT COALESCE(SUM(bytes), 0) FROM thumbs").fetchone()[0]
+
+    def get(self, key):
+        """按缓存键取出缩略图数据；文件大小或修改时间不一致时视为未命中"""
+        path, size, mtime = key
+        with self._lock:
+            row = self._db.execute("SELECT size, mtime, data FROM thumbs WHERE path = ?", (path,)).fetchone()
+            if row is None or (row[0], row[1]) != (size, mtime):
+                return None
+            self._touched.append((time.time(), path))
+            if len(self._touched) >= TOUCH_BATCH:
+                self._flush_touched()
+                self._db.commit()
+            return row[2]
+
+    def put(self, key, data):
+        """写入缩略图数据，超出容量时淘汰最久未使用的条目"""
+        path, size, mtime = key
+        with self._lock:
+            old = self._db.execute("SELECT bytes FROM thumbs WHERE path = ?", (path,)).fetchone()
+            self._db.execute("INSERT OR REPLACE INTO thumbs VALUES (?, ?, ?, ?, ?, ?)",
+                             (path, size, mtime, time.time(), len(data), data))
+            self.total_bytes += len(data) - (old[0] if old else 0)
+            self._flush_touched()
+            if self.total_bytes > self.max_bytes:
+                self._evict(self.max_bytes * 9 // 10)
+            self._db.commit()
+
+    def _flush_touched(self):
+        if self._touched:
+            self._db.executemany("UPDATE thumbs SET used = ? WHERE path = ?", self._touched)
+            self._touched = []
+
+    def _evict(self, target_bytes):
+        """按使用时间从旧到新删除条目，直到总字节数不超过 target_bytes"""
+        evicted = []
+        for path, nbytes in self._db.execute("SELECT path, bytes FROM thumbs ORDER BY used"):
+            if self.total_bytes <= target_bytes:
+                break
+            evicted.append((path,))
+            self.total_bytes -= nbytes
+        self._db.executemany("DELETE FROM thumbs WHERE path = ?", evicted)
+
+    def close(self):
+        with self._lock:
+            self._flush_touched()
+            self._db.commit()
+            self._db.close()
+
+
+class ThumbnailLoader:
+    """为可见行按需加载缩略图：先查内存和磁盘缓存，未命中时在线程池中解码生成，界面线程只轮询取回结果"""
+
+    def __init__(self, cache_path, size=THUMB_SIZE, max_bytes=THUMB_CACHE_BYTES, workers=2,
+                 memory_items=THUMB_MEMORY_ITEMS):
+        self.size = size
+        self.memory_items = memory_items
+        self._store = ThumbnailStore(cache_path, max_bytes)
+        self._memory = OrderedDict()  # 路径 → 缩略图（无法解码时为 None）
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._results = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnail")
+
+    def get(self, path):
+        """返回内存中的缩略图并标记为最近使用；尚未加载或无法解码时返回 None，不会解码"""
+        with self._lock:
+            image = self._memory.get(path)
+            if image is not None:
+                self._memory.move_to_end(path)
+            return image
+
+    def request(self, paths):
+        """按顺序为 paths 中尚未加载的图片安排后台加载，并取消不再需要的、尚未开始的任务"""
+        wanted = set(paths)
+        with self._lock:
+            for path, future in list(self._pending.items()):
+                if path not in wanted and future.cancel():
+                    del self._pending[path]
+            for path in paths:
+                if path not in self._memory and path not in self._pending:
+                    self._pending[path] = self._executor.submit(self._load, path)
+
+    def _load(self, path):
+        """后台线程：磁盘缓存命中时只解码小图，否则从原图生成并写入缓存"""
+        image = None
+        try:
+            key = content_key(path)
+            data = self._store.get(key)
+            if data is not None:
+                image = Image.open(io.BytesIO(data))
+                image.load()
+            else:
+                image = make_thumbnail(path, self.size)
+                buffer = io.BytesIO()
+                image.save(buffer, "JPEG", quality=85)
+                self._store.put(key, buffer.getvalue())
+        except Exception:
+            image = None
+        finally:
+            with self._lock:
+                self._pending.pop(path, None)
+                self._memory[path] = image
+                while len(self._memory) > self.memory_items:
+                    self._memory.popitem(last=False)
+        self._results.put(path)
+
+    def poll(self):
+        """取出自上次轮询以来加载完成的图片路径"""
+        paths = []
+        while True:
+            try:
+                paths.append(self._results.get_nowait())
+            except queue.Empty:
+                return paths
+
+    def close(self):
+        """取消尚未开始的任务，等待进行中的任务结束后关闭磁盘缓存"""
+        with self._lock:
+            for future in self._pending.values():
+                future.cancel()
+            self._pending.clear()
+        self._executor.shutdown(wait=True)
+        self._store.close()
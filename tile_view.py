@@ -0,0 +1,337 @@
+"""缩放与平移的分块渲染：只生成视口内的块并放入 LRU 缓存，预览分辨率不够时在后台从原图（按区域或按多分辨率层解码）生成清晰的块"""
+import math
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import tkinter as tk
+from PIL import Image, ImageTk
+
+from image_engine import _restrict_tiles, decode_region
+
+# 块的边长（显示像素）
+TILE_SIZE = 256
+
+# 块缓存的容量上限（字节）
+TILE_CACHE_BYTES = 64 * 1024 * 1024
+
+# 内存余量不足以解码所需的层时，最多改用粗几层
+MAX_LEVEL_FALLBACK = 4
+
+
+def visible_tiles(viewport, display_size, tile_size=TILE_SIZE):
+    """返回与视口 (x1, y1, x2, y2)（画布坐标）相交的块 [(列, 行)]"""
+    x1, y1, x2, y2 = viewport
+    width, height = display_size
+    cols = range(max(0, int(x1 // tile_size)), min(math.ceil(width / tile_size), math.ceil(x2 / tile_size)))
+    rows = range(max(0, int(y1 // tile_size)), min(math.ceil(height / tile_size), math.ceil(y2 / tile_size)))
+    return [(col, row) for row in rows for col in cols]
+
+
+def tile_rect(col, row, display_size, tile_size=TILE_SIZE):
+    """块在显示坐标中的矩形，最右和最下的块可能较小"""
+    width, height = display_size
+    x1, y1 = col * tile_size, row * tile_size
+    return x1, y1, min(width, x1 + tile_size), min(height, y1 + tile_size)
+
+
+def pyramid_level(image_size, display_size):
+    """原图每层按 2 倍缩小，返回分辨率不低于显示尺寸的最粗一层"""
+    ratio = image_size[0] / display_size[0]
+    return int(math.floor(math.log2(ratio))) if ratio > 1 else 0
+
+
+def render_tile(source, rect, display_size):
+    """从原图的任意等比缩小版 source 中取出显示矩形 rect 对应的区域并缩放到块的大小；放大时保留像素边缘"""
+    x1, y1, x2, y2 = rect
+    scale_x = source.width / display_size[0]
+    scale_y = source.height / display_size[1]
+    resample = Image.NEAREST if scale_x < 1 else Image.BILINEAR
+    return source.resize((x2 - x1, y2 - y1), resample,
+                         box=(x1 * scale_x, y1 * scale_y, x2 * scale_x, y2 * scale_y))
+
+
+def _displayable(image):
+    """转换为 PhotoImage 能直接显示的模式"""
+    if image.mode in ("1", "L", "LA", "RGB", "RGBA"):
+        return image
+    converted = image.convert("RGBA" if image.mode in ("P", "PA") else "RGB")
+    image.close()
+    return converted
+
+
+class LevelSource:
+    """原图的清晰块来源。未压缩或分块、分条带存储的图片每个块只解码它覆盖的原图区域；
+    JPEG、PNG 等只能整张解码的格式按多分辨率层解码（JPEG 用 draft 在解码阶段直接缩小，其它格式解码后用 reduce 整数倍缩小），
+    只保留最近使用的一层。解码前向内存预算预约，余量不足时改用更粗的一层"""
+
+    def __init__(self, path, governor=None):
+        self.path = path
+        self.governor = governor
+        with Image.open(path) as image:
+            self.size = image.size
+            # 用最后一行探测能否按区域解码；PNG 只能从第一行解到指定行，按区域解码并不省
+            method, _ = _restrict_tiles(image, (0, image.height - 1, 1, image.height))
+        self.regional = method != "full"
+        self._level = None
+        self._image = None
+        self._reserved = 0
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def _reserve(self, nbytes):
+        return self.governor is None or self.governor.reserve(nbytes, block=False)
+
+    def _release(self, nbytes):
+        if self.governor is not None and nbytes:
+            self.governor.release(nbytes)
+
+    def tile(self, level, rect, display_size):
+        """生成显示矩形 rect 对应的清晰块；内存余量不足时返回 None（继续显示预览放大的占位块）"""
+        if self.regional:
+            return self._region_tile(rect, display_size)
+        level_image = self._level_image(level)
+        return None if level_image is None else render_tile(level_image, rect, display_size)
+
+    def _region_tile(self, rect, display_size):
+        """只解码块覆盖的原图区域，再缩放到块的大小"""
+        x1, y1, x2, y2 = rect
+        scale_x = self.size[0] / display_size[0]
+        scale_y = self.size[1] / display_size[1]
+        box = (int(x1 * scale_x), int(y1 * scale_y),
+               min(self.size[0], math.ceil(x2 * scale_x)), min(self.size[1], math.ceil(y2 * scale_y)))
+        nbytes = (box[2] - box[0]) * (box[3] - box[1]) * 4
+        if not self._reserve(nbytes):
+            return None
+        try:
+            region = _displayable(decode_region(self.path, box)[0])
+            try:
+                resample = Image.NEAREST if scale_x < 1 else Image.BILINEAR
+                return region.resize((x2 - x1, y2 - y1), resample, reducing_gap=2.0,
+                                     box=(x1 * scale_x - box[0], y1 * scale_y - box[1],
+                                          x2 * scale_x - box[0], y2 * scale_y - box[1]))
+            finally:
+                region.close()
+        finally:
+            self._release(nbytes)
+
+    def _level_image(self, level):
+        """返回第 level 层（原图按 2**level 缩小）；余量不足时依次尝试更粗的层，都不够时返回 None"""
+        with self._lock:
+            cached_level, cached = self._level, self._image
+        for candidate in range(level, level + MAX_LEVEL_FALLBACK):
+            if candidate == cached_level:
+                return cached
+            if cached_level is not None:
+                # 先释放上一层，避免两层同时占用内存
+                self.trim()
+                cached_level = None
+            image = self._decode_level(candidate)
+            if image is not None:
+                return image
+        return None
+
+    def _decode_level(self, level):
+        """解码一层：解码期间预约解码所需的内存，之后只保留这一层的预约"""
+        with Image.open(self.path) as image:
+            full_width = image.width
+            image.draft(None, (max(1, image.width >> level), max(1, image.height >> level)))
+            # draft 只能按 1/2、1/4、1/8 缩小，剩余的倍数用 reduce 补足
+            factor = (1 << level) // max(1, round(full_width / image.width))
+            decode_bytes = image.width * image.height * 4
+            level_bytes = (image.width // factor) * (image.height // factor) * 4
+            if not self._reserve(decode_bytes):
+                return None
+            try:
+                image = _displayable(image)
+                image.load()
+                level_image = image.reduce(factor) if factor > 1 else image.copy()
+            except Exception:
+                self._release(decode_bytes)
+                raise
+        with self._lock:
+            self._release(decode_bytes - level_bytes)
+            if self._closed:
+                # 已切换到其它图片：这一层只用于本次生成的块
+                self._release(level_bytes)
+                return level_image
+            self._level, self._image, self._reserved = level, level_image, level_bytes
+        return level_image
+
+    def trim(self):
+        """丢弃保留的层并归还预约（线程安全，可作为内存预算的释放回调）"""
+        with self._lock:
+            self._level = self._image = None
+            self._release(self._reserved)
+            self._reserved = 0
+
+    def close(self):
+        """不再使用：丢弃保留的层，之后解码的层不再保留"""
+        with self._lock:
+            self._closed = True
+        self.trim()
+
+
+class TiledView:
+    """在 Canvas 上按块显示当前图片；块图元只为视口内的块创建，滚出视口即删除"""
+
+    def __init__(self, canvas, tile_size=TILE_SIZE, cache_bytes=TILE_CACHE_BYTES, governor=None):
+        self.canvas = canvas
+        self.governor = governor
+        self.tile_size = tile_size
+        self.cache_bytes = cache_bytes
+        self.preview = None
+        self.image_size = None
+        self.display_size = None
+        self._generation = 0
+        self._cache = OrderedDict()  # (显示尺寸, 列, 行) → (PhotoImage, 字节数, 是否为清晰块)
+        self._cache_used = 0
+        self._items = {}  # (列, 行) → 画布图元编号
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._results = queue.Queue()
+        self._source = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tiles")
+
+    def set_image(self, path, preview, image_size):
+        """切换到新图片：丢弃旧图片的块和尚未开始的后台任务"""
+        self._generation += 1
+        self._cancel_pending(set())
+        self._cache.clear()
+        self._cache_used = 0
+        self._items = {}
+        self.preview = preview
+        self.image_size = image_size
+        if self._source is not None:
+            self._source.close()
+        self._source = None
+        if path:
+            try:
+                self._source = LevelSource(path, self.governor)
+            except OSError:
+                # 无法重新打开原图时只显示预览
+                pass
+
+    def set_display_size(self, display_size):
+        """缩放或画布尺寸变化后设置新的显示尺寸；其它尺寸的块仍保留在缓存中，缩放回来时可以复用"""
+        self.display_size = display_size
+        self.forget()
+
+    def forget(self):
+        """画布被清空后丢弃已失效的块图元编号"""
+        self._items = {}
+
+    def viewport(self):
+        """画布当前可见区域的画布坐标"""
+        return (self.canvas.canvasx(0), self.canvas.canvasy(0),
+                self.canvas.canvasx(self.canvas.winfo_width()), self.canvas.canvasy(self.canvas.winfo_height()))
+
+    def render(self):
+        """放置视口内的块，删除视口外的块图元；预览分辨率不够的块先用放大的预览占位并安排后台生成"""
+        if self.preview is None or not self.display_size:
+            return
+        visible = visible_tiles(self.viewport(), self.display_size, self.tile_size)
+        sharp_from_preview = self.preview.width >= self.display_size[0]
+        wanted = set()
+        for col, row in visible:
+            key = (self.display_size, col, row)
+            entry = self._cache.get(key)
+            if entry is None:
+                rect = tile_rect(col, row, self.display_size, self.tile_size)
+                entry = self._store(key, render_tile(self.preview, rect, self.display_size), sharp_from_preview)
+            else:
+                self._cache.move_to_end(key)
+            if not entry[2] and self._source is not None:
+                wanted.add(key)
+            self._place(col, row, entry[0])
+        for col, row in [tile for tile in self._items if tile not in visible]:
+            self.canvas.delete(self._items.pop((col, row)))
+        self._cancel_pending(wanted)
+        for key in wanted:
+            self._request(key)
+
+    def _place(self, col, row, photo):
+        """创建或更新块图元，块始终位于裁剪框等其它图元之下"""
+        item = self._items.get((col, row))
+        if item is None:
+            self._items[(col, row)] = self.canvas.create_image(col * self.tile_size, row * self.tile_size,
+                                                               image=photo, anchor=tk.NW, tags=("tile",))
+            self.canvas.tag_lower("tile")
+        else:
+            self.canvas.itemconfig(item, image=photo)
+
+    def _store(self, key, tile, sharp):
+        """把块转换为 PhotoImage 放入缓存，超出容量时淘汰最久未用的块"""
+        nbytes = tile.width * tile.height * 4
+        old = self._cache.pop(key, None)
+        if old is not None:
+            self._cache_used -= old[1]
+        entry = (ImageTk.PhotoImage(tile), nbytes, sharp)
+        self._cache[key] = entry
+        self._cache_used += nbytes
+        while self._cache_used > self.cache_bytes and len(self._cache) > 1:
+            _, (_, evicted_bytes, _) = self._cache.popitem(last=False)
+            self._cache_used -= evicted_bytes
+        return entry
+
+    def _request(self, key):
+        with self._lock:
+            if key not in self._pending:
+                self._pending[key] = self._executor.submit(self._build, self._generation, self._source,
+                                                           self.image_size, key)
+
+    def _cancel_pending(self, keep):
+        with self._lock:
+            for key, future in list(self._pending.items()):
+                if key not in keep and future.cancel():
+                    del self._pending[key]
+
+    def _build(self, generation, source, image_size, key):
+        """后台线程：从分辨率足够的一层生成清晰的块"""
+        try:
+            display_size, col, row = key
+            tile = source.tile(pyramid_level(image_size, display_size),
+                               tile_rect(col, row, display_size, self.tile_size), display_size)
+        except Exception:
+            tile = None
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+        self._results.put((generation, key, tile))
+
+    def poll(self):
+        """取回后台生成的清晰块，替换仍在视口内的占位块"""
+        for generation, key, tile in self._drain():
+            if generation != self._generation or tile is None:
+                continue
+            entry = self._store(key, tile, True)
+            display_size, col, row = key
+            if display_size == self.display_size and (col, row) in self._items:
+                self._place(col, row, entry[0])
+
+    def pending_count(self):
+        """尚未生成完的清晰块数量"""
+        with self._lock:
+            return len(self._pending)
+
+    def _drain(self):
+        results = []
+        while True:
+            try:
+                results.append(self._results.get_nowait())
+            except queue.Empty:
+                return results
+
+    def trim(self):
+        """丢弃当前图片保留的层（线程安全，可作为内存预算的释放回调）；已生成的块仍在缓存中"""
+        source = self._source
+        if source is not None:
+            source.trim()
+
+    def close(self):
+        """取消尚未开始的任务并关闭后台线程"""
+        self._cancel_pending(set())
+        self._executor.shutdown(wait=False)
+        if self._source is not None:
+            self._source.close()